@@ -1,16 +1,36 @@
+""" Broadcast a temperature (simulated) in manufacturer data with aioble.
+
+Advertising payload is built once as a template (see lib/adv_template.py), temperature is
+patched in place at every update: no allocation in the update loop, so it can run every 100 ms.
+"""
+
+import random
+
 import uasyncio as aio
 import aioble
 from bluetooth import UUID
+from lib.adv_template import AdvTemplate
+from micropython import const
 
+# some const
 # org.bluetooth.service.environmental_sensing
 _ENV_SENSE_UUID = UUID(0x181A)
+_COMPANY_ID = const(0x1455)
+_ADV_INTERVAL_US = const(250_000)
+_UPDATE_MS = const(100)
 
 
-# wait for connections (don't advertise while a central is connected)
+# non-connectable advertising: aioble.advertise() would rebuild payload and wait for a connection,
+# so update the payload template and restart advertising with the BLE object of aioble
 async def adv_task():
+    adv_tpl = AdvTemplate(name='mpy-temp', services=(_ENV_SENSE_UUID, ))
+    # temperature in 0.01 °C
+    adv_tpl.add_manufacturer_data(_COMPANY_ID, (('temp', '<h'),))
+    aioble.core.ensure_active()
     while True:
-        await aioble.advertise(interval_us=250_000, connectable=False, name='mpy-temp',
-                               services=(_ENV_SENSE_UUID, ), manufacturer=(0x1455, b'\xff\xff'))
+        adv_tpl.set('temp', int((25.0 + random.uniform(-0.5, 0.5)) * 100))
+        aioble.core.ble.gap_advertise(_ADV_INTERVAL_US, adv_data=adv_tpl.buf, connectable=False)
+        await aio.sleep_ms(_UPDATE_MS)
 
 
 # create asyncio task and run it
@@ -0,0 +1,256 @@
+""" A uasyncio collector of GATT data (battery, device infos, history logs...) of BLE sensors with aioble.
+
+Collect rounds alternate with scans (aioble stops a scan to connect):
+
+- scan: devices matching a profile (advertised service or name prefix) are added to the fleet
+- collect: up to max_conns workers connect to due devices and collect them concurrently, while
+  a worker waits for a GATT response of its device, others progress on their own connection
+- a device that fails (connect, discovery, read) is retried later with an exponential backoff
+  (plus jitter), it is forgotten after forget_after failures and can be found by a next scan
+
+Only one connection can be established at a time (a lock serializes connect calls), then
+reads of a device are sent back to back: with pipeline > 1, several read requests of a device
+are kept in flight (this requires support of both BLE stacks). History logs are downloaded as
+notifications, so the peripheral can stream several packets by connection event.
+
+Usage:
+
+    class BattProfile(Profile):
+        ADV_SERVICE = UUID(0x180F)
+        READS = (('batt_p', UUID(0x180F), UUID(0x2A19)),)
+
+    collector = Collector([BattProfile()], max_conns=4, on_result=print)
+    aio.run(collector.run())
+"""
+
+from micropython import const
+import random
+
+import aioble
+import uasyncio as aio
+from utime import ticks_add, ticks_diff, ticks_ms
+
+# some const
+_SCAN_INTERVAL_US = const(30_000)
+_SCAN_WINDOW_US = const(30_000)
+_MAX_BACKOFF_SHIFT = const(16)
+COLLECT_ERRORS = (aio.TimeoutError, aioble.GattError, aioble.DeviceDisconnectedError, OSError, ValueError)
+
+
+# some class
+class Profile:
+    """GATT data to collect on a kind of device: set class attributes in a subclass."""
+    NAME = ''
+    # match on advertised service UUID or on name prefix
+    ADV_SERVICE = None
+    NAME_PREFIX = None
+    # characteristics reads as (key, service UUID, characteristic UUID)
+    READS = ()
+    # history log as (service UUID, notify characteristic UUID, request characteristic UUID, request)
+    # request (if set) is written to request characteristic after notifications subscribe
+    HISTORY = None
+    HISTORY_MAX = 1_000
+    # end of history when no notification is received during this delay
+    HISTORY_IDLE_MS = 2_000
+
+    def match(self, result) -> bool:
+        """Check if a scan result is a device of this profile."""
+        if self.NAME_PREFIX:
+            name = result.name()
+            if name and name.startswith(self.NAME_PREFIX):
+                return True
+        if self.ADV_SERVICE:
+            for uuid in result.services():
+                if uuid == self.ADV_SERVICE:
+                    return True
+        return False
+
+    def decode(self, key: str, data):
+        """Decode a characteristic value (default is raw bytes)."""
+        return bytes(data)
+
+    def decode_history(self, data):
+        """Decode a history notification, return None at end of history (default is raw bytes)."""
+        return bytes(data)
+
+
+class _Device:
+    def __init__(self, device, profile: Profile, now_ms: int):
+        self.device = device
+        self.profile = profile
+        self.key = device.addr_hex()
+        self.next_ms = now_ms
+        self.failures = 0
+        self.busy = False
+
+
+class Collector:
+    def __init__(self, profiles: list, max_conns: int = 3, interval_ms: int = 3_600_000, scan_ms: int = 5_000,
+                 rescan_ms: int = 60_000, connect_timeout_ms: int = 5_000, read_timeout_ms: int = 2_000,
+                 backoff_ms: int = 5_000, backoff_max_ms: int = 600_000, forget_after: int = 10,
+                 pipeline: int = 1, mtu: int = 247, on_result=None):
+        # public
+        self.profiles = profiles
+        self.max_conns = max_conns
+        self.interval_ms = interval_ms
+        self.scan_ms = scan_ms
+        self.rescan_ms = rescan_ms
+        self.connect_timeout_ms = connect_timeout_ms
+        self.read_timeout_ms = read_timeout_ms
+        self.backoff_ms = backoff_ms
+        self.backoff_max_ms = backoff_max_ms
+        self.forget_after = forget_after
+        self.pipeline = max(1, pipeline)
+        self.mtu = mtu
+        # on_result(key, profile, values dict, history list or None, collect ms)
+        self.on_result = on_result
+        # devices by address (hex)
+        self.devices = {}
+        # stats
+        self.collected = 0
+        self.failures = 0
+        self.last_round_ms = 0
+        # private
+        self._connect_lock = aio.Lock()
+        self._t_scan_ms = None
+
+    def stats(self) -> dict:
+        return dict(devices=len(self.devices), collected=self.collected, failures=self.failures,
+                    last_round_ms=self.last_round_ms)
+
+    async def scan(self, duration_ms: int):
+        """Scan for duration_ms, add new devices matching a profile."""
+        async with aioble.scan(duration_ms, interval_us=_SCAN_INTERVAL_US, window_us=_SCAN_WINDOW_US,
+                               active=True) as scanner:
+            async for result in scanner:
+                if result.device.addr_hex() in self.devices:
+                    continue
+                for profile in self.profiles:
+                    if profile.match(result):
+                        dev = _Device(result.device, profile, ticks_ms())
+                        self.devices[dev.key] = dev
+                        break
+        self._t_scan_ms = ticks_ms()
+
+    def _next_due(self):
+        # return a due device not collected by an other worker (or None)
+        now_ms = ticks_ms()
+        for dev in self.devices.values():
+            if not dev.busy and ticks_diff(now_ms, dev.next_ms) >= 0:
+                return dev
+        return None
+
+    async def _read_chars(self, conn, profile: Profile) -> dict:
+        # discovery: each service once, then its characteristics
+        services = {}
+        chars = []
+        for key, svc_uuid, char_uuid in profile.READS:
+            if svc_uuid not in services:
+                services[svc_uuid] = await conn.service(svc_uuid)
+            service = services[svc_uuid]
+            if service is None:
+                continue
+            char = await service.characteristic(char_uuid)
+            if char is not None:
+                chars.append((key, char))
+        # reads: up to pipeline requests in flight
+        values = {}
+        for i in range(0, len(chars), self.pipeline):
+            window = chars[i:i + self.pipeline]
+            data_l = await aio.gather(*[char.read(timeout_ms=self.read_timeout_ms) for _, char in window])
+            for (key, _), data in zip(window, data_l):
+                values[key] = profile.decode(key, data)
+        return values
+
+    async def _read_history(self, conn, profile: Profile) -> list:
+        svc_uuid, notify_uuid, request_uuid, request = profile.HISTORY
+        service = await conn.service(svc_uuid)
+        if service is None:
+            return None
+        notify_char = await service.characteristic(notify_uuid)
+        if notify_char is None:
+            return None
+        await notify_char.subscribe(notify=True)
+        if request:
+            request_char = await service.characteristic(request_uuid) if request_uuid else notify_char
+            await request_char.write(request, response=True)
+        # notifications stream, until end marker, max entries or idle timeout
+        entries = []
+        while len(entries) < profile.HISTORY_MAX:
+            try:
+                data = await notify_char.notified(timeout_ms=profile.HISTORY_IDLE_MS)
+            except aio.TimeoutError:
+                break
+            entry = profile.decode_history(data)
+            if entry is None:
+                break
+            entries.append(entry)
+        return entries
+
+    async def _collect(self, dev: _Device):
+        t_start = ticks_ms()
+        # one connection establishment at a time
+        async with self._connect_lock:
+            conn = await dev.device.connect(timeout_ms=self.connect_timeout_ms)
+        # disconnect on exit
+        async with conn:
+            if self.mtu:
+                try:
+                    await conn.exchange_mtu(self.mtu)
+                except COLLECT_ERRORS:
+                    pass
+            values = await self._read_chars(conn, dev.profile)
+            history = await self._read_history(conn, dev.profile) if dev.profile.HISTORY else None
+        if self.on_result:
+            self.on_result(dev.key, dev.profile, values, history, ticks_diff(ticks_ms(), t_start))
+
+    def _backoff(self, dev: _Device):
+        dev.failures += 1
+        self.failures += 1
+        if dev.failures >= self.forget_after:
+            # forget it: a next scan will add it again if it is still there
+            self.devices.pop(dev.key, None)
+            return
+        delay = min(self.backoff_ms << min(dev.failures - 1, _MAX_BACKOFF_SHIFT), self.backoff_max_ms)
+        # jitter: don't retry all failed devices at the same time
+        delay += random.randint(0, delay // 4)
+        dev.next_ms = ticks_add(ticks_ms(), delay)
+
+    async def _worker(self):
+        # collect due devices until there is none
+        while True:
+            dev = self._next_due()
+            if dev is None:
+                return
+            dev.busy = True
+            try:
+                await self._collect(dev)
+                dev.failures = 0
+                dev.next_ms = ticks_add(ticks_ms(), self.interval_ms)
+                self.collected += 1
+            except COLLECT_ERRORS:
+                self._backoff(dev)
+            finally:
+                dev.busy = False
+
+    async def collect_round(self):
+        """Collect all due devices with up to max_conns concurrent connections."""
+        t_start = ticks_ms()
+        await aio.gather(*[self._worker() for _ in range(self.max_conns)])
+        self.last_round_ms = ticks_diff(ticks_ms(), t_start)
+
+    def _idle_ms(self) -> int:
+        # sleep until next due device or next scan
+        now_ms = ticks_ms()
+        idle_ms = self.rescan_ms - ticks_diff(now_ms, self._t_scan_ms)
+        for dev in self.devices.values():
+            idle_ms = min(idle_ms, ticks_diff(dev.next_ms, now_ms))
+        return max(idle_ms, 0)
+
+    async def run(self):
+        """Scan and collect forever."""
+        while True:
+            if self._t_scan_ms is None or ticks_diff(ticks_ms(), self._t_scan_ms) >= self.rescan_ms:
+                await self.scan(self.scan_ms)
+            await self.collect_round()
+            await aio.sleep_ms(self._idle_ms())
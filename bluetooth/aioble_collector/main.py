@@ -0,0 +1,77 @@
+""" Collect GATT data of a fleet of BLE devices with concurrent connections (see lib/collector.py).
+
+Profiles:
+- devices that advertise the standard battery service: battery level
+- the aible_custom_peripheral sample: device infos and a history of its 0xFFE1 notifications
+
+Results are exported as json messages.
+"""
+
+from lib.collector import Collector, Profile
+import ujson
+
+import uasyncio as aio
+from bluetooth import UUID
+
+# some const
+UUID_SVC_BATT = UUID(0x180F)
+UUID_CHAR_BATT_LEVEL = UUID(0x2A19)
+UUID_SVC_DEV_INFO = UUID(0x180A)
+UUID_CHAR_MANUF_NAME = UUID(0x2A29)
+UUID_CHAR_MODEL_NUMBER = UUID(0x2A24)
+UUID_CHAR_FIRM_REV = UUID(0x2A26)
+UUID_SVC_CUSTOM = UUID(0xFFE0)
+UUID_CHAR_CUSTOM = UUID(0xFFE1)
+
+
+# some class
+class BatteryProfile(Profile):
+    NAME = 'battery'
+    ADV_SERVICE = UUID_SVC_BATT
+    READS = (('batt_p', UUID_SVC_BATT, UUID_CHAR_BATT_LEVEL),)
+
+    def decode(self, key, data):
+        return data[0]
+
+
+class CustomPeriphProfile(Profile):
+    NAME = 'custom_periph'
+    NAME_PREFIX = 'CustomPeriph'
+    READS = (('manuf', UUID_SVC_DEV_INFO, UUID_CHAR_MANUF_NAME),
+             ('model', UUID_SVC_DEV_INFO, UUID_CHAR_MODEL_NUMBER),
+             ('firm_rev', UUID_SVC_DEV_INFO, UUID_CHAR_FIRM_REV))
+    HISTORY = (UUID_SVC_CUSTOM, UUID_CHAR_CUSTOM, None, None)
+    HISTORY_MAX = 100
+
+    def decode(self, key, data):
+        return bytes(data).decode()
+
+    def decode_history(self, data):
+        return int.from_bytes(data, 'big')
+
+
+# some func
+def on_result(key, profile, values, history, collect_ms):
+    msg_d = dict(addr=key, profile=profile.NAME, collect_ms=collect_ms)
+    msg_d.update(values)
+    if history is not None:
+        msg_d['history_len'] = len(history)
+        msg_d['history_last'] = history[-1] if history else None
+    print(ujson.dumps(msg_d))
+
+
+async def stats_task(collector):
+    while True:
+        await aio.sleep_ms(60_000)
+        print(ujson.dumps(dict(stats=collector.stats())))
+
+
+async def main():
+    # collect every 10 mn, up to 4 concurrent connections
+    collector = Collector([BatteryProfile(), CustomPeriphProfile()], max_conns=4, interval_ms=600_000,
+                          on_result=on_result)
+    await aio.gather(collector.run(), stats_task(collector))
+
+
+if __name__ == '__main__':
+    aio.run(main())
@@ -0,0 +1,213 @@
+""" Registry of BLE advertising decoders for environmental sensors.
+
+Decoders are selected in O(1) with a company ID, a 16-bit service UUID or a name prefix. Each
+decoder unpacks the advertising data with a fixed struct layout (no slicing) into a record it
+owns and reuses at every call.
+
+Run on MicroPython and on host CPython (for tests).
+
+Usage:
+
+    registry = DecoderRegistry()
+    registry.register(TP357Decoder)
+    registry.register(W3400010Decoder)
+    data = registry.decode(adv_data)
+    if data:
+        print(data.model, data.temp_c, data.hum_p)
+"""
+
+try:
+    from micropython import const
+except ImportError:
+    def const(x):
+        return x
+try:
+    from ustruct import unpack_from
+except ImportError:
+    from struct import unpack_from
+
+
+# some const
+ADV_TYPE_SHORT_NAME = const(0x08)
+ADV_TYPE_COMPL_NAME = const(0x09)
+ADV_TYPE_SERVICE_DATA = const(0x16)
+ADV_MANUF_SPEC_DATA = const(0xff)
+
+
+# some class
+class AdvFields:
+    """Offsets (and lengths) of the AD structures of an advertising payload.
+
+    The payload is walked once, only the first occurrence of each AD type is kept.
+    An offset of -1 means field not found.
+    """
+
+    def __init__(self):
+        self.name_off = -1
+        self.name_len = 0
+        self.msd_off = -1
+        self.msd_len = 0
+        self.svc_off = -1
+        self.svc_len = 0
+
+    def parse(self, payload) -> None:
+        self.name_off = self.msd_off = self.svc_off = -1
+        self.name_len = self.msd_len = self.svc_len = 0
+        i = 0
+        p_len = len(payload)
+        while i + 1 < p_len:
+            f_len = payload[i]
+            # skip padding and truncated (malformed) structures
+            if f_len == 0 or i + f_len >= p_len:
+                break
+            f_type = payload[i + 1]
+            # short or complete name (short name has priority)
+            if f_type == ADV_TYPE_SHORT_NAME or (f_type == ADV_TYPE_COMPL_NAME and self.name_off < 0):
+                self.name_off, self.name_len = i + 2, f_len - 1
+            elif f_type == ADV_MANUF_SPEC_DATA and self.msd_off < 0:
+                self.msd_off, self.msd_len = i + 2, f_len - 1
+            elif f_type == ADV_TYPE_SERVICE_DATA and self.svc_off < 0:
+                self.svc_off, self.svc_len = i + 2, f_len - 1
+            i += 1 + f_len
+
+    def company_id(self, payload) -> int:
+        return payload[self.msd_off] | payload[self.msd_off + 1] << 8 if self.msd_len >= 2 else -1
+
+    def service_uuid(self, payload) -> int:
+        return payload[self.svc_off] | payload[self.svc_off + 1] << 8 if self.svc_len >= 2 else -1
+
+    def name(self, payload) -> str:
+        if self.name_off < 0:
+            return ''
+        try:
+            return str(bytes(payload[self.name_off:self.name_off + self.name_len]), 'utf8')
+        except UnicodeError:
+            return ''
+
+
+class SensorData:
+    """Output record of a decoder (reused at every decode)."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.name = ''
+        self.temp_c = None
+        self.hum_p = None
+        self.batt_p = None
+
+
+class Decoder:
+    """Base class of a sensor decoder.
+
+    Subclasses set at least one of the lookup keys (COMPANY_ID, SERVICE_UUID or NAME_PREFIX)
+    and override decode() to update self.data, returning False if payload doesn't match.
+    """
+    MODEL = ''
+    COMPANY_ID = None
+    SERVICE_UUID = None
+    NAME_PREFIX = None
+
+    def __init__(self):
+        self.data = SensorData(self.MODEL)
+
+    def decode(self, payload, fields: AdvFields) -> bool:
+        raise NotImplementedError
+
+
+class TP357Decoder(Decoder):
+    """ThermoPro TP357 indoor hygrometer thermometer."""
+    MODEL = 'tp357'
+    NAME_PREFIX = b'TP357'
+    # manufacturer specific data: [?][temp (0.1 °C) int16 le][hum (%) uint8][?][?]
+    MSD_LEN = 6
+    MSD_FMT = '<hB'
+
+    def decode(self, payload, fields: AdvFields) -> bool:
+        if fields.msd_len != self.MSD_LEN:
+            return False
+        temp, hum = unpack_from(self.MSD_FMT, payload, fields.msd_off + 1)
+        self.data.temp_c = temp / 10
+        self.data.hum_p = hum
+        return True
+
+
+class W3400010Decoder(Decoder):
+    """SwitchBot W3400010 outdoor hygrometer thermometer."""
+    MODEL = 'w3400010'
+    # company ID 0x0969 (Woan technology)
+    COMPANY_ID = 0x0969
+    # manufacturer specific data: [company id][mac][seq][?][?][temp dec][temp (bit 7 = sign)][hum]
+    MSD_LEN = 14
+    MSD_FMT = '<BBB'
+    # service data: [uuid 0xfd3d][type][?][batt (%)]
+    SVC_UUID = 0xfd3d
+    SVC_LEN = 5
+
+    def decode(self, payload, fields: AdvFields) -> bool:
+        if fields.msd_len != self.MSD_LEN:
+            return False
+        t_dec, t_int, hum = unpack_from(self.MSD_FMT, payload, fields.msd_off + 10)
+        temp_c = (t_int & 0x7f) + (t_dec & 0x0f) / 10
+        self.data.temp_c = temp_c if t_int & 0x80 else -temp_c
+        self.data.hum_p = hum & 0x7f
+        self.data.batt_p = None
+        if fields.svc_len == self.SVC_LEN and fields.service_uuid(payload) == self.SVC_UUID:
+            self.data.batt_p = payload[fields.svc_off + 4] & 0x7f
+        return True
+
+
+class DecoderRegistry:
+    def __init__(self):
+        # private
+        self._by_company = {}
+        self._by_service = {}
+        self._by_prefix = {}
+        self._prefix_lens = []
+        self._fields = AdvFields()
+
+    def register(self, decoder_cls) -> Decoder:
+        """Add a decoder class to the registry, return its instance."""
+        decoder = decoder_cls()
+        if decoder.COMPANY_ID is not None:
+            self._by_company[decoder.COMPANY_ID] = decoder
+        if decoder.SERVICE_UUID is not None:
+            self._by_service[decoder.SERVICE_UUID] = decoder
+        if decoder.NAME_PREFIX is not None:
+            self._by_prefix[decoder.NAME_PREFIX] = decoder
+            if len(decoder.NAME_PREFIX) not in self._prefix_lens:
+                self._prefix_lens.append(len(decoder.NAME_PREFIX))
+        return decoder
+
+    def _prefix_lookup(self, payload, fields: AdvFields) -> Decoder:
+        if fields.name_off >= 0:
+            for p_len in self._prefix_lens:
+                if fields.name_len >= p_len:
+                    decoder = self._by_prefix.get(bytes(payload[fields.name_off:fields.name_off + p_len]))
+                    if decoder:
+                        return decoder
+        return None
+
+    def _apply(self, decoder: Decoder, payload) -> SensorData:
+        if decoder and decoder.decode(payload, self._fields):
+            decoder.data.name = self._fields.name(payload)
+            return decoder.data
+        return None
+
+    def decode(self, payload) -> SensorData:
+        """Decode an advertising payload, return the record of the matching decoder (or None).
+
+        Lookup order is company ID, service UUID and then name prefix.
+        """
+        fields = self._fields
+        fields.parse(payload)
+        return self._apply(self._by_company.get(fields.company_id(payload)), payload) or \
+            self._apply(self._by_service.get(fields.service_uuid(payload)), payload) or \
+            self._apply(self._prefix_lookup(payload, fields), payload)
+
+
+# default registry with all known sensors
+def default_registry() -> DecoderRegistry:
+    registry = DecoderRegistry()
+    registry.register(TP357Decoder)
+    registry.register(W3400010Decoder)
+    return registry
@@ -3,67 +3,42 @@
 Export advertising elements as json messages.
 """
 
+from lib.ble_decoders import DecoderRegistry, TP357Decoder
 from micropython import const
 from ubinascii import hexlify
 import ubluetooth
 import ujson
-from ustruct import unpack
 import utime
 
 
 # some const
 IRQ_SCAN_RESULT = const(0x05)
-ADV_TYPE_SHORT_NAME = const(0x08)
-ADV_TYPE_COMPL_NAME = const(0x09)
-ADV_MANUF_SPEC_DATA = const(0xff)
 
 
-# some func
-def decode_field(payload, adv_type):
-    i = 0
-    result = []
-    while i + 1 < len(payload):
-        if payload[i + 1] == adv_type:
-            result.append(payload[i + 2: i + payload[i] + 1])
-        i += 1 + payload[i]
-    return result
-
-
-def decode_short_name(payload):
-    n = decode_field(payload, ADV_TYPE_SHORT_NAME)
-    return str(n[0], 'utf8') if n else ''
-
-
-def decode_compl_name(payload):
-    n = decode_field(payload, ADV_TYPE_SHORT_NAME)
-    return str(n[0], 'utf8') if n else ''
+# some global vars
+# limit to TP357 messages
+decoders = DecoderRegistry()
+decoders.register(TP357Decoder)
 
 
+# some func
 def on_ble_event(event, data):
     if event == IRQ_SCAN_RESULT:
         # scan items
         addr_type, addr_b, adv_type, rssi, adv_data = data
-        name = decode_short_name(adv_data) or decode_compl_name(adv_data)
-        # init an export dict
+        # decode advertising data (None if not a TP357 message)
+        sensor = decoders.decode(adv_data)
+        if sensor is None:
+            return
+        # export dict with mandatory fields
         export_d = {}
-        # limit to TP357 messages
-        if name.startswith('TP357'):
-            # test "manufacturer specific data" is set
-            mfr_data_l = decode_field(adv_data, ADV_MANUF_SPEC_DATA)
-            if len(mfr_data_l) > 0 and len(mfr_data_l[0]) == 6:
-                # populate export_d with data of first MSD field
-                mfr_data = mfr_data_l[0]
-                (temp, hum) = unpack('<hB', mfr_data[1:4])[:2]
-                export_d['temp_c'] = float(temp/10)
-                export_d['hum_p'] = int(hum)
-        # if export dict is set
-        if export_d:
-            # add mandatory fields
-            export_d['name'] = name
-            export_d['addr'] = hexlify(bytes(addr_b), '-').decode()
-            export_d['rssi'] = rssi
-            # export adv dict as a json message
-            print(ujson.dumps(export_d))
+        export_d['temp_c'] = sensor.temp_c
+        export_d['hum_p'] = sensor.hum_p
+        export_d['name'] = sensor.name
+        export_d['addr'] = hexlify(bytes(addr_b), '-').decode()
+        export_d['rssi'] = rssi
+        # export adv dict as a json message
+        print(ujson.dumps(export_d))
 
 
 if __name__ == '__main__':
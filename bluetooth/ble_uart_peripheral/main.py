@@ -1,8 +1,13 @@
-""" A BLE UART peripheral, command a pico W built-in LED with on, off or toggle commands. """
+""" A BLE UART peripheral, command a pico W built-in LED with on, off or toggle commands.
+
+Received bytes are stored in a preallocated RX ring (no reallocation on read), written data is
+sent as notifications of MTU size.
+"""
 
 from time import sleep_ms
 import bluetooth
 from lib.ble_advertising import advertising_payload
+from lib.ring_buffer import RingBuffer
 from machine import Pin
 from micropython import const
 
@@ -10,8 +15,12 @@ from micropython import const
 EVT_CENTRAL_CONNECT = const(1)
 EVT_CENTRAL_DISCONNECT = const(2)
 EVT_GATTS_WRITE = const(3)
+EVT_MTU_EXCHANGED = const(21)
 FLAG_WRITE = const(0x0008)
 FLAG_NOTIFY = const(0x0010)
+# ATT header size (notify payload = MTU - 3)
+ATT_HDR_SIZE = const(3)
+DEFAULT_MTU = const(23)
 # Nordic UART Service
 UART_UUID = bluetooth.UUID('6E400001-B5A3-F393-E0A9-E50E24DCCA9E')
 UART_UUID_RX = (bluetooth.UUID('6E400002-B5A3-F393-E0A9-E50E24DCCA9E'), FLAG_WRITE,)
@@ -20,16 +29,19 @@ UART_SERVICE = (UART_UUID, (UART_UUID_TX, UART_UUID_RX),)
 
 
 class BLE_UART:
-    def __init__(self, ble: bluetooth.BLE, name: str = '', rx_buf_size: int = 100):
+    def __init__(self, ble: bluetooth.BLE, name: str = '', rx_buf_size: int = 100, mtu: int = 247):
         # public args
         self.ble = ble
         self.name = name
         self.rx_buf_size = rx_buf_size
         # init internal structs
         self._connections = set()
-        self._rx_buffer = bytearray()
+        self._rx_ring = RingBuffer(max(4 * rx_buf_size, 256))
+        self._tx_size = DEFAULT_MTU - ATT_HDR_SIZE
+        self._tx_max_size = mtu - ATT_HDR_SIZE
         # turn on ble
         self.ble.active(True)
+        self.ble.config(mtu=mtu)
         self.ble.irq(self._evt_handler)
         ((self._tx_handle, self._rx_handle),) = self.ble.gatts_register_services((UART_SERVICE,))
         # set _rx_handle size in bytes and turn on append mode
@@ -50,27 +62,41 @@ class BLE_UART:
             conn_handle, _, _ = data
             if conn_handle in self._connections:
                 self._connections.remove(conn_handle)
+            if not self._connections:
+                self._tx_size = DEFAULT_MTU - ATT_HDR_SIZE
             # start advertising again to allow new connection
             self._advertise()
         elif event == EVT_GATTS_WRITE:
             conn_handle, value_handle = data
             if conn_handle in self._connections and value_handle == self._rx_handle:
-                self._rx_buffer += self.ble.gatts_read(self._rx_handle)
+                self._rx_ring.write(self.ble.gatts_read(self._rx_handle))
                 self.on_write()
+        elif event == EVT_MTU_EXCHANGED:
+            _, mtu = data
+            self._tx_size = min(mtu - ATT_HDR_SIZE, self._tx_max_size)
 
     def any(self):
-        return len(self._rx_buffer)
+        return self._rx_ring.any()
 
     def read(self, sz=None):
-        if not sz:
-            sz = len(self._rx_buffer)
-        result = self._rx_buffer[0:sz]
-        self._rx_buffer = self._rx_buffer[sz:]
+        # all available bytes if sz is None or 0, as a bytearray
+        n = self._rx_ring.any() if not sz else min(sz, self._rx_ring.any())
+        result = bytearray(n)
+        self._rx_ring.readinto(result)
         return result
 
+    def readinto(self, buf, nbytes=None):
+        return self._rx_ring.readinto(buf, nbytes)
+
+    def readline(self):
+        return self._rx_ring.readline()
+
     def write(self, data):
-        for conn_handle in self._connections:
-            self.ble.gatts_notify(conn_handle, self._tx_handle, data)
+        # fragment data to notifications of MTU size
+        data_mv = memoryview(data.encode() if isinstance(data, str) else data)
+        for i in range(0, len(data_mv), self._tx_size):
+            for conn_handle in self._connections:
+                self.ble.gatts_notify(conn_handle, self._tx_handle, data_mv[i:i + self._tx_size])
 
     def on_write(self):
         pass
@@ -0,0 +1,81 @@
+""" Advertising payload templates: lay out AD structures once, then patch fields in place.
+
+The payload is built once (with advertising_payload() for flags, name, services and appearance,
+then service data or manufacturer data structures). Every variable field gets a fixed offset
+in the payload buffer, so a sensor update is only a struct.pack_into() in this buffer before
+calling gap_advertise(): no allocation in the update loop.
+
+Usage:
+
+    tpl = AdvTemplate(name='my-sensor')
+    tpl.add_service_data(0x2a6e, (('temp', '<h'),))
+    while True:
+        tpl.set('temp', int(read_temp() * 100))
+        ble.gap_advertise(250_000, adv_data=tpl.buf, connectable=False)
+
+Fields are defined as (name, struct format) tuples, bytes items in a fields list are constant data.
+"""
+
+from ble_advertising import advertising_payload
+from micropython import const
+import struct
+
+
+# some const
+ADV_TYPE_SERVICE_DATA = const(0x16)
+ADV_TYPE_MANUFACTURER = const(0xff)
+ADV_MAX_PAYLOAD = const(31)
+
+
+# some class
+class AdvTemplate:
+    def __init__(self, limited_disc=False, br_edr=False, name=None, services=None, appearance=0):
+        # public
+        # payload buffer, pass it to gap_advertise(adv_data=...)
+        self.buf = advertising_payload(limited_disc=limited_disc, br_edr=br_edr, name=name,
+                                       services=services, appearance=appearance)
+        # private
+        # fields as name: (struct format, offset in buf)
+        self._fields = {}
+        self._check_size()
+
+    def __len__(self):
+        return len(self.buf)
+
+    def _check_size(self):
+        if len(self.buf) > ADV_MAX_PAYLOAD:
+            raise ValueError('advertising payload too large')
+
+    def add_field(self, adv_type: int, fields, head: bytes = b''):
+        """Append an AD structure of adv_type: head bytes followed by fields (zero initialized)."""
+        data = bytearray(head)
+        offsets = {}
+        for field in fields:
+            if isinstance(field, (bytes, bytearray)):
+                data += field
+            else:
+                name, fmt = field
+                # field offset: length and type bytes + current data length
+                offsets[name] = (fmt, len(self.buf) + 2 + len(data))
+                data += bytes(struct.calcsize(fmt))
+        if len(self.buf) + 2 + len(data) > ADV_MAX_PAYLOAD:
+            raise ValueError('advertising payload too large')
+        self.buf += struct.pack('BB', len(data) + 1, adv_type) + data
+        self._fields.update(offsets)
+
+    def add_service_data(self, uuid16: int, fields):
+        """Append a service data AD structure (16-bit service UUID)."""
+        self.add_field(ADV_TYPE_SERVICE_DATA, fields, head=struct.pack('<H', uuid16))
+
+    def add_manufacturer_data(self, company_id: int, fields):
+        """Append a manufacturer specific data AD structure."""
+        self.add_field(ADV_TYPE_MANUFACTURER, fields, head=struct.pack('<H', company_id))
+
+    def offset(self, name: str) -> int:
+        """Return offset of field name in buf (for direct byte patching)."""
+        return self._fields[name][1]
+
+    def set(self, name: str, value):
+        """Patch field name with value (no allocation)."""
+        fmt, offset = self._fields[name]
+        struct.pack_into(fmt, self.buf, offset, value)
@@ -1,17 +1,66 @@
-""" Simulate a SwitchBot Outdoor Meter BLE transmitter (W3400010) for testing purposes. """
+""" Simulate a SwitchBot Outdoor Meter BLE transmitter (W3400010) for testing purposes.
 
+Advertising payload is built once as a template (see lib/adv_template.py), simulated temperature,
+humidity and battery are patched in place at every update (no allocation in the update loop).
+"""
+
+import random
 import time
 
+from lib.adv_template import AdvTemplate
+from micropython import const
+
 import bluetooth
 
+
+# some const
+COMPANY_ID = const(0x0969)
+SVC_UUID = const(0xfd3d)
+ADV_INTERVAL_US = const(250_000)
+UPDATE_MS = const(1_000)
+
+
+# some function
+def w3400010_template() -> AdvTemplate:
+    # same layout as '0201060FFF6909CD4068A5FD55C20B00805F0006163DFD7700C4'
+    tpl = AdvTemplate()
+    # manufacturer data: [company id][mac][seq][?][temp dec][temp int (bit 7 = sign)][hum][?]
+    tpl.add_manufacturer_data(COMPANY_ID, (bytes.fromhex('CD4068A5FD55'), ('seq', 'B'), b'\x0b',
+                                           ('t_dec', 'B'), ('t_int', 'B'), ('hum', 'B'), b'\x00'))
+    # service data: [uuid][type][?][batt (%)]
+    tpl.add_service_data(SVC_UUID, (b'\x77\x00', ('batt', 'B')))
+    return tpl
+
+
+def update(tpl: AdvTemplate, seq: int, temp_c: float, hum_p: int, batt_p: int):
+    # round to tenths first: int() of a float like 12.299999 would give 12.2
+    t10 = round(abs(temp_c) * 10)
+    tpl.set('seq', seq & 0xff)
+    tpl.set('t_dec', t10 % 10)
+    tpl.set('t_int', t10 // 10 | (0x80 if temp_c >= 0 else 0))
+    tpl.set('hum', hum_p)
+    tpl.set('batt', batt_p)
+
+
 # init BLE
 ble = bluetooth.BLE()
 ble.active(True)
 
-# advertise payload
-adv_data = bytes.fromhex('0201060FFF6909CD4068A5FD55C20B00805F0006163DFD7700C4')
-# advertising every 250ms
-ble.gap_advertise(interval_us=250_000, connectable=False, adv_data=adv_data)
+# advertise payload template
+adv_tpl = w3400010_template()
+
+# simulated values
+seq = 0
+temp_c = 12.0
+hum_p = 80
+batt_p = 68
 
 while True:
-    time.sleep_ms(1_000)
+    # patch payload and restart advertising (payload updated every 1s, advertised every 250ms)
+    update(adv_tpl, seq, temp_c, hum_p, batt_p)
+    ble.gap_advertise(interval_us=ADV_INTERVAL_US, connectable=False, adv_data=adv_tpl.buf)
+    # random walk
+    seq += 1
+    temp_c = min(max(temp_c + random.choice((-0.1, 0.0, 0.1)), -30.0), 50.0)
+    hum_p = min(max(hum_p + random.choice((-1, 0, 1)), 0), 100)
+    time.sleep_ms(UPDATE_MS)
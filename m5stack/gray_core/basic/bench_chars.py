@@ -0,0 +1,87 @@
+"""
+Benchmark of ILI9341 text rendering with the fonts of lib/fonts.
+
+Text is rendered to a null SPI bus (only rendering is measured, not SPI transfers), run it on the
+board from this directory with:
+
+    mpremote mount . run bench_chars.py
+
+For each font, report chars/s of:
+- ref: the former rendering (a MONO_VLSB FrameBuffer by string, then blit() with a pixel lookup by pixel)
+- chars: ILI9341.chars() (glyphs expanded from the font tables with a mono to RGB565 table)
+"""
+
+import gc
+import sys
+import framebuf
+from utime import ticks_diff, ticks_us
+
+sys.path.insert(0, 'lib')
+
+from ili934xnew import ILI9341
+from text_layout import metrics
+
+# some const
+TEXT = 'Sensor 42: 21.5 C, 1013 hPa'
+LOOPS = 10
+FONTS = ('glcdfont', 'tt14', 'tt24', 'tt32')
+
+
+# some class
+class NullPin:
+    OUT = 1
+
+    def init(self, *args, **kwargs):
+        pass
+
+    def __call__(self, *args):
+        pass
+
+
+class NullSPI:
+    def write(self, data):
+        pass
+
+
+# some functions
+def ref_chars(tft, font, s, x, y):
+    """Former ILI9341.chars(): build a MONO_VLSB FrameBuffer of the string and blit() it."""
+    str_w = metrics(font).width(s)
+    div, rem = divmod(font.height(), 8)
+    nbytes = div + 1 if rem else div
+    buf = bytearray(str_w * nbytes)
+    pos = 0
+    for ch in s:
+        glyph, char_w = font.get_ch(ch)
+        for row in range(nbytes):
+            index = row * str_w + pos
+            for i in range(char_w):
+                buf[index + i] = glyph[nbytes * i + row]
+        pos += char_w
+    fb = framebuf.FrameBuffer(buf, str_w, font.height(), framebuf.MONO_VLSB)
+    tft.blit(fb, x, y, str_w, font.height())
+
+
+def chars_rate(func):
+    """Return chars/s of func() that draw TEXT."""
+    gc.collect()
+    t_start = ticks_us()
+    for _ in range(LOOPS):
+        func()
+    return LOOPS * len(TEXT) * 1e6 / max(ticks_diff(ticks_us(), t_start), 1)
+
+
+def main():
+    print(f'{"font":<12}{"ref":>10}{"chars":>10}{"speedup":>10}  (chars/s)')
+    for name in FONTS:
+        font = __import__('fonts.' + name, None, None, [name])
+        tft = ILI9341(NullSPI(), cs=NullPin(), dc=NullPin(), rst=NullPin(), w=240, h=320, r=6, font=font)
+        ref = chars_rate(lambda: ref_chars(tft, font, TEXT, 0, 0))
+        new = chars_rate(lambda: tft.chars(TEXT, 0, 0))
+        print(f'{name:<12}{ref:>10.0f}{new:>10.0f}{new / ref:>9.1f}x')
+        del tft, font
+        gc.collect()
+
+
+if __name__ == '__main__':
+    main()
@@ -16,7 +16,9 @@
 import time
 import ustruct
 import framebuf
+import micropython
 from micropython import const
+from text_layout import metrics
 
 _RDDSDR = const(0x0f) # Read Display Self-Diagnostic Result
 _SLPOUT = const(0x11) # Sleep Out
@@ -47,13 +49,236 @@ _PGAMCTRL = const(0xe0) # Positive Gamma Control
 _NGAMCTRL = const(0xe1) # Negative Gamma Control
 
 _CHUNK = const(1024) #maximum number of pixels per spi write
+_LUT_CACHE = const(4) #number of mono to RGB565 tables kept (4 KB each)
 
 def color565(r, g, b):
     return (r & 0xf8) << 8 | (g & 0xfc) << 3 | b >> 3
 
+def _build_lut(colormap):
+    #mono to RGB565 table: for each byte value, RGB565 pixels of bits 0 to 7 (bg for 0, fg for 1)
+    lut = bytearray(256 * 8 * 2)
+    bg = colormap[0:2]
+    fg = colormap[2:4]
+    for b in range(256):
+        for k in range(8):
+            i = (b * 8 + k) * 2
+            lut[i:i + 2] = fg if b >> k & 1 else bg
+    return lut
+
+@micropython.viper
+def _vlsb_rgb(lut, src, col_step: int, row_step: int, cols: int, row0: int, rows: int, dest, stride: int):
+    #expand rows row0 to row0+rows-1 of a MONO_VLSB bitmap (byte of column c, rows r..r+7 at
+    #c*col_step + (r>>3)*row_step) to dest, rows of stride RGB565 pixels, a source byte at a time
+    tbl = ptr16(lut)
+    s = ptr8(src)
+    d = ptr16(dest)
+    row1 = row0 + rows
+    for c in range(cols):
+        r = row0
+        i = c
+        while r < row1:
+            t = s[c * col_step + (r >> 3) * row_step] << 3
+            end = (r | 7) + 1
+            if end > row1:
+                end = row1
+            while r < end:
+                d[i] = tbl[t + (r & 7)]
+                i += stride
+                r += 1
+
+@micropython.viper
+def _hlsb_rgb(lut, src, src_stride: int, col0: int, cols: int, row0: int, rows: int, dest, stride: int):
+    #expand columns col0 to col0+cols-1 of rows row0 to row0+rows-1 of a MONO_HLSB bitmap (rows of
+    #src_stride bytes, MSB at left) to dest, rows of stride RGB565 pixels, a source byte at a time
+    tbl = ptr16(lut)
+    s = ptr8(src)
+    d = ptr16(dest)
+    col1 = col0 + cols
+    for r in range(rows):
+        o = (row0 + r) * src_stride
+        i = r * stride
+        c = col0
+        while c < col1:
+            t = (s[o + (c >> 3)] << 3) + 7
+            end = (c | 7) + 1
+            if end > col1:
+                end = col1
+            while c < end:
+                d[i] = tbl[t - (c & 7)]
+                i += 1
+                c += 1
+
+@micropython.viper
+def _run_len(src, i: int, n: int) -> int:
+    #number of equal RGB565 pixels of src from pixel i (up to pixel n - 1)
+    s = ptr16(src)
+    v = s[i]
+    j = i + 1
+    while j < n and s[j] == v:
+        j += 1
+    return j - i
+
+@micropython.viper
+def _set_indexes(buf, start: int, n: int, index: int, bpp: int):
+    #set n palette indexes of buf (8 or 4 bits per pixel, first pixel of a byte in high nibble) from pixel start
+    b = ptr8(buf)
+    if bpp == 8:
+        for i in range(start, start + n):
+            b[i] = index
+    else:
+        for i in range(start, start + n):
+            if i & 1:
+                b[i >> 1] = (b[i >> 1] & 0xf0) | index
+            else:
+                b[i >> 1] = (b[i >> 1] & 0x0f) | (index << 4)
+
+class Shadow:
+    #RAM copy of the display memory written by the driver: RGB565 (bpp=16) or palette indexes (bpp=8 or 4),
+    #full or by tiles of tile x tile pixels allocated on first write (a tile of one color is just the color)
+
+    def __init__(self, width, height, bpp=16, palette=None, tile=0, color=0):
+        if bpp not in (16, 8, 4) or (bpp < 16 and not 0 < len(palette or ()) <= 1 << bpp):
+            raise ValueError('bpp must be 16, 8 or 4 (with a palette of at most 2**bpp colors)')
+        self.width = width
+        self.height = height
+        self.bpp = bpp
+        self.palette = palette
+        self._tiled = bool(tile)
+        self._tile_w = tile or width
+        self._tile_h = tile or height
+        self._tiles_x = (width + self._tile_w - 1) // self._tile_w
+        self._indexes = {}
+        self._tiles = [self._color(color)] * self._tiles_x * ((height + self._tile_h - 1) // self._tile_h)
+        self._win = (0, 0, 0, 0)
+        self._cx = 0
+        self._cy = 0
+        if not tile:
+            #full: allocated once
+            self._tile(0)
+
+    def columns(self, x0, x1):
+        self._win = (x0, self._win[1], x1, self._win[3])
+
+    def rows(self, y0, y1):
+        self._win = (self._win[0], y0, self._win[2], y1)
+
+    def start(self):
+        self._cx = self._win[0]
+        self._cy = self._win[1]
+
+    def write(self, data):
+        #data: big endian RGB565 pixels written in the window after start()
+        x0, y0, x1, y1 = self._win
+        mv = memoryview(data)
+        n = len(mv) // 2
+        i = 0
+        while i < n and self._cy <= y1:
+            run = min(n - i, x1 - self._cx + 1)
+            self._put(self._cx, self._cy, mv[i * 2:(i + run) * 2], run)
+            i += run
+            self._cx += run
+            if self._cx > x1:
+                self._cx = x0
+                self._cy += 1
+
+    def fill_rect(self, x, y, w, h, color):
+        tw = self._tile_w
+        th = self._tile_h
+        for ty in range(y // th, (y + h - 1) // th + 1):
+            for tx in range(x // tw, (x + w - 1) // tw + 1):
+                i = ty * self._tiles_x + tx
+                tx0 = max(x, tx * tw); tx1 = min(x + w, (tx + 1) * tw)
+                ty0 = max(y, ty * th); ty1 = min(y + h, (ty + 1) * th)
+                if self._tiled and tx1 - tx0 == tw and ty1 - ty0 == th:
+                    #a whole tile: free it
+                    self._tiles[i] = self._color(color)
+                    continue
+                tile = self._tile(i)
+                for row in range(ty0, ty1):
+                    self._fill(tile, (row - ty * th) * tw + tx0 - tx * tw, tx1 - tx0, color)
+
+    def pixel(self, x, y):
+        if not 0 <= x < self.width or not 0 <= y < self.height:
+            return 0
+        tile = self._tiles[y // self._tile_h * self._tiles_x + x // self._tile_w]
+        if isinstance(tile, int):
+            return tile
+        o = (y % self._tile_h) * self._tile_w + x % self._tile_w
+        if self.bpp == 16:
+            return tile[o * 2] << 8 | tile[o * 2 + 1]
+        if self.bpp == 8:
+            return self.palette[tile[o]]
+        return self.palette[tile[o >> 1] >> 4 if o & 1 == 0 else tile[o >> 1] & 0xf]
+
+    def read_rect(self, x, y, w, h, buf=None):
+        #returns big endian RGB565 pixels of a rectangle (for read-modify-write with blit_buffer())
+        buf = buf or bytearray(w * h * 2)
+        i = 0
+        for row in range(y, y + h):
+            for col in range(x, x + w):
+                color = self.pixel(col, row)
+                buf[i] = color >> 8
+                buf[i + 1] = color & 0xff
+                i += 2
+        return buf
+
+    def _index(self, color):
+        #palette index of color (the nearest one)
+        index = self._indexes.get(color)
+        if index is None:
+            r, g, b = color >> 11, color >> 5 & 0x3f, color & 0x1f
+            dists = [(r - (c >> 11)) ** 2 * 4 + (g - (c >> 5 & 0x3f)) ** 2 + (b - (c & 0x1f)) ** 2 * 4
+                     for c in self.palette]
+            index = dists.index(min(dists))
+            self._indexes[color] = index
+        return index
+
+    def _color(self, color):
+        #color as stored: the nearest palette color with a palette
+        return color if self.bpp == 16 else self.palette[self._index(color)]
+
+    def _tile(self, i):
+        #buffer of tile i (allocated and filled with the tile color on first use)
+        tile = self._tiles[i]
+        if isinstance(tile, int):
+            color = tile
+            tile = bytearray((self._tile_w * self._tile_h * self.bpp + 7) // 8)
+            self._fill(tile, 0, self._tile_w * self._tile_h, color)
+            self._tiles[i] = tile
+        return tile
+
+    def _fill(self, tile, o, n, color):
+        if self.bpp == 16:
+            tile[o * 2:(o + n) * 2] = ustruct.pack(">H", color) * n
+        else:
+            _set_indexes(tile, o, n, self._index(color), self.bpp)
+
+    def _put(self, x, y, src, n):
+        #n pixels of src at x, y, split by tiles
+        if y >= self.height:
+            return
+        n = min(n, self.width - x)
+        tw = self._tile_w
+        while n > 0:
+            tx = x // tw
+            k = min(n, (tx + 1) * tw - x)
+            tile = self._tile(y // self._tile_h * self._tiles_x + tx)
+            o = (y % self._tile_h) * tw + x - tx * tw
+            if self.bpp == 16:
+                tile[o * 2:(o + k) * 2] = src[:k * 2]
+            else:
+                i = 0
+                while i < k:
+                    run = _run_len(src, i, k)
+                    _set_indexes(tile, o + i, run, self._index(src[i * 2] << 8 | src[i * 2 + 1]), self.bpp)
+                    i += run
+            x += k
+            n -= k
+            src = src[k * 2:]
+
 class ILI9341:
 
-    def __init__(self, spi, cs, dc, rst, w, h, r, font):
+    def __init__(self, spi, cs, dc, rst, w, h, r, font, shadow_bpp=0, shadow_palette=None, shadow_tile=0):
         self.spi = spi
         self.cs = cs
         self.dc = dc
@@ -71,10 +296,18 @@ class ILI9341:
         self._scroll = 0
         self._buf = bytearray(_CHUNK * 2)
         self._colormap = bytearray(b'\x00\x00\xFF\xFF') #default white foregraound, black background
+        self._luts = {}
         self._x = 0
         self._y = 0
         self._font = font
         self.scrolling = False
+        #optional RAM copy of the display memory, when disabled the driver runs unchanged
+        self.shadow = None
+        if shadow_bpp:
+            self.shadow = Shadow(self.width, self.height, shadow_bpp, shadow_palette, shadow_tile)
+            self._feed = False
+            self._write = self._shadow_write
+            self._data = self._shadow_data
 
     def set_color(self, fg, bg):
         self._colormap[0] = bg>>8
@@ -177,6 +410,21 @@ class ILI9341:
         self.spi.write(data)
         self.cs(1)
 
+    def _shadow_write(self, command, data=None): #_write() with the shadow enabled
+        if command == _CASET:
+            self.shadow.columns(*ustruct.unpack(">HH", data))
+        elif command == _PASET:
+            self.shadow.rows(*ustruct.unpack(">HH", data))
+        elif command == _RAMWR:
+            self.shadow.start()
+        self._feed = command == _RAMWR
+        ILI9341._write(self, command, data)
+
+    def _shadow_data(self, data): #_data() with the shadow enabled: pixels written are copied
+        ILI9341._data(self, data)
+        if self._feed:
+            self.shadow.write(data)
+
     def _writeblock(self, x0, y0, x1, y1, data=None):
         self._write(_CASET, ustruct.pack(">HH", x0, x1))
         self._write(_PASET, ustruct.pack(">HH", y0, y1))
@@ -185,8 +433,7 @@ class ILI9341:
     def _readblock(self, x0, y0, x1, y1):
         self._write(_CASET, ustruct.pack(">HH", x0, x1))
         self._write(_PASET, ustruct.pack(">HH", y0, y1))
-        if data is None:
-            return self._read(_RAMRD, (x1 - x0 + 1) * (y1 - y0 + 1) * 3)
+        return self._read(_RAMRD, (x1 - x0 + 1) * (y1 - y0 + 1) * 3)
 
     def _read(self, command, count):
         self.dc(0)
@@ -198,6 +445,8 @@ class ILI9341:
 
     def pixel(self, x, y, color=None):
         if color is None:
+            if self.shadow is not None:
+                return self.shadow.pixel(x, y)
             r, b, g = self._readblock(x, y, x, y)
             return color565(r, g, b)
         if not 0 <= x < self.width or not 0 <= y < self.height:
@@ -209,7 +458,7 @@ class ILI9341:
         y = min(self.height - 1, max(0, y))
         w = min(self.width - x, max(1, w))
         h = min(self.height - y, max(1, h))
-        if color:
+        if color is not None:
             color = ustruct.pack(">H", color)
         else:
             color = self._colormap[0:2] #background
@@ -217,6 +466,9 @@ class ILI9341:
             self._buf[2*i]=color[0]; self._buf[2*i+1]=color[1]
         chunks, rest = divmod(w * h, _CHUNK)
         self._writeblock(x, y, x + w - 1, y + h - 1, None)
+        if self.shadow is not None:
+            self._feed = False
+            self.shadow.fill_rect(x, y, w, h, color[0] << 8 | color[1])
         if chunks:
             for count in range(chunks):
                 self._data(self._buf)
@@ -224,6 +476,17 @@ class ILI9341:
             mv = memoryview(self._buf)
             self._data(mv[:rest*2])
 
+    def _lut(self, colormap=None):
+        #mono to RGB565 table of colormap (default is the current colors)
+        key = bytes(colormap or self._colormap)
+        lut = self._luts.get(key)
+        if lut is None:
+            if len(self._luts) >= _LUT_CACHE:
+                self._luts.clear()
+            lut = _build_lut(key)
+            self._luts[key] = lut
+        return lut
+
     def erase(self):
         self.fill_rectangle(0, 0, self.width, self.height)
 
@@ -250,23 +513,72 @@ class ILI9341:
             mv = memoryview(self._buf)
             self._data(mv[:rest*2])
 
-    def chars(self, str, x, y):
-        str_w  = self._font.get_width(str)
-        div, rem = divmod(self._font.height(),8)
-        nbytes = div+1 if rem else div
-        buf = bytearray(str_w * nbytes)
-        pos = 0
-        for ch in str:
-            glyph, char_w = self._font.get_ch(ch)
-            for row in range(nbytes):
-                index = row*str_w + pos
-                for i in range(char_w):
-                    buf[index+i] = glyph[nbytes*i+row]
-            pos += char_w
-        fb = framebuf.FrameBuffer(buf,str_w, self._font.height(), framebuf.MONO_VLSB)
-        self.blit(fb,x,y,str_w,self._font.height())
+    def blit_buffer(self, buf, x, y, w, h): #writes w x h RGB565 pixels (big endian) at x, y, no clipping
+        self._writeblock(x, y, x + w - 1, y + h - 1, buf)
+
+    def render_glyph(self, font, ch, buf, w, fg, bg):
+        #renders ch of font in colors fg and bg to buf, a w pixels wide RGB565 cell of font height
+        #(glyph clipped or padded with bg to w), returns the glyph width
+        colormap = ustruct.pack(">HH", bg, fg)
+        glyph, char_w = font.get_ch(ch)
+        char_h = font.height()
+        if char_w < w:
+            buf[:w * char_h * 2] = colormap[0:2] * (w * char_h)
+        _vlsb_rgb(self._lut(colormap), glyph, (char_h + 7) // 8, 1, min(char_w, w), 0, char_h, buf, w)
+        return char_w
+
+    def blit_mono(self, buf, x, y, w, h, fmt=framebuf.MONO_VLSB):
+        #draws a w x h MONO_VLSB or MONO_HLSB buffer with the current colors (fg for 1 bits)
+        x0 = max(x, 0); x1 = min(x + w, self.width)
+        y0 = max(y, 0); y1 = min(y + h, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        lut = self._lut()
+        mv = memoryview(self._buf)
+        cols = x1 - x0
+        rows = max(_CHUNK // cols, 1)
+        self._writeblock(x0, y0, x1 - 1, y1 - 1, None)
+        for row in range(y0 - y, y1 - y, rows):
+            band = min(rows, y1 - y - row)
+            if fmt == framebuf.MONO_HLSB:
+                _hlsb_rgb(lut, buf, (w + 7) // 8, x0 - x, cols, row, band, mv, cols)
+            else:
+                _vlsb_rgb(lut, memoryview(buf)[x0 - x:], 1, w, cols, row, band, mv, cols)
+            self._data(mv[:band * cols * 2])
+
+    def chars(self, str, x, y): #renders glyphs straight from the font tables
+        font = self._font
+        str_w = metrics(font).width(str)
+        char_h = font.height()
+        x0 = max(x, 0); x1 = min(x + str_w, self.width)
+        y0 = max(y, 0); y1 = min(y + char_h, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return x+str_w
+        nbytes = (char_h + 7) // 8
+        glyphs = [font.get_ch(ch) for ch in str]
+        lut = self._lut()
+        mv = memoryview(self._buf)
+        cols = x1 - x0
+        rows = max(_CHUNK // cols, 1)
+        self._writeblock(x0, y0, x1 - 1, y1 - 1, None)
+        for row in range(y0 - y, y1 - y, rows):
+            band = min(rows, y1 - y - row)
+            pos = x
+            for glyph, char_w in glyphs:
+                c0 = max(x0 - pos, 0); c1 = min(x1 - pos, char_w)
+                if c0 < c1:
+                    _vlsb_rgb(lut, glyph[c0 * nbytes:], nbytes, 1, c1 - c0, row, band, mv[(pos + c0 - x0) * 2:], cols)
+                pos += char_w
+            self._data(mv[:band * cols * 2])
         return x+str_w
 
+    def draw_text(self, font, items): #draws a text_layout.layout() draw list in one pass
+        cur_font = self._font
+        self._font = font
+        for x, y, text in items:
+            self.chars(text, x, y)
+        self._font = cur_font
+
     def scroll(self, dy):
         self._scroll = (self._scroll + dy) % self.height
         self._write(_VSCRSADD, ustruct.pack(">H", self._scroll))
@@ -285,6 +597,7 @@ class ILI9341:
     def write(self, text): #does character wrap, compatible with stream output
         curx = self._x; cury = self._y
         char_h = self._font.height()
+        font_m = metrics(self._font)
         width = 0
         written = 0
         for pos, ch in enumerate(text):
@@ -294,7 +607,7 @@ class ILI9341:
                 curx = 0; written = pos+1; width = 0
                 cury = self.next_line(cury,char_h)
             else:
-                char_w = self._font.get_width(ch)
+                char_w = font_m.char_width(ch)
                 if curx + width + char_w >= self.width:
                     self.chars(text[written:pos], curx,cury)
                     curx = 0 ; written = pos; width = char_h
@@ -310,13 +623,14 @@ class ILI9341:
         cury = self._y; curx = self._x
         char_h = self._font.height()
         char_w = self._font.max_width()
+        font_m = metrics(self._font)
         lines = text.split('\n')
         for line in lines:
             words = line.split(' ')
             for word in words:
-                if curx + self._font.get_width(word) >= self.width:
+                if curx + font_m.width(word) >= self.width:
                     curx = self._x; cury = self.next_line(cury,char_h)
-                    while self._font.get_width(word) > self.width:
+                    while font_m.width(word) > self.width:
                         self.chars(word[:self.width//char_w],curx,cury)
                         word = word[self.width//char_w:]
                         cury = self.next_line(cury,char_h)
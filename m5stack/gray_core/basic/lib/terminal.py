@@ -0,0 +1,307 @@
+"""
+A text terminal on an ILI9341 display (lib/ili934xnew.py) for logs and the REPL.
+
+Written text goes to a character cells buffer: write() only updates cells, flush() draws the cells
+that changed since the last flush (rendered cells are cached by char and colors) and scrolls the
+screen with the display hardware scroll (VSCRSADD). With auto_flush=False, write() is cheap and
+the application calls flush() when it has time, optionally with a budget of cells by call.
+
+Supported controls: '\\n', '\\r', '\\b', '\\t' and ANSI escape sequences: SGR colors (ESC[...m: 0, 1,
+22, 30-37, 39, 40-47, 49, 90-97, 100-107), cursor moves (ESC[nA/B/C/D, ESC[r;cH) and erases
+(ESC[nJ, ESC[nK).
+
+    term = Terminal(display, fonts.glcdfont)
+    term.write('\\x1b[32mOK\\x1b[0m sensor ready\\n')
+    os.dupterm(term)
+"""
+
+import io
+from micropython import const
+from ili934xnew import color565
+
+# some const
+_GLYPH_CACHE_SIZE = const(8192)
+_ESC_MAX_LEN = const(16)
+_TAB_SIZE = const(8)
+# VGA palette: 8 normal and 8 bright colors
+_PALETTE = tuple(color565(r, g, b) for r, g, b in (
+    (0, 0, 0), (170, 0, 0), (0, 170, 0), (170, 85, 0), (0, 0, 170), (170, 0, 170), (0, 170, 170), (170, 170, 170),
+    (85, 85, 85), (255, 85, 85), (85, 255, 85), (255, 255, 85), (85, 85, 255), (255, 85, 255), (85, 255, 255),
+    (255, 255, 255)))
+
+
+# some class
+class Terminal(io.IOBase):
+    def __init__(self, tft, font, fg=15, bg=0, glyph_cache=_GLYPH_CACHE_SIZE, auto_flush=True, cursor=True):
+        # public
+        self.tft = tft
+        self.font = font
+        self.glyph_cache = glyph_cache
+        self.auto_flush = auto_flush
+        self.cursor = cursor
+        self.cell_w = font.max_width()
+        self.cell_h = font.height()
+        self.cols = tft.width // self.cell_w
+        self.rows = tft.height // self.cell_h
+        # private
+        # cells of a row are contiguous, rows are a ring: screen row 0 is at ring row self._top
+        n_cells = self.cols * self.rows
+        self._default_attr = (bg & 0xf) << 4 | fg & 0xf
+        self._chars = bytearray(b' ' * n_cells)
+        self._attrs = bytearray(bytes((self._default_attr,)) * n_cells)
+        # cells as drawn on the display (char 0: unknown)
+        self._scr_chars = bytearray(self._chars)
+        self._scr_attrs = bytearray(self._attrs)
+        self._dirty = bytearray(self.rows)
+        self._top = 0
+        # display line of screen row 0 (hardware scroll) and pending scrolls
+        self._origin = 0
+        self._scrolls = 0
+        self._row = 0
+        self._col = 0
+        self._attr = self._default_attr
+        self._bold = False
+        self._esc = None
+        self._cursor_at = -1
+        # rendered cells: char << 8 | attr -> [buffer, last use tick]
+        self._glyphs = {}
+        self._glyphs_size = 0
+        self._tick = 0
+        self._cell_buf = bytearray(self.cell_w * self.cell_h * 2)
+        # clear display
+        tft.reset_scroll()
+        tft.fill_rectangle(0, 0, tft.width, tft.height, _PALETTE[bg & 0xf])
+
+    def readinto(self, buf):
+        # no input (for os.dupterm())
+        return None
+
+    def write(self, buf):
+        """Write text (str or utf-8 bytes) to the terminal, return its length."""
+        if isinstance(buf, str):
+            text = buf
+        else:
+            try:
+                text = bytes(buf).decode()
+            except UnicodeError:
+                text = ''.join(chr(b) for b in buf)
+        for char in text:
+            if self._esc is not None:
+                self._esc += char
+                if len(self._esc) == 1:
+                    if char != '[':
+                        # not a CSI sequence: ignore it
+                        self._esc = None
+                elif '@' <= char <= '~':
+                    self._escape(self._esc)
+                    self._esc = None
+                elif len(self._esc) > _ESC_MAX_LEN:
+                    self._esc = None
+            elif char >= ' ':
+                self._put(char)
+            elif char == '\n':
+                self._newline()
+            elif char == '\r':
+                self._col = 0
+            elif char == '\b':
+                self._col = max(min(self._col, self.cols - 1) - 1, 0)
+            elif char == '\t':
+                self._col = min((self._col // _TAB_SIZE + 1) * _TAB_SIZE, self.cols)
+            elif char == '\x1b':
+                self._esc = ''
+        if self.auto_flush:
+            self.flush()
+        return len(buf)
+
+    def clear(self):
+        """Clear the terminal and move the cursor home."""
+        self._erase(0, self.rows * self.cols)
+        self._row = 0
+        self._col = 0
+
+    def flush(self, max_cells=0):
+        """Draw changed cells (at most max_cells if set, the others at next flush)."""
+        if self._scrolls:
+            self._hw_scroll()
+        cursor = -1
+        if self.cursor:
+            cursor = ((self._top + self._row) % self.rows) * self.cols + min(self._col, self.cols - 1)
+        if cursor != self._cursor_at:
+            for i in (self._cursor_at, cursor):
+                if i >= 0:
+                    self._dirty[i // self.cols] = 1
+            self._cursor_at = cursor
+        drawn = 0
+        for row in range(self.rows):
+            ring_row = (self._top + row) % self.rows
+            if not self._dirty[ring_row]:
+                continue
+            y = (self._origin + row * self.cell_h) % self.tft.height
+            i = ring_row * self.cols
+            for col in range(self.cols):
+                char = self._chars[i]
+                attr = self._attrs[i]
+                if i == cursor:
+                    attr = (attr >> 4 | attr << 4) & 0xff
+                if char != self._scr_chars[i] or attr != self._scr_attrs[i]:
+                    if max_cells and drawn >= max_cells:
+                        return
+                    self._draw_cell(col * self.cell_w, y, char, attr)
+                    self._scr_chars[i] = char
+                    self._scr_attrs[i] = attr
+                    drawn += 1
+                i += 1
+            self._dirty[ring_row] = 0
+
+    def glyph_cache_clear(self):
+        self._glyphs = {}
+        self._glyphs_size = 0
+
+    def _put(self, char):
+        if self._col >= self.cols:
+            self._newline()
+        code = ord(char)
+        i = ((self._top + self._row) % self.rows) * self.cols + self._col
+        self._chars[i] = code if code < 0x100 else 0x3f
+        self._attrs[i] = self._attr
+        self._dirty[i // self.cols] = 1
+        self._col += 1
+
+    def _newline(self):
+        self._col = 0
+        if self._row < self.rows - 1:
+            self._row += 1
+            return
+        # scroll: the top row becomes the bottom one
+        self._top = (self._top + 1) % self.rows
+        self._scrolls += 1
+        self._erase((self.rows - 1) * self.cols, self.rows * self.cols)
+
+    def _erase(self, start, end):
+        # erase cells of screen index start to end - 1 (screen index: row * cols + col)
+        for pos in range(start, end):
+            i = (pos + self._top * self.cols) % (self.rows * self.cols)
+            self._chars[i] = 0x20
+            self._attrs[i] = self._attr & 0xf0 | self._default_attr & 0xf
+            self._dirty[i // self.cols] = 1
+
+    def _escape(self, seq):
+        # CSI sequence seq: '[' params final
+        final = seq[-1]
+        params = []
+        for param in seq[1:-1].split(';'):
+            try:
+                params.append(int(param))
+            except ValueError:
+                params.append(0)
+        n = max(params[0], 1)
+        if final == 'm':
+            for p in params:
+                fg, bg = self._attr & 0xf, self._attr >> 4
+                if p == 0:
+                    fg, bg = self._default_attr & 0xf, self._default_attr >> 4
+                    self._bold = False
+                elif p == 1:
+                    self._bold = True
+                    fg |= 8
+                elif p == 22:
+                    self._bold = False
+                    fg &= 7
+                elif 30 <= p <= 37:
+                    fg = p - 30 | (8 if self._bold else 0)
+                elif p == 39:
+                    fg = self._default_attr & 0xf
+                elif 40 <= p <= 47:
+                    bg = p - 40
+                elif p == 49:
+                    bg = self._default_attr >> 4
+                elif 90 <= p <= 97:
+                    fg = p - 90 + 8
+                elif 100 <= p <= 107:
+                    bg = p - 100 + 8
+                self._attr = bg << 4 | fg
+        elif final == 'A':
+            self._row = max(self._row - n, 0)
+        elif final == 'B':
+            self._row = min(self._row + n, self.rows - 1)
+        elif final == 'C':
+            self._col = min(self._col + n, self.cols - 1)
+        elif final == 'D':
+            self._col = max(min(self._col, self.cols - 1) - n, 0)
+        elif final in 'Hf':
+            self._row = min(max(params[0], 1), self.rows) - 1
+            self._col = min(max(params[1] if len(params) > 1 else 1, 1), self.cols) - 1
+        elif final in 'JK':
+            pos = self._row * self.cols + min(self._col, self.cols)
+            start = self._row * self.cols if final == 'K' else 0
+            end = (self._row + 1) * self.cols if final == 'K' else self.rows * self.cols
+            if params[0] == 0:
+                self._erase(pos, end)
+            elif params[0] == 1:
+                self._erase(start, min(pos + 1, end))
+            else:
+                self._erase(start, end)
+
+    def _hw_scroll(self):
+        # scroll the display by the pending rows, then clear the rows that come in at bottom
+        tft = self.tft
+        n = self._scrolls
+        self._scrolls = 0
+        tft.scroll(n * self.cell_h)
+        self._origin = (self._origin + n * self.cell_h) % tft.height
+        n = min(n, self.rows)
+        attr = self._default_attr
+        # clear from the first new row to the display bottom (lines under the last row included)
+        y = (self._origin + (self.rows - n) * self.cell_h) % tft.height
+        h = tft.height - (self.rows - n) * self.cell_h
+        part = min(h, tft.height - y)
+        tft.fill_rectangle(0, y, tft.width, part, _PALETTE[attr >> 4])
+        if part < h:
+            tft.fill_rectangle(0, 0, tft.width, h - part, _PALETTE[attr >> 4])
+        for row in range(self.rows - n, self.rows):
+            i = ((self._top + row) % self.rows) * self.cols
+            self._scr_chars[i:i + self.cols] = b' ' * self.cols
+            self._scr_attrs[i:i + self.cols] = bytes((attr,)) * self.cols
+            self._dirty[i // self.cols] = 1
+
+    def _glyph(self, char, attr):
+        # return the rendered cell of char in colors attr (cached)
+        if not self.glyph_cache:
+            self.tft.render_glyph(self.font, chr(char), self._cell_buf, self.cell_w,
+                                  _PALETTE[attr & 0xf], _PALETTE[attr >> 4])
+            return self._cell_buf
+        self._tick += 1
+        key = char << 8 | attr
+        entry = self._glyphs.get(key)
+        if entry is not None:
+            entry[1] = self._tick
+            return entry[0]
+        buf = bytearray(len(self._cell_buf))
+        self.tft.render_glyph(self.font, chr(char), buf, self.cell_w, _PALETTE[attr & 0xf], _PALETTE[attr >> 4])
+        while self._glyphs and self._glyphs_size + len(buf) > self.glyph_cache:
+            self._glyph_evict()
+        self._glyphs[key] = [buf, self._tick]
+        self._glyphs_size += len(buf)
+        return buf
+
+    def _glyph_evict(self):
+        # remove the least recently used cell from the cache
+        lru_key = None
+        lru_tick = 0
+        for key, entry in self._glyphs.items():
+            if lru_key is None or entry[1] < lru_tick:
+                lru_key = key
+                lru_tick = entry[1]
+        self._glyphs_size -= len(self._glyphs.pop(lru_key)[0])
+
+    def _draw_cell(self, x, y, char, attr):
+        # draw a cell at display line y (a cell may wrap at the display bottom with hardware scroll)
+        buf = self._glyph(char, attr)
+        height = self.tft.height
+        if y + self.cell_h <= height:
+            self.tft.blit_buffer(buf, x, y, self.cell_w, self.cell_h)
+        else:
+            split = height - y
+            mv = memoryview(buf)
+            self.tft.blit_buffer(mv[:split * self.cell_w * 2], x, y, self.cell_w, split)
+            self.tft.blit_buffer(mv[split * self.cell_w * 2:], x, 0, self.cell_w, self.cell_h - split)
@@ -1,141 +1,253 @@
 #!/usr/bin/env python3
 
 """
-A basic multi-threaded HTTP server with a json endpoint.
+An asyncio HTTP/1.1 (keep-alive) ingest server for BLE sensors json messages.
+
+The POST endpoint accepts a single json object or a json array of objects. Every record is
+validated against the sensor schema, then queued in a bounded queue consumed by a sink task
+(log, redis or influxdb) that writes them by batch.
+
+Endpoints:
+- POST /api/test: ingest records (HTTP 503 when the queue is full)
+- GET /metrics: request rate, records rate and queue depth as json
+- GET /time: server timestamp
 
 Test with:
-curl -v -d '{"foo": "hello"}' -H "Content-Type: application/json" -X POST http://localhost:8080/api/test
+curl -v -d '{"bd_addr": "aa-bb-cc-dd-ee-ff", "rssi": -70, "id": "aa-bb-cc-dd-ee-ff", "model": "tp357", "temp_c": 21.5}' \
+     -H "Content-Type: application/json" -X POST http://localhost:8080/api/test
+
+Load test with tools/load_test.py.
 """
 
 import argparse
-from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
-from ipaddress import ip_address
+import asyncio
+from datetime import datetime
 import json
 import logging
-import socket
-from threading import Thread
 import time
-from typing import Any
+from typing import List, Optional, Tuple
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+
+# some const
+# sensor schema: mandatory and optional fields with allowed types
+MANDATORY_FIELDS = {'bd_addr': (str,), 'rssi': (int,), 'id': (str,), 'model': (str,), 'temp_c': (int, float)}
+OPTIONAL_FIELDS = {'name': (str,), 'hum_p': (int,), 'batt_p': (int,), 'debug': (str,)}
+MAX_BODY_SIZE = 1_000_000
+INFLUX_URL = 'http://localhost:8086/api/v2/write'
+INFLUX_DB = 'mydb'
 
 
 # some class
-class HttpSrv:
-    """A multi-threaded HTTP server for share camera image."""
+class Metrics:
+    def __init__(self):
+        self.t_start = time.monotonic()
+        self.requests = 0
+        self.records = 0
+        self.rejected = 0
+        self.queue_full = 0
+        self.written = 0
+        self.sink_errors = 0
+        # previous values for rates
+        self._t_last = self.t_start
+        self._last_requests = 0
+        self._last_records = 0
 
-    class HandleRequests(BaseHTTPRequestHandler):
-        """Custom HTTP handler"""
+    def as_dict(self, queue: asyncio.Queue) -> dict:
+        now = time.monotonic()
+        dt = max(now - self._t_last, 1e-6)
+        metrics_d = dict(uptime_s=round(now - self.t_start, 1),
+                         requests=self.requests, records=self.records, rejected=self.rejected,
+                         queue_full=self.queue_full, written=self.written, sink_errors=self.sink_errors,
+                         request_rate=round((self.requests - self._last_requests) / dt, 2),
+                         record_rate=round((self.records - self._last_records) / dt, 2),
+                         queue_depth=queue.qsize(), queue_max=queue.maxsize)
+        self._t_last, self._last_requests, self._last_records = now, self.requests, self.records
+        return metrics_d
 
-        def version_string(self) -> str:
-            """Replace default server banner."""
-            return 'my server'
 
-        # def log_message(self, format: str, *args: Any) -> None:
-        #     """Replace log_message to turn off log msg."""
-        #     return None
+class IngestServer:
+    """An asyncio HTTP/1.1 server with a json ingest endpoint."""
 
-        def do_GET(self):
-            """Process HTTP GET request."""
-            # catch socket errors
-            try:
-                # process every HTTP GET endpoints
-                if self.path == '/time':
-                    # headers
-                    self.send_response(200)
-                    self.send_header('Content-Type', 'text/plain; charset=utf-8')
-                    self.end_headers()
-                    # body
-                    self.wfile.write(f'timestamp is {round(time.time())}\n'.encode('utf-8'))
-                # on other path, nothing for you here
-                else:
-                    # return HTTP 404 page not found
-                    self.send_response(404)
-                    self.end_headers()
-            except socket.error:
-                pass
-
-        def do_POST(self):
-            """Process HTTP POST request."""
-            # catch socket errors
-            try:
-                # api "test" endpoint
-                if self.path == '/api/test':
+    def __init__(self, port: int = 8080, bind: str = 'localhost', queue_size: int = 10_000,
+                 sink: str = 'log', redis_url: str = 'redis://localhost:6379/0', influx_url: str = INFLUX_URL,
+                 batch_size: int = 500):
+        # public
+        self.port = port
+        self.bind = bind
+        self.sink = sink
+        self.redis_url = redis_url
+        self.influx_url = influx_url
+        self.batch_size = batch_size
+        self.metrics = Metrics()
+        # private
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    @staticmethod
+    def validate(record) -> Optional[str]:
+        """Check a record against the sensor schema, return an error message or None if valid."""
+        if not isinstance(record, dict):
+            return 'record is not an object'
+        for name, types in MANDATORY_FIELDS.items():
+            if name not in record:
+                return f'mandatory key "{name}" not found'
+            if not isinstance(record[name], types) or isinstance(record[name], bool):
+                return f'bad type for key "{name}"'
+        for name, types in OPTIONAL_FIELDS.items():
+            if name in record and not isinstance(record[name], types):
+                return f'bad type for key "{name}"'
+        return None
+
+    def ingest(self, body: bytes) -> Tuple[int, dict]:
+        """Process a POST body, return HTTP status and response dict."""
+        try:
+            js_data = json.loads(body)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            # Invalid json data: HTTP code "Bad Request"
+            return 400, dict(status='error', message=f'invalid json data: {e}')
+        records = js_data if isinstance(js_data, list) else [js_data]
+        valid = []
+        errors = []
+        for record in records:
+            error = self.validate(record)
+            if error:
+                errors.append(error)
+            else:
+                valid.append(record)
+        # queue all valid records or none: clients retry the whole batch on error
+        if self._queue.maxsize - self._queue.qsize() < len(valid):
+            # Queue is full: HTTP code "Service Unavailable" (client should retry later)
+            self.metrics.queue_full += 1
+            return 503, dict(status='error', message='queue full', accepted=0)
+        for record in valid:
+            self._queue.put_nowait(record)
+        accepted = len(valid)
+        self.metrics.rejected += len(errors)
+        self.metrics.records += accepted
+        if not accepted and errors:
+            # Key not in json dict or bad type: HTTP code "Bad Request"
+            return 400, dict(status='error', message=errors[0], rejected=len(errors))
+        return 200, dict(status='success', accepted=accepted, rejected=len(errors))
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, body: bytes = b'',
+                    content_type: str = 'application/json', keep_alive: bool = True):
+        reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large',
+                  503: 'Service Unavailable'}.get(status, '')
+        writer.write(f'HTTP/1.1 {status} {reason}\r\nServer: my server\r\nContent-Type: {content_type}\r\n'
+                     f'Content-Length: {len(body)}\r\nConnection: {"keep-alive" if keep_alive else "close"}\r\n'
+                     f'\r\n'.encode() + body)
+        await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Process all requests of a (keep-alive) connection."""
+        try:
+            while True:
+                # request line
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode('latin-1').split(None, 2)
+                # headers
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get('connection', '').lower() != 'close' and version.strip() == 'HTTP/1.1'
+                content_length = int(headers.get('content-length', 0))
+                if content_length > MAX_BODY_SIZE:
+                    await self._send(writer, 413, keep_alive=False)
+                    break
+                body = await reader.readexactly(content_length) if content_length else b''
+                self.metrics.requests += 1
+                # process every HTTP endpoints
+                if method == 'POST' and path == '/api/test':
                     # this endpoint only processes json messages
-                    if self.headers.get('Content-Type') == 'application/json':
-                        content_length = int(self.headers.get('Content-Length', 0))
-                        raw_js_data = self.rfile.read(content_length)
-                        try:
-                            js_data = json.loads(raw_js_data)
-                            logging.info(f"json = {js_data}")
-                            # HTTP code "OK"
-                            self.send_response(200)
-                            response_d = dict(status='success')
-                        except KeyError as e:
-                            # Key not in json dict: HTTP code "Bad Request"
-                            self.send_response(400)
-                            response_d = dict(status='error', message=f'mandatory key "{e}" not found')
-                        except json.JSONDecodeError as e:
-                            # Invalid json data: HTTP code "Bad Request"
-                            self.send_response(400)
-                            response_d = dict(status='error', message=f'invalid json data: {e}')
+                    if headers.get('content-type', '').split(';')[0] == 'application/json':
+                        status, response_d = self.ingest(body)
                     else:
                         # Unsupported Content-Type: HTTP code "Bad Request"
-                        self.send_response(400)
-                        response_d = dict(status='error', message=f'Unsupported Content-Type')
-                    # send response
-                    self.send_header('Content-Type', 'application/json')
-                    self.end_headers()
-                    # body
-                    self.wfile.write(json.dumps(response_d).encode() + b'\n')
-                # on unknown path
+                        status, response_d = 400, dict(status='error', message='Unsupported Content-Type')
+                    await self._send(writer, status, json.dumps(response_d).encode() + b'\n', keep_alive=keep_alive)
+                elif method == 'GET' and path == '/metrics':
+                    metrics_d = self.metrics.as_dict(self._queue)
+                    await self._send(writer, 200, json.dumps(metrics_d).encode() + b'\n', keep_alive=keep_alive)
+                elif method == 'GET' and path == '/time':
+                    await self._send(writer, 200, f'timestamp is {round(time.time())}\n'.encode(),
+                                     content_type='text/plain; charset=utf-8', keep_alive=keep_alive)
                 else:
                     # return HTTP 404 page not found
-                    self.send_response(404)
-                    self.end_headers()
-            except socket.error:
-                pass
+                    await self._send(writer, 404, keep_alive=keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
 
-    def __init__(self, port: int = 8080, bind: str = 'localhost'):
-        # public
-        self.port = port
-        self.bind = bind
-        # private
-        self._http_srv = None
-        self._http_srv_th = None
+    async def _next_batch(self) -> List[dict]:
+        # wait for a first record, then take all available ones (up to batch size)
+        batch = [await self._queue.get()]
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
 
-    def start(self, block=False):
-        """Start HTTP server as a thread."""
-        # autodetect IPv6 address
-        try:
-            ipv6 = ip_address(self.bind).version == 6
-        except ValueError:
-            ipv6 = False
-        # add IPv6 support to ThreadingHTTPServer if needed
-        if ipv6:
-            ThreadingHTTPServer.address_family = socket.AF_INET6
-        #  init HTTP server
-        ThreadingHTTPServer.allow_reuse_address = True
-        self._http_srv = ThreadingHTTPServer((self.bind, self.port), self.HandleRequests)
-        # pass a_thing to HandleRequests (available at HandleRequests.server.a_thing)
-        # for example self._http_srv.a_thing = self.a_thing
-        # start server (with or without blocking)
-        if block:
-            # start server and block here
-            self._http_srv.serve_forever()
-        else:
-            # start server in a separate thread
-            self._http_srv_th = Thread(target=self._http_srv.serve_forever, daemon=True)
-            self._http_srv_th.start()
-
-    def stop(self):
-        """Stop HTTP server thread."""
-        self._http_srv.shutdown()
-        self._http_srv.server_close()
+    async def _sink_task(self):
+        """Consume the queue and write records by batch."""
+        red_cli = None
+        if self.sink == 'redis':
+            import redis.asyncio as redis_asyncio
+            red_cli = redis_asyncio.StrictRedis.from_url(self.redis_url)
+        while True:
+            batch = await self._next_batch()
+            rx_dt = datetime.now().astimezone().isoformat()
+            try:
+                if self.sink == 'redis':
+                    # one round trip by batch
+                    pipe = red_cli.pipeline(transaction=False)
+                    for record in batch:
+                        record['receive_dt'] = rx_dt
+                        pipe.set(f'ble-js:{record["id"]}', json.dumps(record), ex=3600)
+                    pipe.hset('ble-last-seen-by-ids', mapping={record['id']: rx_dt for record in batch})
+                    await pipe.execute()
+                elif self.sink == 'influx':
+                    # one request by batch (blocking urllib call run in a thread)
+                    timestamp_s = round(time.time())
+                    lines = [f'ble_sensors,sensor={record["id"]} rssi={record["rssi"]},temp_c={float(record["temp_c"])}'
+                             + (f',hum_p={record["hum_p"]}' if 'hum_p' in record else '') + f' {timestamp_s}'
+                             for record in batch]
+                    url = f"{self.influx_url}?{urlencode(dict(bucket=INFLUX_DB, precision='s'))}"
+                    request = Request(url, data='\n'.join(lines).encode())
+                    await asyncio.to_thread(urlopen, request, timeout=4.0)
+                else:
+                    for record in batch:
+                        logging.debug(f'json = {record}')
+                self.metrics.written += len(batch)
+            except Exception as e:
+                self.metrics.sink_errors += 1
+                logging.warning(f'sink error: {e!r}')
+
+    async def serve(self):
+        """Start server and sink task, run forever."""
+        server = await asyncio.start_server(self._handle, self.bind, self.port, reuse_address=True)
+        logging.info(f'listen on {", ".join(str(s.getsockname()) for s in server.sockets)} (sink: {self.sink})')
+        async with server:
+            await asyncio.gather(server.serve_forever(), self._sink_task())
 
 
 # main program
 if __name__ == '__main__':
     # parse command line args
     parser = argparse.ArgumentParser()
+    parser.add_argument('-b', '--bind', default='0.0.0.0', help='bind address (default is "0.0.0.0")')
+    parser.add_argument('-p', '--port', type=int, default=8080, help='listen port (default is 8080)')
+    parser.add_argument('-q', '--queue-size', type=int, default=10_000, help='records queue size (default is 10000)')
+    parser.add_argument('-s', '--sink', choices=['log', 'redis', 'influx'], default='log', help='records sink (default is log)')
+    parser.add_argument('--redis-url', default='redis://localhost:6379/0', help='redis server url for redis sink')
+    parser.add_argument('--influx-url', default=INFLUX_URL, help=f'influxdb write url for influx sink (default is "{INFLUX_URL}")')
     parser.add_argument('-d', '--debug', action='store_true', help='set debug mode')
     args = parser.parse_args()
     # logging setup
@@ -143,5 +255,9 @@ if __name__ == '__main__':
     logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', level=level)
     logging.info('start HTTP server')
     # init and start HTTP server
-    srv = HttpSrv(bind='0.0.0.0')
-    srv.start(block=True)
+    srv = IngestServer(port=args.port, bind=args.bind, queue_size=args.queue_size, sink=args.sink,
+                       redis_url=args.redis_url, influx_url=args.influx_url)
+    try:
+        asyncio.run(srv.serve())
+    except KeyboardInterrupt:
+        pass
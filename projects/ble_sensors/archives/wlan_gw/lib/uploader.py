@@ -0,0 +1,167 @@
+""" Batched asynchronous HTTP uploader (uasyncio).
+
+Items (json serializable) are queued in a bounded buffer, this can be done from an IRQ handler.
+The uploader task sends them as one json array with POST over a persistent HTTP/1.1 connection
+every flush interval, or sooner when batch size is reached.
+
+When the server has closed the kept-alive connection, the batch is sent again at once on a new
+connection. On other errors, the batch is kept and retried with a backoff. When the buffer is full, the overflow
+policy drops the oldest items (OVERFLOW_DROP_OLDEST) or the new ones (OVERFLOW_DROP_NEW).
+"""
+
+from micropython import const
+import uasyncio as aio
+import ujson
+from utime import ticks_diff, ticks_ms
+
+
+# some const
+OVERFLOW_DROP_OLDEST = const(0)
+OVERFLOW_DROP_NEW = const(1)
+
+
+# some class
+class HttpError(Exception):
+    pass
+
+
+class ClosedError(HttpError):
+    pass
+
+
+class BatchUploader:
+    def __init__(self, host: str, port: int = 80, path: str = '/', max_items: int = 64, batch_size: int = 16,
+                 flush_ms: int = 10_000, overflow: int = OVERFLOW_DROP_OLDEST, timeout_s: float = 5.0,
+                 retry_ms: int = 2_000, retry_max_ms: int = 60_000):
+        # public
+        self.host = host
+        self.port = port
+        self.path = path
+        self.max_items = max_items
+        self.batch_size = batch_size
+        self.flush_ms = flush_ms
+        self.overflow = overflow
+        self.timeout_s = timeout_s
+        self.retry_ms = retry_ms
+        self.retry_max_ms = retry_max_ms
+        self.sent = 0
+        self.dropped = 0
+        self.errors = 0
+        # private
+        self._items = []
+        # number of items (at the head of self._items) of the in-flight batch
+        self._sending = 0
+        self._flag = aio.ThreadSafeFlag()
+        self._reader = None
+        self._writer = None
+
+    def add(self, item) -> bool:
+        """Queue an item (IRQ safe), return False if an item was dropped."""
+        dropped = False
+        if len(self._items) >= self.max_items:
+            self.dropped += 1
+            dropped = True
+            if self.overflow == OVERFLOW_DROP_NEW:
+                return False
+            self._items.pop(0)
+            if self._sending:
+                self._sending -= 1
+        self._items.append(item)
+        # wake up uploader when a full batch is available
+        if len(self._items) >= self.batch_size:
+            self._flag.set()
+        return not dropped
+
+    async def _close(self):
+        if self._writer:
+            try:
+                self._writer.close()
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+        self._reader = self._writer = None
+
+    async def _post(self, body: bytes):
+        # open a new connection if needed
+        if self._writer is None:
+            self._reader, self._writer = await aio.open_connection(self.host, self.port)
+        self._writer.write(f'POST {self.path} HTTP/1.1\r\nHost: {self.host}\r\n'
+                           'Content-Type: application/json\r\nConnection: keep-alive\r\n'
+                           f'Content-Length: {len(body)}\r\n\r\n'.encode())
+        self._writer.write(body)
+        await self._writer.drain()
+        # read status line
+        status_l = (await self._reader.readline()).split(None, 2)
+        if len(status_l) < 2:
+            raise ClosedError('connection closed by server')
+        status = int(status_l[1])
+        # read headers (HTTP/1.0 server close connection by default)
+        content_len = 0
+        keep_alive = status_l[0] == b'HTTP/1.1'
+        while True:
+            line = await self._reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode().partition(':')
+            name = name.strip().lower()
+            if name == 'content-length':
+                content_len = int(value)
+            elif name == 'connection':
+                keep_alive = value.strip().lower() == 'keep-alive'
+        # skip body (keep connection ready for next request)
+        if keep_alive:
+            if content_len:
+                await self._reader.readexactly(content_len)
+        else:
+            await self._close()
+        if not 200 <= status < 300:
+            raise HttpError(f'HTTP status {status}')
+
+    async def flush(self) -> bool:
+        """Send queued items (by batch), return True on success."""
+        while self._items:
+            # items added during the post are kept for next batch
+            self._sending = min(len(self._items), self.batch_size)
+            body = ujson.dumps(self._items[:self._sending]).encode()
+            retry = True
+            while True:
+                # a kept-alive connection may have been closed by the server meanwhile
+                reused = self._writer is not None
+                try:
+                    await aio.wait_for(self._post(body), self.timeout_s)
+                    break
+                except (OSError, ValueError, HttpError, aio.TimeoutError) as e:
+                    await self._close()
+                    if retry and reused and isinstance(e, (OSError, ClosedError)):
+                        # stale connection: reconnect and retry once right away
+                        retry = False
+                        continue
+                    self._sending = 0
+                    self.errors += 1
+                    print(f'upload error: {e!r}')
+                    return False
+            # remove sent items (some may have been dropped meanwhile on overflow)
+            self.sent += self._sending
+            del self._items[:self._sending]
+            self._sending = 0
+        return True
+
+    async def run(self):
+        """Uploader task."""
+        retry_ms = self.retry_ms
+        t_flush = ticks_ms()
+        while True:
+            # wait flush delay or a full batch
+            wait_ms = self.flush_ms - ticks_diff(ticks_ms(), t_flush)
+            if wait_ms > 0 and len(self._items) < self.batch_size:
+                try:
+                    await aio.wait_for_ms(self._flag.wait(), wait_ms)
+                except aio.TimeoutError:
+                    pass
+            t_flush = ticks_ms()
+            if await self.flush():
+                retry_ms = self.retry_ms
+            else:
+                # backoff on error
+                await aio.sleep_ms(retry_ms)
+                retry_ms = min(2 * retry_ms, self.retry_max_ms)
@@ -1,106 +1,75 @@
-""" Send a json message with POST method to an HTTP server. """
+""" Send BLE sensors data as batched json messages with POST method to an HTTP server.
 
-import gc
+The BLE IRQ handler only decodes and queues readings, a uasyncio task uploads them as a json
+array over a persistent HTTP/1.1 connection (see lib/uploader.py).
+"""
+
+from lib.ble_decoders import default_registry
+from lib.uploader import BatchUploader, OVERFLOW_DROP_OLDEST
 from micropython import const
 import network
 import rp2
+import uasyncio as aio
 import ubluetooth
 from ucollections import OrderedDict
-import ujson
-import urequests
-from ustruct import unpack
-from utime import sleep_ms
 from private_data import WIFI_SSID, WIFI_KEY
 
 
 # some const
 IRQ_SCAN_RESULT = const(0x05)
-ADV_TYPE_SHORT_NAME = const(0x08)
-ADV_TYPE_COMPL_NAME = const(0x09)
-ADV_MANUF_SPEC_DATA = const(0xff)
-
-
-# some func
-def decode_field(payload, adv_type):
-    i = 0
-    result = []
-    while i + 1 < len(payload):
-        if payload[i + 1] == adv_type:
-            result.append(payload[i + 2: i + payload[i] + 1])
-        i += 1 + payload[i]
-    return result
+HTTP_HOST = '192.168.0.28'
+HTTP_PORT = const(8080)
+HTTP_PATH = '/api/test'
 
 
-def decode_short_name(payload):
-    n = decode_field(payload, ADV_TYPE_SHORT_NAME)
-    return str(n[0], 'utf8') if n else ''
-
-
-def decode_compl_name(payload):
-    n = decode_field(payload, ADV_TYPE_SHORT_NAME)
-    return str(n[0], 'utf8') if n else ''
+# some global vars
+decoders = default_registry()
+uploader = BatchUploader(HTTP_HOST, HTTP_PORT, HTTP_PATH, max_items=64, batch_size=16, flush_ms=10_000,
+                         overflow=OVERFLOW_DROP_OLDEST)
 
 
+# some func
 def on_ble_event(event, data):
     if event == IRQ_SCAN_RESULT:
-        # free memory (avoid ENOMEM)
-        gc.collect()
         # scan items
         addr_type, addr_b, adv_type, rssi, adv_data = data
+        # decode advertising data with the first matching sensor decoder
+        sensor = decoders.decode(adv_data)
+        if sensor is None:
+            return
         bd_addr = addr_b.hex('-')
-        name = decode_short_name(adv_data) or decode_compl_name(adv_data)
-        msd_l = decode_field(adv_data, ADV_MANUF_SPEC_DATA)
-        msd = msd_l[0] if msd_l else b''
-        # init an export dict
-        export_d = OrderedDict()
-        # TP357 messages
-        if name.startswith('TP357'):
-            # test "manufacturer specific data" is set
-            if len(msd) == 6:
-                # populate export_d with data of first MSD field
-                export_d['model'] = 'tp357'
-                (temp, hum) = unpack('<hB', msd[1:4])[:2]
-                export_d['temp_c'] = float(temp/10)
-                export_d['hum_p'] = int(hum)
-        # W3400010 messages
-        # company ID == 0x0969 (Woan technology)
-        elif msd[:2] == b'\x69\x09':
-            if len(msd) == 14:
-                export_d['model'] = 'w3400010'
-                export_d['debug'] = msd[8:10].hex('-')
-                if msd[11] < 0x80:
-                    export_d['temp_c'] = -msd[11] + msd[10] / 10.0
-                else:
-                    export_d['temp_c'] = msd[11] - 0x80 + msd[10] / 10.0
-                export_d['hum_p'] = msd[12]
-                # export_d['batt_p'] = msd[8] & 0x7f
-        else:
-            export_d['model'] = 'obni'
-            export_d['debug'] = msd.hex('-')
-        # if export dict is set
-        if export_d:
-            # build json dict with mandatory fields ahead
-            to_js_d = OrderedDict()
-            to_js_d['bd_addr'] = bd_addr
-            to_js_d['rssi'] = rssi
-            to_js_d['id'] = export_d.pop('id', None) or bd_addr
-            to_js_d['model'] = export_d.pop('model')
-            # add optional fields
-            if name:
-                to_js_d['name'] = name
-            to_js_d.update(export_d)
-            # export adv dict as a json (compact) message
-            js_msg = ujson.dumps(to_js_d, separators=(',', ':'))
-            # print(js_msg)
-            # publish json message with HTTP POST
-            try:
-                r = urequests.post('http://192.168.0.28:8080/api/test', json=js_msg, timeout=4.0)
-                print(f'HTTP status: {r.status_code}')
-            except (OSError, ValueError) as e:
-                print(f'HTTP POST status: error {e!r}')
+        # build json dict with mandatory fields ahead
+        to_js_d = OrderedDict()
+        to_js_d['bd_addr'] = bd_addr
+        to_js_d['rssi'] = rssi
+        to_js_d['id'] = bd_addr
+        to_js_d['model'] = sensor.model
+        # add optional fields
+        if sensor.name:
+            to_js_d['name'] = sensor.name
+        to_js_d['temp_c'] = sensor.temp_c
+        to_js_d['hum_p'] = sensor.hum_p
+        if sensor.batt_p is not None:
+            to_js_d['batt_p'] = sensor.batt_p
+        # queue it for upload (no network job in IRQ)
+        uploader.add(to_js_d)
+
+
+async def scan_task(ble):
+    while True:
+        # start a BLE scan cycle
+        ble.gap_scan(0, 30_000, 30_000)
 
+        # 2mn scan, ensure to release on abort
+        try:
+            await aio.sleep_ms(120_000)
+        finally:
+            # stop scan
+            ble.gap_scan(None)
+        print(f'uploader: sent={uploader.sent} dropped={uploader.dropped} errors={uploader.errors}')
 
-if __name__ == '__main__':
+
+async def main():
     # init wlan
     rp2.country('FR')
     wlan = network.WLAN(network.STA_IF)
@@ -117,20 +86,18 @@ if __name__ == '__main__':
     ble.irq(on_ble_event)
 
     # wait WLAN up
-    if not wlan.isconnected():
-        sleep_ms(4_000)
+    for _ in range(40):
+        if wlan.isconnected():
+            break
+        await aio.sleep_ms(100)
 
     # check network status
     if wlan.status() == network.STAT_GOT_IP:
         print(f'wifi connected (@IP {wlan.ifconfig()[0]})')
 
-    while True:
-        # start a BLE scan cycle
-        ble.gap_scan(0, 30_000, 30_000)
+    # run tasks
+    await aio.gather(scan_task(ble), uploader.run())
 
-        # 2mn scan, ensure to release on abort
-        try:
-            sleep_ms(120_000)
-        finally:
-            # stop scan
-            ble.gap_scan(None)
+
+if __name__ == '__main__':
+    aio.run(main())
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+"""Load test of the ingest HTTP endpoint (host_app/http-endpoint.py).
+
+Run several keep-alive clients that POST batches of random sensor readings for a given
+duration, then report requests and readings per second.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from collections import Counter
+
+
+# some functions
+def random_reading() -> dict:
+    """Return a random BLE sensor reading."""
+    bd_addr = '-'.join(f'{b:02x}' for b in os.urandom(6))
+    return dict(bd_addr=bd_addr, rssi=random.randint(-100, -30), id=bd_addr, model='tp357',
+                temp_c=round(random.uniform(-20.0, 40.0), 1), hum_p=random.randint(0, 100))
+
+
+async def client(host: str, port: int, path: str, batch: int, t_end: float, stats: Counter):
+    """A keep-alive HTTP client, send POST requests until t_end."""
+    reader, writer = await asyncio.open_connection(host, port)
+    # use a pool of precomputed bodies (avoid measuring client side json encoding)
+    bodies = [json.dumps([random_reading() for _ in range(batch)]).encode() for _ in range(16)]
+    try:
+        while time.monotonic() < t_end:
+            body = random.choice(bodies)
+            writer.write(f'POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+                         f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            content_length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                if line.lower().startswith(b'content-length:'):
+                    content_length = int(line.split(b':')[1])
+            await reader.readexactly(content_length)
+            stats[status] += 1
+            if status == 200:
+                stats['readings'] += batch
+    finally:
+        writer.close()
+
+
+async def main(args):
+    stats = Counter()
+    t_start = time.monotonic()
+    t_end = t_start + args.duration
+    await asyncio.gather(*[client(args.host, args.port, args.path, args.batch, t_end, stats)
+                           for _ in range(args.clients)])
+    elapsed = time.monotonic() - t_start
+    requests = sum(v for k, v in stats.items() if isinstance(k, int))
+    print(f'{args.clients} client(s), batch of {args.batch} reading(s), {elapsed:.1f} s')
+    print(f'requests: {requests} ({requests / elapsed:.0f} req/s)')
+    print(f'readings: {stats["readings"]} ({stats["readings"] / elapsed:.0f} readings/s)')
+    print(f'HTTP status: {dict((k, v) for k, v in stats.items() if isinstance(k, int))}')
+
+
+if __name__ == '__main__':
+    # parse args
+    parser = argparse.ArgumentParser()
+    parser.add_argument('host', nargs='?', default='localhost', help='server host (default is "localhost")')
+    parser.add_argument('-p', '--port', type=int, default=8080, help='server port (default is 8080)')
+    parser.add_argument('--path', default='/api/test', help='ingest path (default is "/api/test")')
+    parser.add_argument('-c', '--clients', type=int, default=10, help='number of clients (default is 10)')
+    parser.add_argument('-b', '--batch', type=int, default=16, help='readings by request (default is 16)')
+    parser.add_argument('-t', '--duration', type=float, default=10.0, help='test duration (default is 10 s)')
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -1,77 +1,256 @@
 #!/usr/bin/env python3
 
-""" Relay BLE data from redis to influxdb. """
+""" Relay BLE data from redis to influxdb.
+
+Two relay modes:
+- poll (default): read "ble-js:<name>" keys of all sensors of the "ble-sensors" index every 60 s
+  (fallback to a "ble-js:*" keys search if the index is empty, for an older ble-serial-endpoint).
+- push (with -p/--push): consume the redis stream "ble-stream" published by ble-serial-endpoint
+  (started with -s/--stream), accumulate points and flush them every flush interval.
+
+In both modes, points are written as one multi-line line protocol body over a keep-alive HTTP
+connection and points with an unchanged "receive_dt" are skipped.
+
+With -s/--spool DIR, batches that can't be written (influxdb down) are stored in an on-disk
+spool and replayed by a background worker once influxdb is back (see spool.py).
+
+Test without influxdb with tools/fake_influx.py.
+"""
 
 import argparse
 from datetime import datetime
+import http.client
 import json
 import logging
 import sys
 import time
-import urllib.error
-from urllib.parse import urlencode
-from urllib.request import Request, urlopen
+from typing import Optional
+from urllib.parse import urlencode, urlsplit
 import redis
+from spool import Spool, SpoolReplay
 
 
 # some const
 BLE_FIELDS_FOR_DB = [('rssi', int), ('temp_c', float), ('hum_p', int)]
 INFLUX_DB = 'mydb'
 INFLUX_URL = 'http://localhost:8086/api/v2/write'
+SENSORS_KEY = 'ble-sensors'
+STREAM_KEY = 'ble-stream'
+
+
+# some class
+class InfluxError(Exception):
+    pass
+
+
+class InfluxRejectError(InfluxError):
+    """Write rejected by influxdb (HTTP 4xx except 429): retrying the same lines can't succeed."""
+    pass
+
+
+class InfluxWriter:
+    """Write line protocol points to influxdb over a keep-alive HTTP connection."""
+
+    def __init__(self, url: str = INFLUX_URL, bucket: str = INFLUX_DB, timeout: float = 4.0):
+        # public
+        self.url = url
+        self.bucket = bucket
+        self.timeout = timeout
+        # private
+        url_parts = urlsplit(url)
+        self._host = url_parts.hostname
+        self._port = url_parts.port
+        self._https = url_parts.scheme == 'https'
+        self._path = f"{url_parts.path}?{urlencode(dict(bucket=bucket, precision='s'))}"
+        self._conn: Optional[http.client.HTTPConnection] = None
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self._conn is None:
+            conn_cls = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+            self._conn = conn_cls(self._host, self._port, timeout=self.timeout)
+        return self._conn
+
+    def close(self):
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+    def write(self, lines: list):
+        """Write a list of line protocol strings as a single request body."""
+        if not lines:
+            return
+        body = '\n'.join(lines).encode()
+        while True:
+            reused = self._conn is not None
+            try:
+                conn = self._connect()
+                conn.request('POST', self._path, body=body, headers={'Content-Type': 'text/plain; charset=utf-8'})
+                resp = conn.getresponse()
+                # read the full response to allow connection reuse
+                resp_body = resp.read()
+                break
+            except (OSError, http.client.HTTPException) as e:
+                self.close()
+                # a kept alive connection may have been closed by server: retry once with a new one
+                if not reused:
+                    raise InfluxError(f'write error: {e!r}')
+        if 400 <= resp.status < 500 and resp.status != 429:
+            raise InfluxRejectError(f'write rejected: HTTP status {resp.status} ({resp_body[:200]!r})')
+        if resp.status >= 300:
+            raise InfluxError(f'write error: HTTP status {resp.status} ({resp_body[:200]!r})')
+        logging.debug(f'POST {len(lines)} line(s) to "{self.url}"')
+
 
+# some func
+def point_line(sensor_name: str, ble_d: dict) -> str:
+    """Format a BLE message dict as an influxdb line protocol string."""
+    # get a timestamp (with s precision) from mandatory field "receive_dt"
+    timestamp_s = round(datetime.fromisoformat(ble_d.get('receive_dt')).timestamp())
+    # format line protocol string for influxdb update
+    post_line_values = ','.join(f'{field_name}={field_type(ble_d[field_name])}'
+                                for field_name, field_type in BLE_FIELDS_FOR_DB
+                                if ble_d.get(field_name) is not None)
+    return f'ble_sensors,sensor={sensor_name} {post_line_values} {timestamp_s}'
 
-# parse command line args
-parser = argparse.ArgumentParser()
-parser.add_argument('-d', '--debug', action='store_true', help='set debug mode')
-args = parser.parse_args()
-# logging setup
-level = logging.DEBUG if args.debug else logging.INFO
-logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', level=level)
-logging.info('start influxdb ble broadcast relay')
 
-try:
-    # init redis client
-    red_cli = redis.StrictRedis()
+def add_point(points: list, last_dt_d: dict, new_dt_d: dict, sensor_name: str, js_msg: bytes):
+    """Add point of a json message to points list, skip it if its receive_dt is unchanged.
 
-    # processing loop
+    The receive_dt of added points goes to new_dt_d, move it to last_dt_d once points are written.
+    """
+    ble_d = json.loads(js_msg)
+    receive_dt = ble_d.get('receive_dt')
+    if new_dt_d.get(sensor_name, last_dt_d.get(sensor_name)) == receive_dt:
+        return
+    points.append(point_line(sensor_name, ble_d))
+    new_dt_d[sensor_name] = receive_dt
+
+
+def write_points(writer: InfluxWriter, points: list, spool: Optional[Spool] = None):
+    """Write points to influxdb, on error store them in spool (if set), drop points rejected by influxdb."""
+    try:
+        writer.write(points)
+    except InfluxRejectError as e:
+        logging.error(f'influxdb error: {e} ({len(points)} point(s) dropped)')
+    except InfluxError as e:
+        if spool is None:
+            raise
+        spool.append(points)
+        logging.warning(f'influxdb error: {e} ({len(points)} point(s) spooled)')
+
+
+def poll_loop(red_cli: redis.StrictRedis, writer: InfluxWriter, spool: Optional[Spool] = None):
+    """Poll redis keys every 60 s."""
+    last_dt_d = {}
     while True:
         try:
-            # search for data of all available BLE sensors
-            for key_name in red_cli.keys('ble-js:*'):
+            points = []
+            new_dt_d = {}
+            # data of all indexed BLE sensors (KEYS scan the whole key-space: only as fallback)
+            key_names = [f'ble-js:{name.decode()}' for name in sorted(red_cli.smembers(SENSORS_KEY))]
+            if not key_names:
+                key_names = [key_name.decode() for key_name in red_cli.keys('ble-js:*')]
+            for key_name, js_msg in zip(key_names, red_cli.mget(key_names) if key_names else []):
                 # extract sensor name from redis key "ble-js:[my_name]"
-                key_name = key_name.decode()
-                sensor_name = key_name.split(':')[-1]
-                # search json struct for this key
-                js_msg = red_cli.get(key_name)
+                sensor_name = key_name.split(':', 1)[-1]
                 if js_msg:
-                    js_msg_str = js_msg.decode()
-                    ble_d = json.loads(js_msg_str)
-                    # get a timestamp (with s precision) from mandatory field "receive_dt"
-                    timestamp_s = round(datetime.fromisoformat(ble_d.get('receive_dt')).timestamp())
-                    # format line protocol string for influxdb update
-                    post_line_head = f'ble_sensors,sensor={sensor_name}'
-                    post_line_values = ''
-                    for field_name, field_type in BLE_FIELDS_FOR_DB:
-                        f_value = ble_d.get(field_name)
-                        if f_value is not None:
-                            if post_line_values:
-                                post_line_values += ','
-                            post_line_values += f'{field_name}={field_type(f_value)}'
-                    post_line = f'{post_line_head} {post_line_values} {timestamp_s}'
-                    # update influxdb
-                    url = f"{INFLUX_URL}?{urlencode(dict(bucket=INFLUX_DB, precision='s'))}"
-                    logging.debug(f'POST "{post_line}" to "{url}"')
-                    urlopen(Request(url, data=post_line.encode()), timeout=4.0)
+                    try:
+                        add_point(points, last_dt_d, new_dt_d, sensor_name, js_msg)
+                    except (ValueError, TypeError) as e:
+                        logging.warning(f'parsing error: {e!r}')
+            # update influxdb (on error, points are polled again at next refresh)
+            write_points(writer, points, spool)
+            last_dt_d.update(new_dt_d)
         except redis.RedisError as e:
             logging.warning(f'redis error: {e!r}')
-        except urllib.error.URLError as e:
-            logging.warning(f'urllib error occur: {e!r}')
-        except (ValueError, TypeError) as e:
-            logging.warning(f'parsing error: {e!r}')
+        except InfluxError as e:
+            logging.warning(f'influxdb error: {e}')
         # wait next refresh
         time.sleep(60.0)
-except KeyboardInterrupt:
-    sys.exit(0)
-except redis.RedisError as e:
-    logging.error(f'redis error: {e!r}')
-    sys.exit(1)
+
+
+def push_loop(red_cli: redis.StrictRedis, writer: InfluxWriter, flush_s: float = 5.0, batch_size: int = 5000,
+              spool: Optional[Spool] = None, max_points: int = 100_000):
+    """Consume the redis stream, flush points every flush_s seconds (or at batch_size points).
+
+    Without spool, points of a failed write are kept for the next flush (up to max_points, the
+    oldest are dropped beyond).
+    """
+    last_dt_d = {}
+    new_dt_d = {}
+    points = []
+    write_ok = True
+    # start after the current last entry of the stream (from the beginning if empty)
+    last_entry = red_cli.xrevrange(STREAM_KEY, count=1)
+    last_id = last_entry[0][0] if last_entry else '0-0'
+    t_flush = time.monotonic()
+    while True:
+        try:
+            # wait for new stream entries (at most until the next flush)
+            block_ms = max(1, round(1000 * (t_flush + flush_s - time.monotonic())))
+            for _, entries in red_cli.xread({STREAM_KEY: last_id}, count=batch_size, block=block_ms) or []:
+                for entry_id, fields in entries:
+                    last_id = entry_id
+                    try:
+                        add_point(points, last_dt_d, new_dt_d, fields[b'name'].decode(), fields[b'js'])
+                    except (ValueError, TypeError, KeyError) as e:
+                        logging.warning(f'parsing error: {e!r}')
+        except redis.RedisError as e:
+            logging.warning(f'redis error: {e!r}')
+            time.sleep(1.0)
+        # flush points (after a write error, only at flush interval)
+        if (write_ok and len(points) >= batch_size) or time.monotonic() - t_flush >= flush_s:
+            t_flush = time.monotonic()
+            try:
+                write_points(writer, points, spool)
+                write_ok = True
+                last_dt_d.update(new_dt_d)
+                new_dt_d.clear()
+                points.clear()
+            except InfluxError as e:
+                write_ok = False
+                logging.warning(f'influxdb error: {e} ({len(points)} point(s) kept for next flush)')
+                if len(points) > max_points:
+                    logging.warning(f'drop {len(points) - max_points} oldest point(s) (max is {max_points})')
+                    del points[:len(points) - max_points]
+
+
+if __name__ == '__main__':
+    # parse command line args
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-p', '--push', action='store_true', help='consume redis stream "ble-stream" (push mode)')
+    parser.add_argument('--flush-interval', type=float, default=5.0, help='push mode flush interval (default is 5.0 s)')
+    parser.add_argument('--batch-size', type=int, default=5000, help='push mode max points by write (default is 5000)')
+    parser.add_argument('-s', '--spool', metavar='DIR', help='spool directory for failed writes (default is no spool)')
+    parser.add_argument('--spool-max-mb', type=float, default=100.0, help='spool max size (default is 100 MB)')
+    parser.add_argument('--spool-max-days', type=float, default=7.0, help='spool max age (default is 7 days)')
+    parser.add_argument('-u', '--influx-url', default=INFLUX_URL, help=f'influxdb write url (default is "{INFLUX_URL}")')
+    parser.add_argument('-r', '--redis-url', default='redis://localhost:6379/0',
+                        help='redis server url (default is "redis://localhost:6379/0")')
+    parser.add_argument('-d', '--debug', action='store_true', help='set debug mode')
+    args = parser.parse_args()
+    # logging setup
+    level = logging.DEBUG if args.debug else logging.INFO
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', level=level)
+    logging.info('start influxdb ble broadcast relay')
+
+    try:
+        # init redis client and influxdb writer
+        red_cli = redis.StrictRedis.from_url(args.redis_url)
+        writer = InfluxWriter(url=args.influx_url)
+        # init spool and its replay worker (with a dedicated influxdb connection)
+        spool = None
+        if args.spool:
+            spool = Spool(args.spool, max_bytes=round(args.spool_max_mb * 1e6), max_age_s=args.spool_max_days * 86400)
+            SpoolReplay(spool, InfluxWriter(url=args.influx_url).write, write_exc=(InfluxError,),
+                        reject_exc=(InfluxRejectError,)).start()
+        # processing loop
+        if args.push:
+            push_loop(red_cli, writer, flush_s=args.flush_interval, batch_size=args.batch_size, spool=spool)
+        else:
+            poll_loop(red_cli, writer, spool=spool)
+    except KeyboardInterrupt:
+        sys.exit(0)
+    except redis.RedisError as e:
+        logging.error(f'redis error: {e!r}')
+        sys.exit(1)
@@ -0,0 +1,189 @@
+""" Durable write-behind spool of line protocol batches.
+
+Batches that can't be written to influxdb are appended to segment files in a spool directory.
+The active segment is rotated when it reaches its max size. A replay worker drains segments
+(oldest first) in large batches once influxdb is back, with an exponential backoff on errors.
+The active segment is replayed in place (lines appended during its replay are kept), so retries
+during an outage don't create new segments.
+Batches rejected by influxdb (a permanent error like a bad line) are dropped with a log message,
+they don't block the following ones.
+
+The spool is bounded: oldest segments are dropped when total size exceeds max_bytes or when
+they are older than max_age_s.
+
+Replaying a segment after a partial failure can write some points twice, this is harmless for
+influxdb (same series and timestamp overwrite the point).
+"""
+
+import logging
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+
+# some class
+class Spool:
+    """Append-only spool of line protocol lines split in segment files."""
+
+    def __init__(self, path: str, segment_bytes: int = 1_000_000, max_bytes: int = 100_000_000,
+                 max_age_s: float = 7 * 24 * 3600, fsync: bool = True):
+        # public
+        self.path = Path(path)
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.fsync = fsync
+        self.dropped_lines = 0
+        # private
+        self._lock = threading.Lock()
+        self._active: Optional[Path] = None
+        self._active_f = None
+        # init spool directory
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def _segments(self) -> List[Path]:
+        # segment names are a creation timestamp (ns): name order is creation order
+        return sorted(self.path.glob('*.lp'))
+
+    def _rotate(self):
+        if self._active_f:
+            self._active_f.close()
+        self._active = None
+        self._active_f = None
+
+    def _write(self, data: str):
+        # write to the active segment (a new one if needed)
+        if self._active is None:
+            self._active = self.path / f'{time.time_ns():020d}.lp'
+            self._active_f = open(self._active, 'a', encoding='utf-8')
+        self._active_f.write(data)
+        self._active_f.flush()
+        if self.fsync:
+            os.fsync(self._active_f.fileno())
+
+    def _enforce_limits(self):
+        segments = self._segments()
+        sizes = [seg.stat().st_size for seg in segments]
+        total_bytes = sum(sizes)
+        now = time.time()
+        for seg, size in zip(segments, sizes):
+            too_big = total_bytes > self.max_bytes
+            too_old = now - seg.stat().st_mtime > self.max_age_s
+            if not (too_big or too_old):
+                break
+            if seg == self._active:
+                self._rotate()
+            with open(seg, 'rb') as f:
+                lines_nb = sum(1 for _ in f)
+            seg.unlink()
+            total_bytes -= size
+            self.dropped_lines += lines_nb
+            logging.warning(f'spool: drop segment {seg.name} ({lines_nb} line(s), {"size" if too_big else "age"} limit)')
+
+    def append(self, lines: List[str]):
+        """Append a batch of line protocol lines to the active segment."""
+        if not lines:
+            return
+        with self._lock:
+            self._write('\n'.join(lines) + '\n')
+            if self._active_f.tell() >= self.segment_bytes:
+                self._rotate()
+            self._enforce_limits()
+
+    def oldest(self) -> Optional[Path]:
+        """Return the oldest segment (may be the active one)."""
+        with self._lock:
+            segments = self._segments()
+            return segments[0] if segments else None
+
+    def read(self, segment: Path) -> Tuple[List[str], int]:
+        """Return lines of a segment and its size in bytes (the offset of lines appended later)."""
+        with self._lock:
+            with open(segment, 'rb') as f:
+                data = f.read()
+        return [line for line in data.decode('utf-8').splitlines() if line], len(data)
+
+    def remove(self, segment: Path, size: Optional[int] = None):
+        """Remove a replayed segment, lines appended to the active one after size bytes are kept."""
+        with self._lock:
+            tail = ''
+            if segment == self._active:
+                if size is not None and segment.stat().st_size > size:
+                    with open(segment, 'rb') as f:
+                        f.seek(size)
+                        tail = f.read().decode('utf-8')
+                self._rotate()
+            segment.unlink(missing_ok=True)
+            if tail:
+                self._write(tail)
+
+    def __len__(self) -> int:
+        """Number of segments in spool."""
+        with self._lock:
+            return len(self._segments())
+
+    def close(self):
+        with self._lock:
+            self._rotate()
+
+
+class SpoolReplay(threading.Thread):
+    """Worker thread that drains a spool with a write function (like InfluxWriter.write)."""
+
+    def __init__(self, spool: Spool, write: Callable[[List[str]], None], write_exc: tuple = (Exception,),
+                 reject_exc: tuple = (), batch_size: int = 5000, batch_pause_s: float = 0.2, backoff_min_s: float = 1.0,
+                 backoff_max_s: float = 300.0):
+        super().__init__(daemon=True)
+        # public
+        self.spool = spool
+        self.write = write
+        self.write_exc = write_exc
+        self.reject_exc = reject_exc
+        self.batch_size = batch_size
+        self.batch_pause_s = batch_pause_s
+        self.backoff_min_s = backoff_min_s
+        self.backoff_max_s = backoff_max_s
+        self.replayed_lines = 0
+        self.rejected_lines = 0
+        # private
+        self._stop_evt = threading.Event()
+
+    def stop(self):
+        self._stop_evt.set()
+
+    def _replay_segment(self, segment: Path):
+        lines, size = self.spool.read(segment)
+        for i in range(0, len(lines), self.batch_size):
+            batch = lines[i:i + self.batch_size]
+            try:
+                self.write(batch)
+                self.replayed_lines += len(batch)
+            except self.reject_exc as e:
+                # retry can't succeed: drop this batch, go on with the next ones
+                self.rejected_lines += len(batch)
+                logging.error(f'spool: segment {segment.name} batch rejected, drop {len(batch)} line(s) ({e})')
+            # don't overwhelm influxdb
+            if self._stop_evt.wait(self.batch_pause_s):
+                return
+        self.spool.remove(segment, size)
+        logging.info(f'spool: segment {segment.name} replayed ({len(lines)} line(s))')
+
+    def run(self):
+        backoff_s = self.backoff_min_s
+        while not self._stop_evt.is_set():
+            segment = self.spool.oldest()
+            if segment is None:
+                self._stop_evt.wait(1.0)
+                continue
+            try:
+                self._replay_segment(segment)
+                backoff_s = self.backoff_min_s
+            except self.write_exc as e:
+                logging.warning(f'spool: replay error, retry in {backoff_s:.0f} s ({e})')
+                self._stop_evt.wait(backoff_s)
+                backoff_s = min(2 * backoff_s, self.backoff_max_s)
+            except FileNotFoundError:
+                # segment dropped by limits enforcement
+                pass
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+"""A fake influxdb v2 write endpoint (HTTP/1.1 keep-alive) for testing purposes.
+
+Log every write request (lines count, connection reuse) and return HTTP 204 like influxdb does.
+
+Test with:
+curl -v --data-binary 'ble_sensors,sensor=foo temp_c=21.0 1700000000' http://localhost:8086/api/v2/write
+"""
+
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logging
+
+
+# some class
+class HandleRequests(BaseHTTPRequestHandler):
+    """Custom HTTP handler"""
+    # allow keep-alive
+    protocol_version = 'HTTP/1.1'
+    # stats
+    requests_count = 0
+    lines_count = 0
+
+    def log_message(self, format, *args):
+        """Replace log_message to turn off log msg."""
+        return None
+
+    def do_POST(self):
+        """Process HTTP POST request."""
+        if self.path.startswith('/api/v2/write'):
+            content_length = int(self.headers.get('Content-Length', 0))
+            lines = self.rfile.read(content_length).decode().splitlines()
+            HandleRequests.requests_count += 1
+            HandleRequests.lines_count += len(lines)
+            logging.info(f'write: {len(lines)} line(s) from {self.client_address} '
+                         f'(total: {HandleRequests.requests_count} request(s), {HandleRequests.lines_count} line(s))')
+            for line in lines:
+                logging.debug(f'line: {line}')
+            # HTTP code "No Content"
+            self.send_response(204)
+        else:
+            # return HTTP 404 page not found
+            self.send_response(404)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+# main program
+if __name__ == '__main__':
+    # parse command line args
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-b', '--bind', default='localhost', help='bind address (default is "localhost")')
+    parser.add_argument('-p', '--port', type=int, default=8086, help='listen port (default is 8086)')
+    parser.add_argument('-d', '--debug', action='store_true', help='set debug mode')
+    args = parser.parse_args()
+    # logging setup
+    level = logging.DEBUG if args.debug else logging.INFO
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', level=level)
+    logging.info(f'start fake influxdb on {args.bind}:{args.port}')
+    # init and start HTTP server
+    ThreadingHTTPServer.allow_reuse_address = True
+    ThreadingHTTPServer((args.bind, args.port), HandleRequests).serve_forever()
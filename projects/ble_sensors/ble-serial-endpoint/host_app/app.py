@@ -1,20 +1,243 @@
 #!/usr/bin/env python3
 
-""" Relay json message from serial to redis DB. """
+""" Relay json message from serial to redis DB.
+
+Serial messages are json lines (default) or COBS framed binary messages (with -b/--binary).
+
+With -B/--batch, all available serial messages are read at once and redis updates are sent in
+one pipeline per flush interval (or when batch size is reached). Updates of the same device
+in a batch are collapsed (last one wins). Throughput and latency metrics are logged and
+exported to the redis hash "ble-endpoint-metrics".
+
+With -s/--stream, every update is also published to the redis stream "ble-stream" (fields
+"name" and "js") for push consumers like ble-influx-relay.
+
+Sensors names are indexed in the redis set "ble-sensors" (consumers don't need KEYS). With
+-t/--timeseries, every reading is also appended to the capped time series "ble-ts:<name>"
+(see ble_ts.py for the key-space and the query helper).
+
+Test without hardware with tools/fake_serial.py (pty serial port) and a local redis server.
+"""
 
 import argparse
+from collections import deque
 from datetime import datetime
 import json
 import logging
 import sys
+import time
 import serial
 import redis
+from ble_frame import FrameDecoder
+from ble_ts import TS_MAXLEN, index_add, js_key, ts_append
 from conf.private_data import ID_NAME_DICT
 
 
+# some const
+LAST_SEEN_KEY = 'ble-last-seen-by-ids'
+METRICS_KEY = 'ble-endpoint-metrics'
+STREAM_KEY = 'ble-stream'
+STREAM_MAXLEN = 10_000
+TS_PENDING_MAX = 100_000
+
+
+# some class
+class Metrics:
+    """Throughput and latency counters (reset at each report)."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._t_start = time.monotonic()
+        self.msg_rx = 0
+        self.msg_collapsed = 0
+        self.ts_dropped = 0
+        self.keys_written = 0
+        self.flushes = 0
+        self.flush_s_sum = 0.0
+        self.flush_s_max = 0.0
+        self.latency_s_sum = 0.0
+        self.latency_s_max = 0.0
+
+    def on_flush(self, keys: int, flush_s: float, latency_s_l: list):
+        self.flushes += 1
+        self.keys_written += keys
+        self.flush_s_sum += flush_s
+        self.flush_s_max = max(self.flush_s_max, flush_s)
+        self.latency_s_sum += sum(latency_s_l)
+        self.latency_s_max = max(self.latency_s_max, *latency_s_l, 0.0)
+
+    def report(self) -> dict:
+        """Return metrics as a dict and reset counters."""
+        elapsed_s = max(time.monotonic() - self._t_start, 1e-6)
+        report_d = dict(msg_rx_per_s=round(self.msg_rx / elapsed_s, 2),
+                        keys_written_per_s=round(self.keys_written / elapsed_s, 2),
+                        msg_collapsed=self.msg_collapsed,
+                        ts_dropped=self.ts_dropped,
+                        flushes=self.flushes,
+                        flush_ms_avg=round(1000 * self.flush_s_sum / max(self.flushes, 1), 3),
+                        flush_ms_max=round(1000 * self.flush_s_max, 3),
+                        latency_ms_avg=round(1000 * self.latency_s_sum / max(self.keys_written, 1), 3),
+                        latency_ms_max=round(1000 * self.latency_s_max, 3))
+        self.reset()
+        return report_d
+
+
+class RedisBatch:
+    """Collect BLE messages and write them to redis with one pipeline per flush."""
+
+    def __init__(self, red_cli: redis.StrictRedis, max_size: int = 100, flush_s: float = 1.0, stream: bool = False,
+                 timeseries: bool = False, ts_maxlen: int = TS_MAXLEN):
+        # public
+        self.max_size = max_size
+        self.flush_s = flush_s
+        self.stream = stream
+        self.timeseries = timeseries
+        self.ts_maxlen = ts_maxlen
+        self.metrics = Metrics()
+        # private
+        self._red_cli = red_cli
+        self._pending = {}
+        # time series readings are not collapsed: (device id, json, timestamp)
+        self._ts_pending = deque(maxlen=TS_PENDING_MAX)
+        self._t_first = None
+
+    def add(self, msg_d: dict, rx_dt: datetime):
+        self.metrics.msg_rx += 1
+        if self._t_first is None:
+            self._t_first = time.monotonic()
+        # collapse repeated updates of a device: keep the last one
+        device_id = msg_d['id']
+        if device_id in self._pending:
+            self.metrics.msg_collapsed += 1
+        self._pending[device_id] = (msg_d, rx_dt, time.monotonic())
+        if self.timeseries:
+            # redis unavailable for a long time: the oldest readings are dropped
+            if len(self._ts_pending) == TS_PENDING_MAX:
+                self.metrics.ts_dropped += 1
+            self._ts_pending.append((device_id, json.dumps(dict(msg_d, receive_dt=rx_dt.isoformat())),
+                                     rx_dt.timestamp()))
+
+    @property
+    def flush_needed(self) -> bool:
+        if self._t_first is None:
+            return False
+        return len(self._pending) >= self.max_size or time.monotonic() - self._t_first >= self.flush_s
+
+    def flush(self, extra_metrics: dict = None):
+        """Write pending updates (and optional metrics hash) to redis in one round trip."""
+        if not self._pending and not extra_metrics:
+            return
+        t_flush = time.monotonic()
+        pipe = self._red_cli.pipeline(transaction=False)
+        last_seen_d = {}
+        for device_id, (msg_d, rx_dt, _) in self._pending.items():
+            rx_dt_iso = rx_dt.isoformat()
+            msg_d['receive_dt'] = rx_dt_iso
+            msg_d_as_js = json.dumps(msg_d)
+            pipe.set(redis_key(device_id), msg_d_as_js, ex=3600)
+            if self.stream:
+                stream_publish(pipe, device_id, msg_d_as_js)
+            last_seen_d[device_id] = rx_dt_iso
+        for device_id, msg_d_as_js, timestamp in self._ts_pending:
+            ts_append(pipe, device_name(device_id), msg_d_as_js, timestamp, maxlen=self.ts_maxlen)
+        if last_seen_d:
+            pipe.hset(LAST_SEEN_KEY, mapping=last_seen_d)
+            index_add(pipe, *[device_name(device_id) for device_id in last_seen_d])
+        if extra_metrics:
+            pipe.hset(METRICS_KEY, mapping=extra_metrics)
+        # on a redis error, pending updates are kept for the next flush
+        pipe.execute()
+        pending = self._pending
+        self._pending = {}
+        self._ts_pending.clear()
+        self._t_first = None
+        t_done = time.monotonic()
+        self.metrics.on_flush(len(pending), t_done - t_flush, [t_done - t_rx for _, _, t_rx in pending.values()])
+        logging.debug(f'redis flush: {len(pending)} key(s) in {1000 * (t_done - t_flush):.3f} ms')
+
+
+# some func
+def device_name(device_id: str) -> str:
+    """Return the name of a device (or its id if name is not set)."""
+    return ID_NAME_DICT.get(device_id, device_id)
+
+
+def redis_key(device_id: str) -> str:
+    """Return the redis key of a device."""
+    # try to find a BLE device name from its current device id
+    # priority to key name "ble-data-js:name" if name is set, else use "ble-data-js:id"
+    return js_key(device_name(device_id))
+
+
+def stream_publish(red_cli: redis.StrictRedis, device_id: str, msg_d_as_js: str):
+    """Publish a json message to the (capped) BLE redis stream."""
+    red_cli.xadd(STREAM_KEY, dict(name=device_name(device_id), js=msg_d_as_js),
+                 maxlen=STREAM_MAXLEN, approximate=True)
+
+
+def redis_update(red_cli: redis.StrictRedis, msg_d: dict, rx_dt: datetime, stream: bool = False,
+                 timeseries: bool = False, ts_maxlen: int = TS_MAXLEN):
+    """Update redis keys with a BLE message dict."""
+    # add "receive_dt" field
+    msg_d['receive_dt'] = rx_dt.isoformat()
+    # update redis json key
+    device_id = msg_d['id']
+    redis_key_name = redis_key(device_id)
+    msg_d_as_js = json.dumps(msg_d)
+    logging.debug(f'redis set key {redis_key_name}: {msg_d_as_js}')
+    red_cli.set(redis_key_name, msg_d_as_js, ex=3600)
+    # update last seen redis hash and sensors index
+    red_cli.hset(LAST_SEEN_KEY, device_id, rx_dt.isoformat())
+    index_add(red_cli, device_name(device_id))
+    # append to time series
+    if timeseries:
+        ts_append(red_cli, device_name(device_id), msg_d_as_js, rx_dt.timestamp(), maxlen=ts_maxlen)
+    # publish update to stream
+    if stream:
+        stream_publish(red_cli, device_id, msg_d_as_js)
+
+
+def read_messages(serial_p: serial.Serial, binary: bool, frame_dec: FrameDecoder, line_buf: bytearray) -> list:
+    """Read all available serial data, return a list of decoded message dicts."""
+    rx_data = serial_p.read(max(1, serial_p.in_waiting))
+    if binary:
+        frames_err = frame_dec.frames_err
+        msg_l = frame_dec.feed(rx_data)
+        if frame_dec.frames_err != frames_err:
+            logging.warning(f'frame error: {frame_dec.last_error!r}')
+        return msg_l
+    line_buf += rx_data
+    *lines, tail = line_buf.split(b'\n')
+    line_buf[:] = tail
+    msg_l = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        logging.debug(f'rx message: {line.decode(errors="replace")}')
+        try:
+            msg_l.append(json.loads(line))
+        except ValueError as e:
+            logging.warning(f'parsing error: {e!r}')
+    return msg_l
+
+
 # parse command line args
 parser = argparse.ArgumentParser()
 parser.add_argument('port', nargs='?', default='/dev/ttyACM0', help='serial port (default is "/dev/ttyACM0")')
+parser.add_argument('-b', '--binary', action='store_true', help='serial messages are binary frames (default is json)')
+parser.add_argument('-B', '--batch', action='store_true', help='batch redis updates in pipelines')
+parser.add_argument('--batch-size', type=int, default=100, help='max devices by batch (default is 100)')
+parser.add_argument('--flush-interval', type=float, default=1.0, help='batch flush interval (default is 1.0 s)')
+parser.add_argument('-s', '--stream', action='store_true', help='publish updates to redis stream "ble-stream"')
+parser.add_argument('-t', '--timeseries', action='store_true', help='append readings to time series "ble-ts:<name>"')
+parser.add_argument('--ts-maxlen', type=int, default=TS_MAXLEN,
+                    help=f'max readings by time series (default is {TS_MAXLEN})')
+parser.add_argument('--metrics-interval', type=float, default=60.0, help='metrics report interval (default is 60 s)')
+parser.add_argument('-r', '--redis-url', default='redis://localhost:6379/0',
+                    help='redis server url (default is "redis://localhost:6379/0")')
 parser.add_argument('-d', '--debug', action='store_true', help='set debug mode')
 args = parser.parse_args()
 # logging setup
@@ -24,35 +247,42 @@ logging.info('start ble broadcast endpoint host app')
 
 try:
     # init redis client and serial port
-    red_cli = redis.StrictRedis()
-    serial_p = serial.Serial(port=args.port)
+    red_cli = redis.StrictRedis.from_url(args.redis_url)
+    # in batch mode, a read timeout ensure periodic flushes on a quiet line
+    serial_p = serial.Serial(port=args.port, timeout=args.flush_interval if args.batch else None)
     serial_p.reset_input_buffer()
+    frame_dec = FrameDecoder()
+    line_buf = bytearray()
+    batch = RedisBatch(red_cli, max_size=args.batch_size, flush_s=args.flush_interval, stream=args.stream,
+                       timeseries=args.timeseries, ts_maxlen=args.ts_maxlen)
+    t_metrics = time.monotonic()
 
     # serial message processing loop
     while True:
         try:
-            # read serial message as a json struct
-            js_msg = serial_p.readline().strip().decode()
+            msg_l = read_messages(serial_p, args.binary, frame_dec, line_buf)
             rx_dt = datetime.now().astimezone()
-            logging.debug(f'rx message: {js_msg}')
-            # convert rx json msg to dict
-            msg_d = json.loads(js_msg)
-            # add "receive_dt" field
-            msg_d['receive_dt'] = rx_dt.isoformat()
-            # try to find a BLE device name from its current device id
-            device_id = msg_d['id']
-            try:
-                device_name = ID_NAME_DICT[device_id]
-            except KeyError:
-                device_name = device_id
-            # update redis json key
-            # priority to key name "ble-data-js:name" if name is set, else use "ble-data-js:id"
-            redis_key = f'ble-js:{device_name}'
-            msg_d_as_js = json.dumps(msg_d)
-            logging.debug(f'redis set key {redis_key}: {msg_d_as_js}')
-            red_cli.set(redis_key, msg_d_as_js, ex=3600)
-            # update last seen redis hash
-            red_cli.hset(f'ble-last-seen-by-ids', device_id, rx_dt.isoformat())
+            for msg_d in msg_l:
+                # a bad message must not drop the next ones
+                try:
+                    if args.batch:
+                        batch.add(msg_d, rx_dt)
+                    else:
+                        redis_update(red_cli, msg_d, rx_dt, stream=args.stream, timeseries=args.timeseries,
+                                     ts_maxlen=args.ts_maxlen)
+                except redis.RedisError as e:
+                    logging.warning(f'redis error: {e!r}')
+                except (ValueError, KeyError, TypeError) as e:
+                    logging.warning(f'parsing error: {e!r}')
+            if args.batch:
+                # export metrics with the next flush
+                metrics_d = None
+                if time.monotonic() - t_metrics >= args.metrics_interval:
+                    t_metrics = time.monotonic()
+                    metrics_d = batch.metrics.report()
+                    logging.info(f'metrics: {metrics_d}')
+                if batch.flush_needed or metrics_d:
+                    batch.flush(extra_metrics=metrics_d)
         except redis.RedisError as e:
             logging.warning(f'redis error: {e!r}')
         except (ValueError, KeyError) as e:
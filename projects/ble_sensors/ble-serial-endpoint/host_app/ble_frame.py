@@ -0,0 +1,116 @@
+""" Decode the binary frames sent by the BLE serial endpoint (see mpy_app/lib/ble_frame.py).
+
+Frame layout (little endian, 14 bytes):
+
+    [model id: u8][bd_addr: 6 bytes][rssi: i8][temp (0.1 °C): i16][hum (%): u8][batt (%): u8][crc16: u16]
+
+Frames are COBS encoded and delimited by 0x00.
+"""
+
+import struct
+from typing import List, Optional
+
+
+# some const
+MODEL_NAMES = {1: 'tp357', 2: 'w3400010'}
+FRAME_LEN = 14
+# COBS encoded frame size (without delimiter)
+BLOCK_LEN = FRAME_LEN + 1
+FRAME_STRUCT = struct.Struct('<B6sbhBBH')
+NA = 0xff
+
+
+# some func
+def crc16(data: bytes) -> int:
+    """Return CRC-16/CCITT-FALSE of data."""
+    crc = 0xffff
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021 if crc & 0x8000 else crc << 1) & 0xffff
+    return crc
+
+
+def cobs_encode(data: bytes) -> bytes:
+    """COBS encode a block (shorter than 254 bytes), without the 0x00 delimiter."""
+    return b''.join(bytes([len(chunk) + 1]) + chunk for chunk in data.split(b'\x00'))
+
+
+def cobs_decode(data: bytes) -> bytes:
+    """Decode a COBS encoded block (without the 0x00 delimiter)."""
+    out = bytearray()
+    idx = 0
+    while idx < len(data):
+        code = data[idx]
+        if code == 0 or idx + code > len(data):
+            raise ValueError('bad COBS encoding')
+        out += data[idx + 1:idx + code]
+        idx += code
+        if code < 0xff and idx < len(data):
+            out.append(0)
+    return bytes(out)
+
+
+def decode_frame(frame: bytes) -> dict:
+    """Return the message dict (same keys as json mode) of a decoded frame."""
+    if len(frame) != FRAME_LEN:
+        raise ValueError(f'bad frame length ({len(frame)})')
+    model_id, addr, rssi, temp, hum, batt, crc = FRAME_STRUCT.unpack(frame)
+    if crc16(frame[:-2]) != crc:
+        raise ValueError('bad frame CRC')
+    bd_addr = addr.hex('-')
+    msg_d = dict(bd_addr=bd_addr, rssi=rssi, id=bd_addr, model=MODEL_NAMES.get(model_id, 'unknown'),
+                 temp_c=temp / 10)
+    if hum != NA:
+        msg_d['hum_p'] = hum
+    if batt != NA:
+        msg_d['batt_p'] = batt
+    return msg_d
+
+
+def encode_frame(msg_d: dict) -> bytes:
+    """Return a message dict as a delimited binary frame (like the Pico encoder does)."""
+    model_id = {name: m_id for m_id, name in MODEL_NAMES.items()}.get(msg_d['model'], 0)
+    hum, batt = msg_d.get('hum_p'), msg_d.get('batt_p')
+    frame = FRAME_STRUCT.pack(model_id, bytes.fromhex(msg_d['bd_addr'].replace('-', '')), msg_d['rssi'],
+                              round(msg_d['temp_c'] * 10), NA if hum is None else hum,
+                              NA if batt is None else batt, 0)[:-2]
+    frame += crc16(frame).to_bytes(2, byteorder='little')
+    return cobs_encode(frame) + b'\x00'
+
+
+# some class
+class FrameDecoder:
+    """Incremental decoder: feed it with raw serial data, get back a batch of message dicts.
+
+    Partial frames are kept until the next feed, invalid frames are counted and skipped.
+    """
+
+    def __init__(self):
+        # public
+        self.frames_ok = 0
+        self.frames_err = 0
+        self.last_error: Optional[Exception] = None
+        # private
+        self._buf = bytearray()
+
+    def feed(self, data: bytes) -> List[dict]:
+        self._buf += data
+        *blocks, tail = self._buf.split(b'\x00')
+        # keep partial frame for next feed (bounded, a valid one can't be longer than a block)
+        self._buf = bytearray(tail[-BLOCK_LEN:])
+        msg_l = []
+        for block in blocks:
+            # skip empty blocks (like consecutive delimiters on resync)
+            if not block:
+                continue
+            # frames have a fixed size: drop leading garbage (like REPL text) to resync
+            if len(block) > BLOCK_LEN:
+                block = block[-BLOCK_LEN:]
+            try:
+                msg_l.append(decode_frame(cobs_decode(block)))
+                self.frames_ok += 1
+            except (ValueError, struct.error) as e:
+                self.frames_err += 1
+                self.last_error = e
+        return msg_l
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+""" Redis key-space of BLE sensors data: last reading, sensors index and time series.
+
+Keys:
+- "ble-js:<name>": last reading of a sensor as json (1 h TTL)
+- "ble-sensors": set of sensors names (index, consumers don't need KEYS)
+- "ble-ts:<name>": time series of a sensor, a sorted set of json readings scored by receive
+  timestamp (s), capped to the most recent TS_MAXLEN readings
+
+Query helper: readings of the last N minutes for some (or all) sensors in one round trip, like:
+
+    ./ble_ts.py -m 30 sensor_1 sensor_2
+"""
+
+import argparse
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+import redis
+
+
+# some const
+JS_KEY_PREFIX = 'ble-js:'
+TS_KEY_PREFIX = 'ble-ts:'
+SENSORS_KEY = 'ble-sensors'
+TS_MAXLEN = 10_000
+
+
+# some func
+def js_key(name: str) -> str:
+    return f'{JS_KEY_PREFIX}{name}'
+
+
+def ts_key(name: str) -> str:
+    return f'{TS_KEY_PREFIX}{name}'
+
+
+def index_add(red_cli: redis.StrictRedis, *names: str):
+    """Add sensors names to the index."""
+    red_cli.sadd(SENSORS_KEY, *names)
+
+
+def ts_append(red_cli: redis.StrictRedis, name: str, msg_d_as_js: str, timestamp: float, maxlen: int = TS_MAXLEN):
+    """Append a reading to the sensor time series (call it on a pipeline to batch updates)."""
+    key = ts_key(name)
+    red_cli.zadd(key, {msg_d_as_js: timestamp})
+    # keep only the maxlen most recent readings
+    red_cli.zremrangebyrank(key, 0, -maxlen - 1)
+
+
+def sensors(red_cli: redis.StrictRedis) -> List[str]:
+    """Return names of indexed sensors."""
+    return sorted(name.decode() for name in red_cli.smembers(SENSORS_KEY))
+
+
+def last_readings(red_cli: redis.StrictRedis, names: Optional[List[str]] = None) -> Dict[str, dict]:
+    """Return last reading of sensors (all indexed sensors by default) as {name: msg_d}."""
+    names = names or sensors(red_cli)
+    if not names:
+        return {}
+    return {name: json.loads(js) for name, js in zip(names, red_cli.mget([js_key(n) for n in names])) if js}
+
+
+def query(red_cli: redis.StrictRedis, names: Optional[List[str]] = None, minutes: float = 10.0,
+          end_s: Optional[float] = None, count: Optional[int] = None) -> Dict[str, List[Tuple[float, dict]]]:
+    """Return readings of the last minutes (before end_s, default is now) as {name: [(timestamp, msg_d)...]}.
+
+    With count, return at most the count most recent readings of each sensor.
+    All sensors are read with one pipeline (one round trip, plus one for the index if names is not set).
+    """
+    names = names or sensors(red_cli)
+    end_s = time.time() if end_s is None else end_s
+    start_s = end_s - 60.0 * minutes
+    pipe = red_cli.pipeline(transaction=False)
+    for name in names:
+        if count:
+            pipe.zrevrangebyscore(ts_key(name), end_s, start_s, start=0, num=count, withscores=True)
+        else:
+            pipe.zrangebyscore(ts_key(name), start_s, end_s, withscores=True)
+    results_d = {}
+    for name, readings in zip(names, pipe.execute()):
+        if count:
+            readings.reverse()
+        results_d[name] = [(ts, json.loads(js)) for js, ts in readings]
+    return results_d
+
+
+if __name__ == '__main__':
+    # parse command line args
+    parser = argparse.ArgumentParser()
+    parser.add_argument('names', nargs='*', help='sensors names (default is all indexed sensors)')
+    parser.add_argument('-m', '--minutes', type=float, default=10.0, help='last N minutes (default is 10)')
+    parser.add_argument('-n', '--count', type=int, default=None, help='max readings by sensor')
+    parser.add_argument('-l', '--list', action='store_true', help='list indexed sensors')
+    parser.add_argument('-r', '--redis-url', default='redis://localhost:6379/0',
+                        help='redis server url (default is "redis://localhost:6379/0")')
+    args = parser.parse_args()
+
+    red_cli = redis.StrictRedis.from_url(args.redis_url)
+    if args.list:
+        for name in sensors(red_cli):
+            print(name)
+    else:
+        for name, readings in query(red_cli, args.names, minutes=args.minutes, count=args.count).items():
+            for timestamp, msg_d in readings:
+                print(json.dumps({'sensor': name, 'timestamp': timestamp, **msg_d}))
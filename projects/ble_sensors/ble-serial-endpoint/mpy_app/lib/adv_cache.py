@@ -0,0 +1,68 @@
+""" Per-device advertisement cache: deduplication, rate limiting and RSSI smoothing.
+
+Passive scans receive the same advertising payload from a sensor several times per second.
+This cache (keyed by device address) keeps the hash of the last emitted payload, the last
+emit time and an exponential moving average of RSSI. An advertisement is emitted only when
+its payload changes or when the heartbeat interval of the device model has elapsed.
+
+Cache is bounded, least recently used devices are evicted first.
+"""
+
+from micropython import const
+from ucollections import OrderedDict
+from utime import ticks_diff, ticks_ms
+
+
+# some const
+_HASH = const(0)
+_LAST_MS = const(1)
+_RSSI = const(2)
+
+
+# some class
+class AdvCache:
+    def __init__(self, size: int = 32, heartbeat_ms: dict = None, default_heartbeat_ms: int = 60_000,
+                 rssi_alpha: float = 0.25):
+        # public
+        self.size = size
+        self.heartbeat_ms = heartbeat_ms or {}
+        self.default_heartbeat_ms = default_heartbeat_ms
+        self.rssi_alpha = rssi_alpha
+        # private
+        # entries as [payload hash, last emit ms, rssi average]
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def update(self, addr: str, model: str, payload: bytes, rssi: int) -> bool:
+        """Update device entry, return True if this advertisement must be emitted."""
+        now_ms = ticks_ms()
+        p_hash = hash(bytes(payload))
+        # pop entry: re-insert it at the end keep LRU order
+        entry = self._entries.pop(addr, None)
+        if entry is None:
+            # evict least recently used devices
+            while len(self._entries) >= self.size:
+                self._entries.pop(next(iter(self._entries)))
+            entry = [p_hash, now_ms, float(rssi)]
+            emit = True
+        else:
+            # smooth rssi (exponential moving average)
+            entry[_RSSI] += self.rssi_alpha * (rssi - entry[_RSSI])
+            # emit on payload change or if heartbeat delay is reached
+            hb_ms = self.heartbeat_ms.get(model, self.default_heartbeat_ms)
+            emit = entry[_HASH] != p_hash or ticks_diff(now_ms, entry[_LAST_MS]) >= hb_ms
+            if emit:
+                entry[_HASH] = p_hash
+                entry[_LAST_MS] = now_ms
+        self._entries[addr] = entry
+        return emit
+
+    def rssi(self, addr: str) -> int:
+        """Return the smoothed RSSI of a device (or None if unknown)."""
+        entry = self._entries.get(addr)
+        return round(entry[_RSSI]) if entry else None
+
+    def clear(self):
+        self._entries.clear()
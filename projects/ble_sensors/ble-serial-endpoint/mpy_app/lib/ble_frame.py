@@ -0,0 +1,84 @@
+""" Compact binary framing of BLE sensor data (Pico to host link).
+
+Frame layout (little endian, 14 bytes):
+
+    [model id: u8][bd_addr: 6 bytes][rssi: i8][temp (0.1 °C): i16][hum (%): u8][batt (%): u8][crc16: u16]
+
+hum and batt are set to 0xff when not available. CRC is CRC-16/CCITT-FALSE of the 12 first
+bytes. Each frame is COBS encoded and terminated by a 0x00 delimiter, so the encoded frame
+has a fixed size of 16 bytes.
+
+Encoder use preallocated buffers: no allocation at each frame.
+"""
+
+from array import array
+from micropython import const
+from ustruct import pack_into
+
+
+# some const
+MODEL_IDS = {'tp357': 1, 'w3400010': 2}
+FRAME_LEN = const(14)
+FRAME_FMT = '<B6sbhBB'
+_DATA_LEN = const(12)
+_NA = const(0xff)
+
+
+# some func
+def _crc16_table() -> array:
+    table = array('H', [0] * 256)
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = (crc << 1) ^ 0x1021 if crc & 0x8000 else crc << 1
+        table[i] = crc & 0xffff
+    return table
+
+
+_CRC_TABLE = _crc16_table()
+
+
+def crc16(buf, length: int) -> int:
+    """Return CRC-16/CCITT-FALSE of the first length bytes of buf."""
+    crc = 0xffff
+    for i in range(length):
+        crc = ((crc << 8) & 0xffff) ^ _CRC_TABLE[(crc >> 8) ^ buf[i]]
+    return crc
+
+
+# some class
+class FrameEncoder:
+    def __init__(self):
+        # public
+        # encoded frame (COBS + 0x00 delimiter), ready to be written
+        self.out = bytearray(FRAME_LEN + 2)
+        # private
+        self._raw = bytearray(FRAME_LEN)
+
+    def encode(self, model: str, addr: bytes, rssi: int, temp_c: float, hum_p: int = None, batt_p: int = None):
+        """Encode sensor data to self.out."""
+        raw = self._raw
+        pack_into(FRAME_FMT, raw, 0, MODEL_IDS.get(model, 0), addr, rssi, round(temp_c * 10),
+                  _NA if hum_p is None else hum_p, _NA if batt_p is None else batt_p)
+        crc = crc16(raw, _DATA_LEN)
+        raw[_DATA_LEN] = crc & 0xff
+        raw[_DATA_LEN + 1] = crc >> 8
+        # COBS encode raw to out (for a frame < 254 bytes, encoded size is always len + 1)
+        out = self.out
+        code_idx = 0
+        code = 1
+        o_idx = 1
+        for i in range(FRAME_LEN):
+            b = raw[i]
+            if b == 0:
+                out[code_idx] = code
+                code_idx = o_idx
+                code = 1
+            else:
+                out[o_idx] = b
+                code += 1
+            o_idx += 1
+        out[code_idx] = code
+        # frame delimiter
+        out[o_idx] = 0
+        return out
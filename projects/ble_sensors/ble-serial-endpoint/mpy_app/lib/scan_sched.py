@@ -0,0 +1,201 @@
+""" Adaptive duty-cycle BLE scan scheduler.
+
+Scanning continuously (100 % duty) is the main power cost of a BLE gateway, but sensors
+advertise at a fixed interval and we only need one advertisement of each one by report
+period. This scheduler learns the advertising interval of every sensor, then scans only in
+short windows aligned on the next expected advertisement of each sensor:
+
+- learn: continuous scan until every registered sensor is seen and its interval is known (without
+  a registered devices list, also until no new sensor is discovered for learn_ms)
+- windows: for each sensor, once its report period is elapsed, open a window centered on its
+  next expected advertisement (margin grows with the number of intervals to extrapolate)
+- catch up: a sensor missed in its window is overdue, back to continuous scan until it is
+  seen again (this is counted as a miss)
+
+Sensors not seen for lost_ms are ignored until they are seen again, so a dead sensor does not
+keep the radio on forever.
+
+All methods take the current time (ms ticks) as argument: the scheduler does no I/O and can
+be tested on host CPython against a simulated advertiser timeline (see tools/scan_sim.py).
+
+Usage:
+
+    sched = ScanScheduler(report_ms=60_000)
+    # in BLE IRQ: sched.seen(bd_addr, ticks_ms())
+    while True:
+        scan_ms, idle_ms = sched.next(ticks_ms())
+        ...
+"""
+
+try:
+    from micropython import const
+except ImportError:
+    def const(x):
+        return x
+try:
+    from utime import ticks_add, ticks_diff
+except ImportError:
+    def ticks_add(ticks, delta):
+        return ticks + delta
+
+    def ticks_diff(ticks1, ticks2):
+        return ticks1 - ticks2
+
+
+# some const
+MODE_LEARN = const(0)
+MODE_WINDOWS = const(1)
+MODE_CATCH_UP = const(2)
+MODE_NAMES = ('learn', 'windows', 'catch-up')
+# advertising events of a device on the 3 channels are closer than this: count it once
+MIN_ADV_INTERVAL_MS = const(20)
+# device entry fields
+_LAST_MS = const(0)
+_INTERVAL_MS = const(1)
+_N_SEEN = const(2)
+_DUE_MS = const(3)
+_OVERDUE = const(4)
+
+
+# some class
+class ScanScheduler:
+    def __init__(self, devices: list = None, report_ms: int = 60_000, learn_count: int = 4,
+                 learn_ms: int = 60_000, margin_ms: int = 100, drift_ms: int = 2, chunk_ms: int = 1_000, max_idle_ms: int = 10_000,
+                 lost_ms: int = 600_000, now_ms: int = 0):
+        # an interval is known after 2 advertisements at least
+        if learn_count < 2:
+            raise ValueError('learn_count must be at least 2')
+        # public
+        self.report_ms = report_ms
+        self.learn_count = learn_count
+        self.learn_ms = learn_ms
+        self.margin_ms = margin_ms
+        self.drift_ms = drift_ms
+        self.chunk_ms = chunk_ms
+        self.max_idle_ms = max_idle_ms
+        self.lost_ms = lost_ms
+        # with a registered devices list, other devices are ignored
+        self.auto_register = devices is None
+        self.mode = MODE_LEARN
+        # stats
+        self.hits = 0
+        self.misses = 0
+        self.scan_ms = 0
+        self.t_start_ms = now_ms
+        # private
+        # device entries as [last seen ms, interval ms, seen count, report due ms, overdue flag]
+        self._devices = {}
+        self._t_init_ms = now_ms
+        self._t_new_ms = now_ms
+        for addr in devices or ():
+            self._devices[addr] = [None, 0.0, 0, now_ms, False]
+
+    def __len__(self):
+        return len(self._devices)
+
+    def seen(self, addr, now_ms: int):
+        """Record an advertisement of addr (IRQ safe: no allocation for known devices)."""
+        entry = self._devices.get(addr)
+        if entry is None:
+            if not self.auto_register:
+                return
+            entry = [None, 0.0, 0, now_ms, False]
+            self._devices[addr] = entry
+            self._t_new_ms = now_ms
+        last_ms = entry[_LAST_MS]
+        if last_ms is not None:
+            delta = ticks_diff(now_ms, last_ms)
+            if delta < MIN_ADV_INTERVAL_MS:
+                return
+            interval = entry[_INTERVAL_MS]
+            if interval == 0.0 or delta < interval * 0.75:
+                # first or shorter interval (a too long one is a multiple of the real interval)
+                entry[_INTERVAL_MS] = float(delta)
+            else:
+                # refine estimate with delta divided by the count of intervals it contains
+                n = int(delta / interval + 0.5)
+                if abs(delta - n * interval) < interval / 4:
+                    entry[_INTERVAL_MS] = interval + 0.25 * (delta / n - interval)
+        entry[_LAST_MS] = now_ms
+        entry[_N_SEEN] += 1
+        # report period reached: count a hit (or a late catch up) and set next due
+        if ticks_diff(now_ms, entry[_DUE_MS]) >= -self.margin_ms:
+            if entry[_OVERDUE]:
+                entry[_OVERDUE] = False
+            elif entry[_N_SEEN] > self.learn_count:
+                self.hits += 1
+            entry[_DUE_MS] = ticks_add(now_ms, self.report_ms)
+
+    def _window(self, entry) -> tuple:
+        # return (start, end) ms of the window around the first expected advertisement after due
+        interval = entry[_INTERVAL_MS]
+        last_ms = entry[_LAST_MS]
+        n = max(1, int(ticks_diff(entry[_DUE_MS], last_ms) / interval + 0.999))
+        expect_ms = ticks_add(last_ms, int(n * interval))
+        margin = self.margin_ms + n * self.drift_ms
+        return ticks_add(expect_ms, -margin), ticks_add(expect_ms, margin)
+
+    def next(self, now_ms: int) -> tuple:
+        """Return next scan plan as (scan_ms, idle_ms): scan for scan_ms, then sleep for idle_ms."""
+        # discovery of new devices
+        if self.auto_register and ticks_diff(now_ms, self._t_new_ms) < self.learn_ms:
+            mode = MODE_LEARN
+        else:
+            mode = MODE_WINDOWS
+        win_start = None
+        win_end = None
+        for entry in self._devices.values():
+            last_ms = entry[_LAST_MS]
+            # skip lost devices
+            if ticks_diff(now_ms, self._t_init_ms if last_ms is None else last_ms) > self.lost_ms:
+                continue
+            # unknown interval: learn it
+            if entry[_N_SEEN] < self.learn_count:
+                mode = MODE_LEARN
+                continue
+            start, end = self._window(entry)
+            if ticks_diff(now_ms, end) > 0:
+                # window missed: overdue
+                if not entry[_OVERDUE]:
+                    entry[_OVERDUE] = True
+                    self.misses += 1
+                if mode == MODE_WINDOWS:
+                    mode = MODE_CATCH_UP
+                continue
+            if win_start is None or ticks_diff(start, win_start) < 0:
+                win_start, win_end = start, end
+        self.mode = mode
+        if mode != MODE_WINDOWS:
+            # continuous scan by chunks (re-evaluate at each chunk)
+            scan_ms, idle_ms = self.chunk_ms, 0
+        elif win_start is None:
+            # nothing expected
+            scan_ms, idle_ms = 0, self.max_idle_ms
+        elif ticks_diff(win_start, now_ms) > 0:
+            # wait for next window
+            scan_ms, idle_ms = 0, min(ticks_diff(win_start, now_ms), self.max_idle_ms)
+        else:
+            # in a window: scan until its end
+            scan_ms, idle_ms = max(ticks_diff(win_end, now_ms), MIN_ADV_INTERVAL_MS), 0
+        self.scan_ms += scan_ms
+        return scan_ms, idle_ms
+
+    def duty_ratio(self, now_ms: int) -> float:
+        """Return ratio of scan time since start (or last stats reset)."""
+        elapsed = ticks_diff(now_ms, self.t_start_ms)
+        return min(self.scan_ms / elapsed, 1.0) if elapsed > 0 else 1.0
+
+    def miss_rate(self) -> float:
+        """Return ratio of report periods where the device was not seen in its window."""
+        total = self.hits + self.misses
+        return self.misses / total if total else 0.0
+
+    def stats(self, now_ms: int) -> dict:
+        return dict(mode=MODE_NAMES[self.mode], devices=len(self._devices), duty=self.duty_ratio(now_ms),
+                    hits=self.hits, misses=self.misses, miss_rate=self.miss_rate())
+
+    def reset_stats(self, now_ms: int):
+        self.hits = 0
+        self.misses = 0
+        self.scan_ms = 0
+        self.t_start_ms = now_ms
@@ -3,101 +3,84 @@
 - ThermoPro TP357 indoor hygrometer thermometer (https://buythermopro.com/product/tp357/)
 - SwitchBot W3400010 outdoor hygrometer thermometer
 
-Export advertising elements as json messages.
+Export advertising elements as json messages (default) or as COBS framed binary messages
+(see lib/ble_frame.py) when BINARY_OUTPUT is set. JSON line mode is useful for debugging.
+
+Advertising payloads are decoded by the sensor decoders registry (see lib/ble_decoders.py).
+
+Duplicate advertisements are filtered by a per-device cache: a message is emitted only on
+payload change or when the heartbeat delay of the sensor model is reached (RSSI is smoothed).
+
+With ADAPTIVE_SCAN set, scan duty cycle is reduced by the scan scheduler (see lib/scan_sched.py):
+it learns the advertising interval of sensors and scans only around their expected advertisements.
+Call scan_sched.stats(utime.ticks_ms()) at REPL to get duty ratio and miss rate.
 
 Test on MicroPython v1.24.1 on 2024-11-29; Raspberry Pi Pico W with RP2040
 """
 
+from lib.adv_cache import AdvCache
+from lib.ble_decoders import default_registry
+from lib.ble_frame import FrameEncoder
+from lib.scan_sched import ScanScheduler
 from micropython import const
+import sys
 import ubluetooth
 from ucollections import OrderedDict
 import ujson
-from ustruct import unpack
 import utime
 
 
 # some const
 IRQ_SCAN_RESULT = const(0x05)
-ADV_TYPE_SHORT_NAME = const(0x08)
-ADV_TYPE_COMPL_NAME = const(0x09)
-ADV_TYPE_SERVICE_DATA = const(0x16)
-ADV_MANUF_SPEC_DATA = const(0xff)
-
-
-# some func
-def decode_field(payload: bytes, adv_type: int) -> list:
-    i = 0
-    result = []
-    while i + 1 < len(payload):
-        if payload[i + 1] == adv_type:
-            result.append(payload[i + 2: i + payload[i] + 1])
-        i += 1 + payload[i]
-    return result
-
-
-def decode_short_name(payload: bytes) -> str:
-    n = decode_field(payload, ADV_TYPE_SHORT_NAME)
-    return str(n[0], 'utf8') if n else ''
+# export messages as binary frames (True) or as json lines (False)
+BINARY_OUTPUT = False
+# emit a message at least every heartbeat delay (ms) even if payload is unchanged
+HEARTBEAT_MS = {'tp357': 60_000, 'w3400010': 60_000}
+# scan only around expected advertisements (True, opt-in) or continuously (False)
+ADAPTIVE_SCAN = False
 
 
-def decode_compl_name(payload: bytes) -> str:
-    n = decode_field(payload, ADV_TYPE_COMPL_NAME)
-    return str(n[0], 'utf8') if n else ''
+# some global vars
+adv_cache = AdvCache(size=32, heartbeat_ms=HEARTBEAT_MS)
+decoders = default_registry()
+frame_enc = FrameEncoder()
+scan_sched = ScanScheduler(report_ms=min(HEARTBEAT_MS.values()), now_ms=utime.ticks_ms())
 
 
+# some func
 def on_ble_event(event: int, data: list):
     if event == IRQ_SCAN_RESULT:
         # scan items
         addr_type, addr_b, adv_type, rssi, adv_data = data
+        # decode advertising data with the first matching sensor decoder
+        sensor = decoders.decode(adv_data)
+        if sensor is None:
+            return
+        # skip duplicate advertisements
         bd_addr = addr_b.hex('-')
-        # extract mandatory fields
-        name = decode_short_name(adv_data) or decode_compl_name(adv_data)
-        manuf_data_l = decode_field(adv_data, ADV_MANUF_SPEC_DATA)
-        # init an export dict
-        export_d = OrderedDict()
-        # TP357 messages
-        if name.startswith('TP357'):
-            # test "manufacturer specific data" is set
-            if manuf_data_l and len(manuf_data_l[0]) == 6:
-                # populate export_d with data of first manuf data field
-                manuf_data = manuf_data_l[0]
-                export_d['model'] = 'tp357'
-                export_d['id'] = bd_addr
-                (temp, hum) = unpack('<hB', manuf_data[1:4])[:2]
-                export_d['temp_c'] = float(temp/10)
-                export_d['hum_p'] = int(hum)
-        # W3400010 messages
-        # company ID == 0x0969 (Woan technology)
-        elif manuf_data_l and len(manuf_data_l[0]) == 14 and manuf_data_l[0][:2] == b'\x69\x09':
-            export_d['model'] = 'w3400010'
-            export_d['id'] = bd_addr
-            # add temp and hum data from first manuf data field
-            manuf_data = manuf_data_l[0]
-            if manuf_data[11] < 0x80:
-                export_d['temp_c'] = -manuf_data[11] + manuf_data[10] / 10.0
-            else:
-                export_d['temp_c'] = manuf_data[11] - 0x80 + manuf_data[10] / 10.0
-            export_d['hum_p'] = manuf_data[12]
-            # extract specific field
-            service_data_l = decode_field(adv_data, ADV_TYPE_SERVICE_DATA)
-            if service_data_l:
-                service_data = service_data_l[0]
-                if len(service_data) == 5 and service_data[:2] == b'\x3d\xfd':
-                    export_d['batt_p'] = service_data[4] & 0x7f
-        # if export dict is set
-        if export_d:
-            # build json dict with mandatory fields ahead
-            to_js_d = OrderedDict()
-            to_js_d['bd_addr'] = addr_b.hex('-')
-            to_js_d['rssi'] = rssi
-            to_js_d['id'] = export_d.pop('id')
-            to_js_d['model'] = export_d.pop('model')
-            # add optional fields
-            if name:
-                to_js_d['name'] = name
-            to_js_d.update(export_d)
-            # export adv dict as a json (compact) message
-            print(ujson.dumps(to_js_d, separators=(',', ':')))
+        scan_sched.seen(bd_addr, utime.ticks_ms())
+        if not adv_cache.update(bd_addr, sensor.model, adv_data, rssi):
+            return
+        # binary export
+        if BINARY_OUTPUT:
+            frame_enc.encode(sensor.model, addr_b, adv_cache.rssi(bd_addr), sensor.temp_c, sensor.hum_p, sensor.batt_p)
+            sys.stdout.buffer.write(frame_enc.out)
+            return
+        # build json dict with mandatory fields ahead
+        to_js_d = OrderedDict()
+        to_js_d['bd_addr'] = bd_addr
+        to_js_d['rssi'] = adv_cache.rssi(bd_addr)
+        to_js_d['id'] = bd_addr
+        to_js_d['model'] = sensor.model
+        # add optional fields
+        if sensor.name:
+            to_js_d['name'] = sensor.name
+        to_js_d['temp_c'] = sensor.temp_c
+        to_js_d['hum_p'] = sensor.hum_p
+        if sensor.batt_p is not None:
+            to_js_d['batt_p'] = sensor.batt_p
+        # export adv dict as a json (compact) message
+        print(ujson.dumps(to_js_d, separators=(',', ':')))
 
 
 if __name__ == '__main__':
@@ -109,6 +92,19 @@ if __name__ == '__main__':
     ble.irq(on_ble_event)
 
     while True:
+        # adaptive scan: scan windows of scheduler plan
+        if ADAPTIVE_SCAN:
+            scan_ms, idle_ms = scan_sched.next(utime.ticks_ms())
+            if scan_ms:
+                ble.gap_scan(scan_ms, 30_000, 30_000)
+                # ensure to release on abort
+                try:
+                    utime.sleep_ms(scan_ms)
+                finally:
+                    ble.gap_scan(None)
+            utime.sleep_ms(idle_ms)
+            continue
+
         # start a BLE scan cycle
         ble.gap_scan(0, 30_000, 30_000)
 
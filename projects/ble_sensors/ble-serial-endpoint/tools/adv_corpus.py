@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+
+"""Generate a synthetic corpus of BLE scan results for decoders tests and benchmarks.
+
+Mix advertisements of TP357 and W3400010 sensors (with their expected readings), of random
+devices (flags, names, manufacturer data with random or near miss company IDs, service data,
+128-bit UUIDs) and malformed payloads (truncated or zero AD lengths, garbage), with a mixed
+RSSI distribution. Sensors repeat their previous payload at a given ratio, like real scans.
+
+Corpus is a json lines file, one scan result by line:
+
+    {"at": 0, "a": "<bd addr hex>", "t": 0, "r": -70, "d": "<adv data hex>", "e": <expected>}
+
+Where expected is null or {"model": ..., "temp_c": ..., "hum_p": ..., "batt_p": ..., "dup": ...}.
+Run the benchmark with tools/bench_scan.py, like:
+
+    ./tools/adv_corpus.py -n 20000 -o /tmp/corpus.jsonl
+    ./tools/bench_scan.py /tmp/corpus.jsonl
+"""
+
+import argparse
+import json
+import random
+import string
+import struct
+
+
+# some const
+ADV_TYPE_FLAGS = 0x01
+ADV_TYPE_UUID16_COMPLETE = 0x03
+ADV_TYPE_UUID128_COMPLETE = 0x07
+ADV_TYPE_SHORT_NAME = 0x08
+ADV_TYPE_COMPL_NAME = 0x09
+ADV_TYPE_TX_POWER = 0x0a
+ADV_TYPE_SERVICE_DATA = 0x16
+ADV_TYPE_MANUFACTURER = 0xff
+ADV_MAX_PAYLOAD = 31
+W3400010_COMPANY_ID = 0x0969
+W3400010_SVC_UUID = 0xfd3d
+
+
+# some functions
+def ad(adv_type: int, data: bytes) -> bytes:
+    """Return an AD structure."""
+    return bytes([len(data) + 1, adv_type]) + data
+
+
+def rand_bytes(n: int) -> bytes:
+    # reproducible with a random seed (unlike os.urandom)
+    return bytes(random.getrandbits(8) for _ in range(n))
+
+
+def random_rssi() -> int:
+    # mostly far devices, some nearby ones
+    return max(-105, min(-25, int(random.gauss(-78, 12))))
+
+
+# some class
+class TP357:
+    model = 'tp357'
+
+    def __init__(self):
+        self.addr = rand_bytes(6)
+        self.name = f'TP357 ({self.addr[-2:].hex().upper()})'.encode()
+        self.temp = random.randint(-200, 400)
+        self.hum = random.randint(10, 99)
+
+    def step(self):
+        self.temp = max(-400, min(700, self.temp + random.choice((-1, 0, 1))))
+        self.hum = max(0, min(99, self.hum + random.choice((-1, 0, 0, 1))))
+
+    def payload(self) -> bytes:
+        # manufacturer data: [?][temp (0.1 °C) int16 le][hum (%) uint8][?][?]
+        msd = struct.pack('<BhBBB', 0xc2, self.temp, self.hum, 0x2c, 0x01)
+        return ad(ADV_TYPE_FLAGS, b'\x06') + ad(ADV_TYPE_SHORT_NAME, self.name) + ad(ADV_TYPE_MANUFACTURER, msd)
+
+    def expected(self) -> dict:
+        return dict(model=self.model, temp_c=self.temp / 10, hum_p=self.hum, batt_p=None)
+
+
+class W3400010:
+    model = 'w3400010'
+
+    def __init__(self):
+        self.addr = rand_bytes(6)
+        self.seq = random.randint(0, 255)
+        self.temp = random.randint(-150, 350)
+        self.hum = random.randint(10, 99)
+        self.batt = random.randint(5, 100)
+
+    def step(self):
+        self.seq = (self.seq + 1) & 0xff
+        self.temp = max(-300, min(500, self.temp + random.choice((-1, 0, 1))))
+        self.hum = max(0, min(99, self.hum + random.choice((-1, 0, 0, 1))))
+
+    def payload(self) -> bytes:
+        t_abs = abs(self.temp)
+        msd = struct.pack('<H', W3400010_COMPANY_ID) + self.addr[::-1] + bytes(
+            [self.seq, 0x0b, t_abs % 10, t_abs // 10 | (0x80 if self.temp >= 0 else 0), self.hum, 0x00])
+        svc = struct.pack('<H', W3400010_SVC_UUID) + bytes([0x77, 0x00, self.batt | 0x80])
+        return ad(ADV_TYPE_FLAGS, b'\x06') + ad(ADV_TYPE_MANUFACTURER, msd) + ad(ADV_TYPE_SERVICE_DATA, svc)
+
+    def expected(self) -> dict:
+        return dict(model=self.model, temp_c=self.temp / 10, hum_p=self.hum, batt_p=self.batt)
+
+
+def random_device_payload() -> bytes:
+    """Return a valid payload of a random (not a sensor) device."""
+    payload = ad(ADV_TYPE_FLAGS, bytes([random.choice((0x02, 0x06, 0x1a))]))
+    kinds = random.sample(['name', 'msd', 'near_miss', 'svc', 'uuid16', 'uuid128', 'tx'], random.randint(1, 3))
+    for kind in kinds:
+        if kind == 'name':
+            name = ''.join(random.choices(string.ascii_letters + string.digits + ' -', k=random.randint(1, 12)))
+            # some names look like a sensor one
+            if random.random() < 0.1:
+                name = 'TP35 ' + name
+            adv_type = random.choice((ADV_TYPE_SHORT_NAME, ADV_TYPE_COMPL_NAME))
+            field = ad(adv_type, name.encode())
+        elif kind == 'msd':
+            field = ad(ADV_TYPE_MANUFACTURER, struct.pack('<H', random.choice((0x004c, 0x0006, 0x0075, 0x0157)))
+                       + rand_bytes(random.randint(0, 20)))
+        elif kind == 'near_miss':
+            # sensor company ID with a bad length
+            field = ad(ADV_TYPE_MANUFACTURER, struct.pack('<H', W3400010_COMPANY_ID)
+                       + rand_bytes(random.choice((0, 4, 11, 13))))
+        elif kind == 'svc':
+            field = ad(ADV_TYPE_SERVICE_DATA, struct.pack('<H', random.choice((0xfe9f, 0xfd3d, 0x181a)))
+                       + rand_bytes(random.randint(0, 8)))
+        elif kind == 'uuid16':
+            field = ad(ADV_TYPE_UUID16_COMPLETE, rand_bytes(2 * random.randint(1, 3)))
+        elif kind == 'uuid128':
+            field = ad(ADV_TYPE_UUID128_COMPLETE, rand_bytes(16))
+        else:
+            field = ad(ADV_TYPE_TX_POWER, rand_bytes(1))
+        if len(payload) + len(field) <= ADV_MAX_PAYLOAD:
+            payload += field
+    return payload
+
+
+def malformed_payload(sensors: list) -> tuple:
+    """Return a malformed payload (bad AD lengths, truncation, garbage) and its expected reading."""
+    kind = random.choice(['truncated', 'overflow_len', 'zero_len', 'len_one', 'garbage', 'empty', 'sensor_cut'])
+    if kind == 'truncated':
+        p = random_device_payload()
+        return p[:random.randint(1, len(p) - 1)], None
+    if kind == 'overflow_len':
+        # last AD length is beyond end of payload
+        p = random_device_payload()
+        return p + bytes([random.randint(2, 40), ADV_TYPE_MANUFACTURER]) + rand_bytes(1), None
+    if kind == 'zero_len':
+        return ad(ADV_TYPE_FLAGS, b'\x06') + b'\x00' + rand_bytes(random.randint(0, 10)), None
+    if kind == 'len_one':
+        return ad(ADV_TYPE_FLAGS, b'\x06') + bytes([1, ADV_TYPE_MANUFACTURER]) + bytes([1, ADV_TYPE_SHORT_NAME]), None
+    if kind == 'garbage':
+        return rand_bytes(random.randint(1, ADV_MAX_PAYLOAD)), None
+    if kind == 'empty':
+        return b'', None
+    # a sensor payload cut in its last AD structure: a W3400010 one still has a valid
+    # manufacturer data (the cut service data only carries the battery level)
+    sensor = random.choice(sensors)
+    expected = dict(sensor.expected(), batt_p=None, dup=False) if sensor.model == 'w3400010' else None
+    return sensor.payload()[:-random.randint(1, 4)], expected
+
+
+def generate(args):
+    """Yield corpus records."""
+    sensors = [TP357() for _ in range(args.tp357)] + [W3400010() for _ in range(args.w3400010)]
+    devices = [(rand_bytes(6), random_device_payload()) for _ in range(args.random)]
+    last_payload = {}
+    weights = (args.sensor_ratio, 1 - args.sensor_ratio - args.malformed_ratio, args.malformed_ratio)
+    for _ in range(args.number):
+        kind = random.choices(('sensor', 'random', 'malformed'), weights)[0]
+        if kind == 'sensor' and sensors:
+            sensor = random.choice(sensors)
+            dup = sensor.addr in last_payload and random.random() < args.dup_ratio
+            if not dup:
+                sensor.step()
+            payload = sensor.payload()
+            dup = last_payload.get(sensor.addr) == payload
+            last_payload[sensor.addr] = payload
+            addr, expected = sensor.addr, dict(sensor.expected(), dup=dup)
+        elif kind == 'random' and devices:
+            addr, payload = random.choice(devices)
+            expected = None
+        else:
+            addr = rand_bytes(6)
+            payload, expected = malformed_payload(sensors or [TP357()])
+        yield dict(at=random.choice((0, 1)), a=addr.hex(), t=random.choice((0, 0, 0, 2, 3)), r=random_rssi(),
+                   d=payload.hex(), e=expected)
+
+
+if __name__ == '__main__':
+    # parse args
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=10_000, help='number of scan results (default is 10000)')
+    parser.add_argument('-o', '--output', default='corpus.jsonl', help='output file (default is "corpus.jsonl")')
+    parser.add_argument('--tp357', type=int, default=10, help='number of TP357 sensors (default is 10)')
+    parser.add_argument('--w3400010', type=int, default=10, help='number of W3400010 sensors (default is 10)')
+    parser.add_argument('--random', type=int, default=200, help='number of random devices (default is 200)')
+    parser.add_argument('--sensor-ratio', type=float, default=0.3, help='ratio of sensors results (default is 0.3)')
+    parser.add_argument('--malformed-ratio', type=float, default=0.05,
+                        help='ratio of malformed results (default is 0.05)')
+    parser.add_argument('--dup-ratio', type=float, default=0.5,
+                        help='ratio of sensors results with an unchanged payload (default is 0.5)')
+    parser.add_argument('-s', '--seed', type=int, default=None, help='random seed')
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    with open(args.output, 'w') as f:
+        for record in generate(args):
+            f.write(json.dumps(record) + '\n')
+    print(f'{args.number} scan results written to {args.output}')
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+
+"""Benchmark and regression test of a scanner on_ble_event() with a corpus of scan results.
+
+The scanner main.py (default is mpy_app/main.py) is loaded with a stub ubluetooth (and stubs of
+MicroPython modules on CPython), its print() is redirected, then every scan result of the corpus
+(see tools/adv_corpus.py) is sent to on_ble_event() as a scan result IRQ.
+
+Run on CPython or on the MicroPython unix port (no argparse, no os.path), like:
+
+    ./tools/bench_scan.py /tmp/corpus.jsonl [path/to/main.py]
+    micropython tools/bench_scan.py /tmp/corpus.jsonl
+
+Only BLE and core MicroPython modules are stubbed: the target must not need other hardware
+modules (network, rp2...) at import and must start its scan loop under "if __name__ == '__main__'".
+
+Report:
+- throughput: events/s and µs by event
+- allocations: heap bytes by event (MicroPython, gc.mem_alloc() with gc disabled) or peak of
+  temporary memory by event (CPython, tracemalloc)
+- decode: emitted messages checked against expected readings of the corpus (exit code is 1
+  on any wrong decode, false positive, missed reading or exception)
+"""
+
+import gc
+import json
+import sys
+
+
+# some const
+IRQ_SCAN_RESULT = 0x05
+IS_MICROPYTHON = sys.implementation.name == 'micropython'
+TEMP_TOLERANCE = 0.05
+
+
+# timer
+try:
+    from time import ticks_diff, ticks_us
+
+    def elapsed_s(t0):
+        return ticks_diff(ticks_us(), t0) / 1e6
+
+    now = ticks_us
+except ImportError:
+    from time import perf_counter as now
+
+    def elapsed_s(t0):
+        return now() - t0
+
+
+# some class
+class _Stub:
+    """A module stub (an object in sys.modules is returned as is by import)."""
+
+    def __init__(self, **attrs):
+        for name, value in attrs.items():
+            setattr(self, name, value)
+
+
+class _BLE:
+    def __init__(self, *args):
+        pass
+
+    def active(self, *args):
+        return True
+
+    def irq(self, handler):
+        pass
+
+    def gap_scan(self, *args):
+        pass
+
+    def config(self, *args, **kwargs):
+        pass
+
+
+class _UUID:
+    def __init__(self, value):
+        self.value = value
+
+
+# some functions
+def install_stubs():
+    """Install ubluetooth stub (and MicroPython modules stubs on CPython)."""
+    ble_stub = _Stub(BLE=_BLE, UUID=_UUID, FLAG_READ=0x02, FLAG_WRITE=0x08, FLAG_NOTIFY=0x10)
+    for name in ('ubluetooth', 'bluetooth'):
+        try:
+            __import__(name)
+        except ImportError:
+            sys.modules[name] = ble_stub
+    if IS_MICROPYTHON:
+        return
+    import binascii
+    import collections
+    import struct
+    import time
+
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+
+    def _decorator(f):
+        return f
+
+    sys.modules['micropython'] = _Stub(const=lambda x: x, native=_decorator, viper=_decorator)
+    sys.modules['ucollections'] = collections
+    sys.modules['ujson'] = json
+    sys.modules['ustruct'] = struct
+    sys.modules['ubinascii'] = binascii
+    sys.modules['utime'] = _Stub(ticks_ms=ticks_ms, ticks_us=lambda: int(time.monotonic() * 1e6),
+                                 ticks_add=lambda t, d: t + d, ticks_diff=lambda t1, t2: t1 - t2,
+                                 sleep=time.sleep, sleep_ms=lambda ms: time.sleep(ms / 1000))
+
+
+def load_target(path: str, print_hdl):
+    """Load a scanner main.py (not as __main__), return its on_ble_event() function."""
+    app_dir = path.rsplit('/', 1)[0] if '/' in path else '.'
+    for p in (app_dir, app_dir + '/lib'):
+        if p not in sys.path:
+            sys.path.insert(0, p)
+    # fresh lib modules at each load (reset module level state like caches)
+    for name in list(sys.modules):
+        if name.startswith('lib.') or name == 'lib':
+            del sys.modules[name]
+    with open(path) as f:
+        src = f.read()
+    g = {'__name__': 'bench_target', '__file__': path, 'print': print_hdl}
+    exec(compile(src, path, 'exec'), g)
+    return g['on_ble_event']
+
+
+def load_corpus(path: str, max_events: int = 0) -> tuple:
+    """Return IRQ data tuples and expected readings of a corpus file."""
+    events = []
+    expected = []
+    with open(path) as f:
+        for line in f:
+            rec = json.loads(line)
+            events.append((rec['at'], memoryview(bytes.fromhex(rec['a'])), rec['t'], rec['r'],
+                           memoryview(bytes.fromhex(rec['d']))))
+            expected.append(rec['e'])
+            if max_events and len(events) >= max_events:
+                break
+    return events, expected
+
+
+def _discard(msg):
+    pass
+
+
+def bench_throughput(target: str, events: list) -> float:
+    """Return events by second."""
+    on_ble_event = load_target(target, _discard)
+    gc.collect()
+    t0 = now()
+    for data in events:
+        on_ble_event(IRQ_SCAN_RESULT, data)
+    return len(events) / elapsed_s(t0)
+
+
+def bench_alloc(target: str, events: list, chunk: int = 500) -> float:
+    """Return allocated bytes by event."""
+    on_ble_event = load_target(target, _discard)
+    total = 0
+    if IS_MICROPYTHON:
+        # without gc, heap usage only grows: delta is the allocated size
+        for i in range(0, len(events), chunk):
+            chunk_events = events[i:i + chunk]
+            gc.collect()
+            gc.disable()
+            m0 = gc.mem_alloc()
+            for data in chunk_events:
+                on_ble_event(IRQ_SCAN_RESULT, data)
+            total += gc.mem_alloc() - m0
+            gc.enable()
+    else:
+        import tracemalloc
+        tracemalloc.start()
+        for data in events:
+            tracemalloc.reset_peak()
+            m0 = tracemalloc.get_traced_memory()[0]
+            on_ble_event(IRQ_SCAN_RESULT, data)
+            total += tracemalloc.get_traced_memory()[1] - m0
+        tracemalloc.stop()
+    return total / len(events)
+
+
+def _msg_addr(msg: dict) -> str:
+    return (msg.get('bd_addr') or msg.get('addr') or '').replace('-', '').replace(':', '')
+
+
+def _msg_match(msg: dict, exp: dict) -> bool:
+    model = msg.get('model') or ('tp357' if msg.get('name', '').startswith('TP357') else None)
+    if model != exp['model']:
+        return False
+    if abs(msg.get('temp_c', 1e6) - exp['temp_c']) > TEMP_TOLERANCE or msg.get('hum_p') != exp['hum_p']:
+        return False
+    return 'batt_p' not in msg or msg['batt_p'] == exp['batt_p']
+
+
+def check_decode(target: str, events: list, expected: list) -> dict:
+    """Check emitted messages against expected readings, return a results dict."""
+    out = []
+    on_ble_event = load_target(target, out.append)
+    res = dict(ok=0, suppressed=0, wrong=0, false_pos=0, missed=0, errors=0)
+    first_errors = []
+    raised = set()
+    for idx, data in enumerate(events):
+        out.clear()
+        try:
+            on_ble_event(IRQ_SCAN_RESULT, data)
+        except Exception as e:
+            res['errors'] += 1
+            raised.add(idx)
+            if len(first_errors) < 3:
+                first_errors.append(f'event #{idx}: {e!r}')
+            continue
+        exp = expected[idx]
+        msgs = []
+        for s in out:
+            try:
+                msgs.append(json.loads(s))
+            except ValueError:
+                pass
+        if exp is None:
+            if msgs:
+                res['false_pos'] += 1
+        elif not msgs:
+            res['suppressed' if exp['dup'] else 'missed'] += 1
+        elif all(_msg_addr(m) == bytes(data[1]).hex() and _msg_match(m, exp) for m in msgs):
+            res['ok'] += 1
+        else:
+            res['wrong'] += 1
+            if len(first_errors) < 3:
+                first_errors.append(f'event #{idx}: got {msgs} expect {exp}')
+    res['first_errors'] = first_errors
+    res['raised'] = raised
+    return res
+
+
+def main(argv: list) -> int:
+    if len(argv) < 2 or argv[1] in ('-h', '--help'):
+        print(f'usage: {argv[0]} CORPUS [TARGET_MAIN_PY] [MAX_EVENTS]')
+        return 2
+    tools_dir = __file__.rsplit('/', 1)[0] if '/' in __file__ else '.'
+    target = argv[2] if len(argv) > 2 else tools_dir + '/../mpy_app/main.py'
+    max_events = int(argv[3]) if len(argv) > 3 else 0
+    install_stubs()
+    events, expected = load_corpus(argv[1], max_events)
+    n_sensors = sum(1 for e in expected if e)
+    print(f'target: {target} ({sys.implementation.name} {sys.version.split()[0]})')
+    print(f'corpus: {len(events)} events ({n_sensors} sensors advertisements)')
+    res = check_decode(target, events, expected)
+    # benchmark without events that raise an exception
+    if res['raised']:
+        events = [data for idx, data in enumerate(events) if idx not in res['raised']]
+    rate = bench_throughput(target, events)
+    alloc = bench_alloc(target, events)
+    print(f'throughput: {rate:.0f} events/s ({1e6 / rate:.1f} us/event)')
+    print(f'allocation: {alloc:.0f} bytes/event ' + ('(heap)' if IS_MICROPYTHON else '(CPython tracemalloc peak)'))
+    print(f'decode: ok={res["ok"]} suppressed={res["suppressed"]} wrong={res["wrong"]} '
+          f'false_pos={res["false_pos"]} missed={res["missed"]} errors={res["errors"]}')
+    for msg in res['first_errors']:
+        print(f'  {msg}')
+    return 1 if res['wrong'] or res['false_pos'] or res['missed'] or res['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
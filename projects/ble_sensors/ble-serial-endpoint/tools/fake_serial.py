@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+"""Emulate the BLE serial endpoint Pico on a pty for testing purposes.
+
+Print the pty device path to use as the host app serial port, like:
+
+    ./tools/fake_serial.py -n 200 -r 500 &
+    ./host_app/app.py -B /dev/pts/X
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+import random
+import sys
+import time
+import tty
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'host_app'))
+from ble_frame import encode_frame  # noqa: E402
+
+
+# some functions
+def random_msg(bd_addr: str) -> dict:
+    """Return a random BLE sensor message."""
+    model = random.choice(['tp357', 'w3400010'])
+    msg_d = dict(bd_addr=bd_addr, rssi=random.randint(-100, -30), id=bd_addr, model=model,
+                 temp_c=round(random.uniform(-20.0, 40.0), 1), hum_p=random.randint(0, 100))
+    if model == 'w3400010':
+        msg_d['batt_p'] = random.randint(0, 100)
+    return msg_d
+
+
+if __name__ == '__main__':
+    # parse args
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--sensors', type=int, default=50, help='number of fake sensors (default is 50)')
+    parser.add_argument('-r', '--rate', type=float, default=100.0, help='messages per second (default is 100)')
+    parser.add_argument('-b', '--binary', action='store_true', help='send binary frames (default is json lines)')
+    parser.add_argument('-d', '--debug', action='store_true', help='set debug mode')
+    args = parser.parse_args()
+
+    # open a pty, host app use the slave side
+    master_fd, slave_fd = os.openpty()
+    tty.setraw(slave_fd)
+    print(f'fake serial port: {os.ttyname(slave_fd)}', flush=True)
+    # build fake sensors address list
+    addr_l = ['-'.join(f'{b:02x}' for b in os.urandom(6)) for _ in range(args.sensors)]
+    # main loop
+    try:
+        count = 0
+        t_start = time.monotonic()
+        while True:
+            msg_d = random_msg(random.choice(addr_l))
+            if args.binary:
+                data = encode_frame(msg_d)
+            else:
+                data = json.dumps(msg_d, separators=(',', ':')).encode() + b'\n'
+            if args.debug:
+                print(f'send: {msg_d}')
+            os.write(master_fd, data)
+            count += 1
+            # respect the message rate
+            wait_s = t_start + count / args.rate - time.monotonic()
+            if wait_s > 0:
+                time.sleep(wait_s)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+"""Test the adaptive scan scheduler (mpy_app/lib/scan_sched.py) against simulated advertisers.
+
+Every fake sensor advertises at its own interval (plus the random 0-10 ms advDelay of the BLE
+spec and a clock drift), an advertisement is received only during a scan and with a given
+probability. Time is simulated: hours of scanning run in a few seconds.
+
+Report the scan duty ratio, the miss rate and the worst delay between two receptions of a
+sensor (should stay close to the report period), like:
+
+    ./tools/scan_sim.py -n 20 -t 6 --lost 3
+"""
+
+import argparse
+import heapq
+from pathlib import Path
+import random
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'mpy_app' / 'lib'))
+from scan_sched import MODE_NAMES, ScanScheduler  # noqa: E402
+
+
+# some class
+class Advertiser:
+    def __init__(self, addr: str, interval_ms: int, drift_ppm: float, t_stop_ms: float = None):
+        self.addr = addr
+        self.interval_ms = interval_ms * (1 + drift_ppm / 1e6)
+        self.t_stop_ms = t_stop_ms
+        self.t_next_ms = random.uniform(0, interval_ms)
+
+    def step(self) -> float:
+        """Return current advertisement time and schedule the next one."""
+        t = self.t_next_ms
+        self.t_next_ms += self.interval_ms + random.uniform(0.0, 10.0)
+        return t
+
+
+# some functions
+def simulate(args) -> dict:
+    advertisers = []
+    for i in range(args.sensors):
+        t_stop = args.duration * 3_600_000 / 2 if i < args.lost else None
+        advertisers.append(Advertiser(f'sensor-{i:03d}', random.choice(args.intervals),
+                                      random.uniform(-args.drift, args.drift), t_stop))
+    sched = ScanScheduler(report_ms=args.report, margin_ms=args.margin)
+    # heap of (next advertisement time, advertiser index)
+    events = [(adv.t_next_ms, i) for i, adv in enumerate(advertisers)]
+    heapq.heapify(events)
+    last_rx = {}
+    max_gap = {}
+    mode_ms = [0, 0, 0]
+    t_end = args.duration * 3_600_000
+    now = 0
+    while now < t_end:
+        scan_ms, idle_ms = sched.next(int(now))
+        mode_ms[sched.mode] += scan_ms + idle_ms
+        t_scan_end = now + scan_ms
+        t_next = t_scan_end + idle_ms
+        # deliver (or lose) all advertisements of this period
+        while events[0][0] < t_next:
+            _, i = heapq.heappop(events)
+            adv = advertisers[i]
+            t = adv.step()
+            heapq.heappush(events, (adv.t_next_ms, i))
+            if adv.t_stop_ms is not None and t > adv.t_stop_ms:
+                continue
+            if t < t_scan_end and random.random() < args.rx_prob:
+                sched.seen(adv.addr, int(t))
+                if adv.addr in last_rx:
+                    max_gap[adv.addr] = max(max_gap.get(adv.addr, 0), t - last_rx[adv.addr])
+                last_rx[adv.addr] = t
+        now = t_next
+    stats = sched.stats(int(now))
+    stats['modes'] = {MODE_NAMES[m]: round(v / now, 3) for m, v in enumerate(mode_ms)}
+    alive = [adv.addr for adv in advertisers if adv.t_stop_ms is None]
+    stats['worst_gap_s'] = round(max(max_gap.get(addr, 0) for addr in alive) / 1000, 1)
+    return stats
+
+
+if __name__ == '__main__':
+    # parse args
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--sensors', type=int, default=10, help='number of fake sensors (default is 10)')
+    parser.add_argument('-i', '--intervals', type=int, nargs='+', default=[1000, 2000, 5000],
+                        help='advertising intervals (ms) to choose from (default is 1000 2000 5000)')
+    parser.add_argument('-t', '--duration', type=float, default=2.0, help='simulated duration (default is 2 h)')
+    parser.add_argument('-r', '--report', type=int, default=60_000, help='report period (default is 60000 ms)')
+    parser.add_argument('-m', '--margin', type=int, default=100, help='scan window margin (default is 100 ms)')
+    parser.add_argument('-p', '--rx-prob', type=float, default=0.95, help='reception probability (default is 0.95)')
+    parser.add_argument('--drift', type=float, default=50.0, help='max clock drift of sensors (default is 50 ppm)')
+    parser.add_argument('--lost', type=int, default=0, help='sensors that stop at half of the test (default is 0)')
+    parser.add_argument('-s', '--seed', type=int, default=None, help='random seed')
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    stats = simulate(args)
+    print(f'{args.sensors} sensor(s), {args.duration} h simulated, report period {args.report} ms')
+    print(f'duty ratio: {stats["duty"]:.2%} (continuous scan is 100 %)')
+    print(f'miss rate: {stats["miss_rate"]:.2%} ({stats["misses"]} miss(es) / {stats["hits"]} hit(s))')
+    print(f'worst reception gap: {stats["worst_gap_s"]} s')
+    print(f'time by mode: {stats["modes"]}')
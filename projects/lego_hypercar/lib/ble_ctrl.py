@@ -2,20 +2,54 @@
 
 from ble_advertising import advertising_payload
 from micropython import const
+from ring_buffer import RingBuffer
 
 import bluetooth
+import uctypes
 
 # some const
 EVT_CENTRAL_CONNECT = const(1)
 EVT_CENTRAL_DISCONNECT = const(2)
 EVT_GATTS_WRITE = const(3)
+EVT_MTU_EXCHANGED = const(21)
 FLAG_WRITE = const(0x0008)
 FLAG_NOTIFY = const(0x0010)
+# ATT header size (notify payload = MTU - 3)
+ATT_HDR_SIZE = const(3)
+DEFAULT_MTU = const(23)
 # Nordic UART Service
 UART_UUID = bluetooth.UUID('6E400001-B5A3-F393-E0A9-E50E24DCCA9E')
 UART_UUID_RX = (bluetooth.UUID('6E400002-B5A3-F393-E0A9-E50E24DCCA9E'), FLAG_WRITE,)
 UART_UUID_TX = (bluetooth.UUID('6E400003-B5A3-F393-E0A9-E50E24DCCA9E'), FLAG_NOTIFY,)
 UART_SERVICE = (UART_UUID, (UART_UUID_TX, UART_UUID_RX),)
+# bluefruit packets: '!' + packet type + payload + checksum
+PKT_START = const(0x21)
+PKT_MAX_LEN = const(20)
+PKT_BUTTON = const(0x42)  # 'B'
+PKT_COLOR = const(0x43)  # 'C'
+PKT_ACCEL = const(0x41)  # 'A'
+PKT_GYRO = const(0x47)  # 'G'
+PKT_MAG = const(0x4d)  # 'M'
+PKT_QUAT = const(0x51)  # 'Q'
+PKT_LOCATION = const(0x4c)  # 'L'
+# packets table: type -> (packet length with start, type and checksum bytes, payload layout)
+# layouts are uctypes descriptors with offsets in the packet buffer
+_F32 = uctypes.FLOAT32
+_U8 = uctypes.UINT8
+_XYZ = {'x': _F32 | 2, 'y': _F32 | 6, 'z': _F32 | 10}
+PKT_TABLE = {
+    PKT_BUTTON: (5, {'btn': _U8 | 2, 'state': _U8 | 3}),
+    PKT_COLOR: (6, {'r': _U8 | 2, 'g': _U8 | 3, 'b': _U8 | 4}),
+    PKT_ACCEL: (15, _XYZ),
+    PKT_GYRO: (15, _XYZ),
+    PKT_MAG: (15, _XYZ),
+    PKT_QUAT: (19, {'x': _F32 | 2, 'y': _F32 | 6, 'z': _F32 | 10, 'w': _F32 | 14}),
+    PKT_LOCATION: (15, {'lat': _F32 | 2, 'lon': _F32 | 6, 'alt': _F32 | 10}),
+}
+# packet parser states
+_WAIT_START = const(0)
+_WAIT_TYPE = const(1)
+_WAIT_DATA = const(2)
 
 
 class BLE_CTRL:
@@ -23,9 +57,21 @@ class BLE_CTRL:
     BLE endpoint for control pad of android bluefruit app
 
     app at: https://play.google.com/store/apps/details?id=com.adafruit.bluefruit.le.connect&hl=fr&pli=1
+
+    Received bytes are stored in a preallocated RX ring, packets are decoded by an incremental
+    parser so a packet split across several GATT writes is not lost. Written data is coalesced
+    in a TX ring and sent as notifications of MTU size at each update().
+
+    All bluefruit packets are decoded (buttons, color, accelerometer, gyro, magnetometer,
+    quaternion and location). Checksum is computed on the fly by the parser and payloads are
+    read through uctypes views of the packet buffer, built once: no allocation per packet.
+    Handlers are set in pkt_hdl by packet type and called with the packet view, like:
+
+        ble_ctrl.pkt_hdl[PKT_ACCEL] = lambda v: print(v.x, v.y, v.z)
     """
 
-    def __init__(self, ble: bluetooth.BLE, name: str = '', rx_buf_size: int = 100):
+    def __init__(self, ble: bluetooth.BLE, name: str = '', rx_buf_size: int = 100, tx_buf_size: int = 512,
+                 mtu: int = 247):
         # args
         self.ble = ble
         self.name = name
@@ -33,11 +79,32 @@ class BLE_CTRL:
         # buttons handlers
         self.btn_pressed_hdl = {}
         self.btn_released_hdl = {}
+        # packets handlers (by packet type), buttons packets are dispatched to buttons handlers
+        self.pkt_hdl = {PKT_BUTTON: self._pkt_b_hdl}
+        # stats
+        self.bad_crc = 0
         # init internal structs
         self._connections = set()
-        self._rx_buffer = bytearray()
+        self._rx_ring = RingBuffer(max(4 * rx_buf_size, 256))
+        self._tx_ring = RingBuffer(tx_buf_size)
+        self._tx_chunk = bytearray(mtu - ATT_HDR_SIZE)
+        self._tx_mv = memoryview(self._tx_chunk)
+        self._tx_size = DEFAULT_MTU - ATT_HDR_SIZE
+        self._pkt = bytearray(PKT_MAX_LEN)
+        self._pkt_idx = 0
+        self._pkt_len = 0
+        self._pkt_sum = 0
+        self._pkt_state = _WAIT_START
+        # packet length and payload view by packet type
+        self._pkt_len_d = {}
+        self._pkt_views = {}
+        pkt_addr = uctypes.addressof(self._pkt)
+        for pkt_type, (pkt_len, layout) in PKT_TABLE.items():
+            self._pkt_len_d[pkt_type] = pkt_len
+            self._pkt_views[pkt_type] = uctypes.struct(pkt_addr, layout, uctypes.LITTLE_ENDIAN)
         # turn on ble
         self.ble.active(True)
+        self.ble.config(mtu=mtu)
         self.ble.irq(self._evt_handler)
         ((self._tx_handle, self._rx_handle),) = self.ble.gatts_register_services((UART_SERVICE,))
         # set _rx_handle size in bytes and turn on append mode
@@ -58,27 +125,43 @@ class BLE_CTRL:
             conn_handle, _, _ = data
             if conn_handle in self._connections:
                 self._connections.remove(conn_handle)
+            if not self._connections:
+                self._tx_size = DEFAULT_MTU - ATT_HDR_SIZE
             # start advertising again to allow new connection
             self._advertise()
         elif event == EVT_GATTS_WRITE:
             conn_handle, value_handle = data
             if conn_handle in self._connections and value_handle == self._rx_handle:
-                self._rx_buffer += self.ble.gatts_read(self._rx_handle)
+                self._rx_ring.write(self.ble.gatts_read(self._rx_handle))
                 self.on_write()
+        elif event == EVT_MTU_EXCHANGED:
+            _, mtu = data
+            self._tx_size = min(mtu - ATT_HDR_SIZE, len(self._tx_chunk))
 
     def any(self):
-        return len(self._rx_buffer)
+        return self._rx_ring.any()
 
     def read(self, sz=None):
-        if not sz:
-            sz = len(self._rx_buffer)
-        result = self._rx_buffer[0:sz]
-        self._rx_buffer = self._rx_buffer[sz:]
-        return result
+        return self._rx_ring.read(sz)
+
+    def readinto(self, buf, nbytes=None):
+        return self._rx_ring.readinto(buf, nbytes)
+
+    def readline(self):
+        return self._rx_ring.readline()
 
     def write(self, data):
-        for conn_handle in self._connections:
-            self.ble.gatts_notify(conn_handle, self._tx_handle, data)
+        """Queue data for notification (sent by flush() or update())."""
+        if self._connections:
+            self._tx_ring.write(data.encode() if isinstance(data, str) else data)
+
+    def flush(self):
+        """Send queued TX data as notifications of MTU size."""
+        while self._tx_ring.any():
+            n = self._tx_ring.readinto(self._tx_chunk, self._tx_size)
+            chunk = self._tx_chunk if n == len(self._tx_chunk) else self._tx_mv[:n]
+            for conn_handle in self._connections:
+                self.ble.gatts_notify(conn_handle, self._tx_handle, chunk)
 
     def on_write(self):
         pass
@@ -91,53 +174,62 @@ class BLE_CTRL:
     def update(self):
         """Call regulary by main thread to process bluetooth I/O."""
         # process incoming packets
-        if self.any():
-            # all available bytes
-            rx_data = self.read()
-            # debug
-            # print(f'debug raw: {rx_data}')
-            i = 0
-            while i < len(rx_data):
-                try:
-                    #  search packet prefix '!'
-                    if rx_data[i] == ord('!'):
-                        # 2nd char is command id
-                        # "B" packets
-                        if rx_data[i+1] == ord('B'):
-                            self._pkt_b_hdl(rx_data[i:i+5])
-                            i += 4
-                    # next char
-                    i += 1
-                except IndexError:
-                    break
-
-    def _pkt_crc_ok(self, pkt: bytearray):
-        """Return True if packet have valid CRC."""
-        _sum = 0
-        for c in pkt:
-            _sum += c
-        return _sum & 0x7f == 0x7f
-
-    def _pkt_b_hdl(self, pkt: bytearray):
+        self._parse_rx()
+        # send pending notifications
+        self.flush()
+
+    def _parse_rx(self):
+        """Incremental packet parser: consume all RX bytes, a partial packet is kept for next call."""
+        ring = self._rx_ring
+        pkt = self._pkt
+        while True:
+            b = ring.readbyte()
+            if b < 0:
+                break
+            if self._pkt_state == _WAIT_START:
+                #  search packet prefix '!'
+                if b == PKT_START:
+                    pkt[0] = b
+                    self._pkt_state = _WAIT_TYPE
+            elif self._pkt_state == _WAIT_TYPE:
+                # 2nd char is packet type
+                self._pkt_len = self._pkt_len_d.get(b, 0)
+                if self._pkt_len:
+                    pkt[1] = b
+                    self._pkt_idx = 2
+                    self._pkt_sum = PKT_START + b
+                    self._pkt_state = _WAIT_DATA
+                else:
+                    # unknown type: resync (on a new start if b is '!')
+                    self._pkt_state = _WAIT_TYPE if b == PKT_START else _WAIT_START
+            else:
+                pkt[self._pkt_idx] = b
+                self._pkt_idx += 1
+                self._pkt_sum += b
+                if self._pkt_idx == self._pkt_len:
+                    self._pkt_state = _WAIT_START
+                    # checksum byte is the complement of the sum of previous bytes
+                    if self._pkt_sum & 0xff == 0xff:
+                        self._pkt_hdl(pkt[1])
+                    else:
+                        self.bad_crc += 1
+
+    def _pkt_hdl(self, pkt_type: int):
+        """Dispatch a valid packet to its handler."""
+        hdl = self.pkt_hdl.get(pkt_type)
+        if hdl:
+            hdl(self._pkt_views[pkt_type])
+
+    def _pkt_b_hdl(self, view):
         """B packet handler."""
-        # check len
-        if len(pkt) != 5:
-            return
-        # check CRC
-        if not self._pkt_crc_ok(pkt):
-            print('bad CRC')
-            return
         # decode button infos
-        try:
-            btn_id = int(chr(pkt[2]))
-            btn_released = pkt[3] == ord('0')
-            btn_pressed = pkt[3] == ord('1')
-        except ValueError:
+        btn_id = view.btn - 0x30
+        if not 0 <= btn_id <= 9:
             return
         # buttons handlers
-        if btn_pressed:
+        if view.state == 0x31:
             self._on_btn_pressed(btn_id)
-        if btn_released:
+        elif view.state == 0x30:
             self._on_btn_released(btn_id)
 
     def _on_btn_pressed(self, btn_id: int):
@@ -0,0 +1,103 @@
+""" A preallocated byte ring buffer with stream like methods (any, readinto, readline...).
+
+Designed to be filled from an IRQ handler and consumed from main code without reallocation:
+data is copied at most once in and once out of the ring.
+"""
+
+
+class RingBuffer:
+    def __init__(self, size: int):
+        # public
+        self.size = size
+        # count of bytes lost on write to a full buffer
+        self.overflow = 0
+        # private
+        self._buf = bytearray(size)
+        self._mv = memoryview(self._buf)
+        self._head = 0
+        self._tail = 0
+        self._count = 0
+
+    def any(self) -> int:
+        """Return number of bytes available for read."""
+        return self._count
+
+    def free(self) -> int:
+        """Return number of bytes available for write."""
+        return self.size - self._count
+
+    def clear(self):
+        self._head = self._tail = self._count = 0
+
+    def write(self, data) -> int:
+        """Copy data to the ring (excess bytes are dropped), return number of bytes written."""
+        n = min(len(data), self.size - self._count)
+        self.overflow += len(data) - n
+        if n == 0:
+            return 0
+        src = memoryview(data)
+        # first chunk: from head to end of buffer
+        n1 = min(n, self.size - self._head)
+        self._mv[self._head:self._head + n1] = src[:n1]
+        # second chunk: wrap around at buffer start
+        if n > n1:
+            self._mv[:n - n1] = src[n1:n]
+        self._head = (self._head + n) % self.size
+        self._count += n
+        return n
+
+    def peek(self, idx: int = 0) -> int:
+        """Return byte at index idx from read position (without consuming it), -1 if not available."""
+        if idx >= self._count:
+            return -1
+        return self._buf[(self._tail + idx) % self.size]
+
+    def readbyte(self) -> int:
+        """Return next byte (-1 if buffer is empty)."""
+        if self._count == 0:
+            return -1
+        b = self._buf[self._tail]
+        self._tail = (self._tail + 1) % self.size
+        self._count -= 1
+        return b
+
+    def readinto(self, buf, nbytes: int = None) -> int:
+        """Read up to nbytes (or len(buf)) bytes into buf, return number of bytes read."""
+        n = len(buf) if nbytes is None else min(nbytes, len(buf))
+        n = min(n, self._count)
+        if n == 0:
+            return 0
+        dst = memoryview(buf)
+        n1 = min(n, self.size - self._tail)
+        dst[:n1] = self._mv[self._tail:self._tail + n1]
+        if n > n1:
+            dst[n1:n] = self._mv[:n - n1]
+        self._tail = (self._tail + n) % self.size
+        self._count -= n
+        return n
+
+    def read(self, nbytes: int = None) -> bytes:
+        """Read up to nbytes (all available bytes by default)."""
+        n = self._count if nbytes is None else min(nbytes, self._count)
+        buf = bytearray(n)
+        self.readinto(buf)
+        return bytes(buf)
+
+    def find(self, byte: int) -> int:
+        """Return index (from read position) of the first byte equal to byte, -1 if not found."""
+        idx = self._tail
+        for i in range(self._count):
+            if self._buf[idx] == byte:
+                return i
+            idx += 1
+            if idx == self.size:
+                idx = 0
+        return -1
+
+    def readline(self) -> bytes:
+        """Return next complete line (with its b'\\n'), or b'' if no complete line is available."""
+        idx = self.find(0x0a)
+        if idx < 0:
+            # a full buffer without end of line will never complete: return it as is
+            return self.read() if self._count == self.size else b''
+        return self.read(idx + 1)
@@ -5,7 +5,7 @@ Use kitronik board 5348 v1.1
 https://www.lego.com/fr-fr/product/peugeot-9x8-24h-le-mans-hybrid-hypercar-42156?consent-modal=show
 """
 
-from lib.ble_ctrl import BLE_CTRL
+from lib.ble_ctrl import BLE_CTRL, PKT_ACCEL
 from lib.motor_ctrl import Motor, Servo
 from machine import Pin
 
@@ -13,13 +13,46 @@ import bluetooth
 import uasyncio as aio
 
 
+# some const
+# accelerometer value (m/s2) for full steering lock
+TILT_FULL_LOCK = 6.0
+# minimal steering change (degree) to update the servo
+TILT_DEADBAND = 2
+
+
+# some global vars
+tilt_steering = False
+
+
+# some func
+def tilt_on():
+    global tilt_steering
+    tilt_steering = True
+
+
+def tilt_off():
+    global tilt_steering
+    tilt_steering = False
+    servo_st.angle = 0
+
+
+def on_accel(accel):
+    # steer with phone tilt (accelerometer stream from the bluefruit app "sensors" view)
+    if not tilt_steering:
+        return
+    angle = int(accel.x * servo_st.max_degree / TILT_FULL_LOCK)
+    # skip small changes: avoid servo jitter and debug print at each packet
+    if abs(angle - servo_st.angle) >= TILT_DEADBAND:
+        servo_st.angle = angle
+
+
 async def ble_task():
     # main loop (exit with ctrl-c)
     while True:
         # do ble stuff
         ble_ctrl.update()
-        # allow other tasks to run
-        await aio.sleep_ms(50)
+        # allow other tasks to run (sensors are streamed at 10 to 20 Hz)
+        await aio.sleep_ms(20)
 
 
 async def telemetry_task():
@@ -49,12 +82,14 @@ if __name__ == '__main__':
     # buttons setup
     ble_ctrl.btn_pressed_hdl[1] = led.on
     ble_ctrl.btn_pressed_hdl[2] = led.off
-    # ble_ctrl.btn_pressed_hdl[3] =
-    # ble_ctrl.btn_pressed_hdl[4] =
+    ble_ctrl.btn_pressed_hdl[3] = tilt_on
+    ble_ctrl.btn_pressed_hdl[4] = tilt_off
     ble_ctrl.btn_pressed_hdl[5] = lambda: motor.adjust(+5)
     ble_ctrl.btn_pressed_hdl[6] = lambda: motor.adjust(-5)
     ble_ctrl.btn_pressed_hdl[7] = lambda: servo_st.adjust(+5)
     ble_ctrl.btn_pressed_hdl[8] = lambda: servo_st.adjust(-5)
+    # sensors setup
+    ble_ctrl.pkt_hdl[PKT_ACCEL] = on_accel
 
     # create asyncio task and run it
     loop = aio.get_event_loop()
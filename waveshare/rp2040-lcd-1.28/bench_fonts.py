@@ -0,0 +1,71 @@
+"""
+Import time and heap usage of the true-type fonts: font modules vs binary font files (lib/binfont.py).
+
+Build binary fonts on the host (see tools/font2bin.py), then run it on the board from this directory:
+
+    ./tools/font2bin.py fonts/truetype/*.py
+    mpremote mount . run bench_fonts.py
+
+With "mpremote mount", files are read over the USB link: copy fonts to the board flash for
+figures of a standalone board.
+"""
+
+import gc
+import os
+import sys
+from utime import ticks_diff, ticks_ms
+from lib.binfont import BinFont
+
+# some const
+FONTS_DIR = 'fonts/truetype'
+
+
+# some functions
+def measure(load):
+    """Return (load time in ms, heap bytes used by the loaded font) of load()."""
+    gc.collect()
+    free = gc.mem_free()
+    t_start = ticks_ms()
+    font = load()
+    load_ms = ticks_diff(ticks_ms(), t_start)
+    gc.collect()
+    used = free - gc.mem_free()
+    return font, load_ms, used
+
+
+def load_module(name):
+    mod_name = FONTS_DIR.replace('/', '.') + '.' + name
+    return __import__(mod_name, None, None, [name])
+
+
+def unload_module(name):
+    del sys.modules[FONTS_DIR.replace('/', '.') + '.' + name]
+    delattr(sys.modules[FONTS_DIR.replace('/', '.')], name)
+
+
+def main():
+    files = os.listdir(FONTS_DIR)
+    print(f'{"font":<18}{"module ms":>10}{"module B":>10}{"bin ms":>10}{"bin B":>10}')
+    for filename in sorted(files):
+        if not filename.endswith('.py') or filename.startswith('__'):
+            continue
+        name = filename[:-3]
+        try:
+            font, mod_ms, mod_used = measure(lambda: load_module(name))
+            del font
+            unload_module(name)
+        except MemoryError:
+            mod_ms, mod_used = None, None
+        gc.collect()
+        bin_ms, bin_used = None, None
+        if name + '.bin' in files:
+            font, bin_ms, bin_used = measure(lambda: BinFont(FONTS_DIR + '/' + name + '.bin'))
+            font.close()
+            del font
+        print(f'{name:<18}' + ''.join(f'{v:>10}' if v is not None else f'{"-":>10}'
+                                      for v in (mod_ms, mod_used, bin_ms, bin_used)))
+        gc.collect()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark of GC9A01 glyphs rendering with all fonts of fonts/romfonts and fonts/truetype.
+
+Glyphs are rendered to a null SPI bus (only rendering is measured, not SPI transfers), run it on the
+board from this directory with:
+
+    mpremote mount . run bench_glyphs.py
+
+For each font, report glyphs/s of:
+- ref: the former bit by bit rendering (one font bit test by pixel)
+- lut: the current driver rendering (expansion table and viper copy), without glyphs cache
+- cached: GC9A01.write() with the rendered glyphs cache (truetype fonts only)
+"""
+
+import gc
+import os
+import sys
+from utime import ticks_diff, ticks_us
+from lib.gc9a01py import GC9A01, WHITE, BLACK
+
+# some const
+TEXT = '0123456789:ABCabc'
+LOOPS = 4
+FONTS_DIRS = ('fonts/romfonts', 'fonts/truetype')
+
+
+# some class
+class NullPin:
+    def on(self):
+        pass
+
+    def off(self):
+        pass
+
+    def value(self, *args):
+        pass
+
+
+class NullSPI:
+    def write(self, data):
+        pass
+
+
+# some functions
+def ref_render(bitmap, bs_bit, pixels, buffer, fg=WHITE, bg=BLACK):
+    """Former rendering of a glyph: a bit test by pixel."""
+    fg_hi = (fg & 0xff00) >> 8
+    fg_lo = fg & 0xff
+    bg_hi = (bg & 0xff00) >> 8
+    bg_lo = bg & 0xff
+    for i in range(0, pixels * 2, 2):
+        if bitmap[bs_bit // 8] & 1 << (7 - (bs_bit % 8)) > 0:
+            buffer[i] = fg_hi
+            buffer[i + 1] = fg_lo
+        else:
+            buffer[i] = bg_hi
+            buffer[i + 1] = bg_lo
+        bs_bit += 1
+
+
+def glyphs_rate(func, glyphs):
+    """Return glyphs/s of func() that render glyphs."""
+    gc.collect()
+    t_start = ticks_us()
+    for _ in range(LOOPS):
+        func()
+    return LOOPS * glyphs * 1e6 / max(ticks_diff(ticks_us(), t_start), 1)
+
+
+def bench_romfont(tft, font):
+    pixels = font.WIDTH * font.HEIGHT
+    buffer = bytearray(pixels * 2)
+    chars = [c for c in TEXT if font.FIRST <= ord(c) < font.LAST]
+
+    def ref():
+        for c in chars:
+            ref_render(font.FONT, (ord(c) - font.FIRST) * pixels, pixels, buffer)
+
+    def lut():
+        tft.text(font, TEXT, 0, 0)
+
+    return glyphs_rate(ref, len(chars)), glyphs_rate(lut, len(chars)), None
+
+
+def bench_truetype(tft, font):
+    buffer = bytearray(font.HEIGHT * font.MAX_WIDTH * 2)
+    chars = [c for c in TEXT if c in font.MAP]
+    glyphs = []
+    for c in chars:
+        char_index = font.MAP.index(c)
+        offset = char_index * font.OFFSET_WIDTH
+        bs_bit = 0
+        for i in range(font.OFFSET_WIDTH):
+            bs_bit = (bs_bit << 8) + font.OFFSETS[offset + i]
+        glyphs.append((bs_bit, font.WIDTHS[char_index] * font.HEIGHT))
+
+    def ref():
+        for bs_bit, pixels in glyphs:
+            ref_render(font.BITMAPS, bs_bit, pixels, buffer)
+
+    def lut():
+        tft.glyph_cache = 0
+        tft.write(font, TEXT, 0, 0)
+
+    def cached():
+        tft.glyph_cache = 16384
+        tft.write(font, TEXT, 0, 0)
+
+    rates = glyphs_rate(ref, len(chars)), glyphs_rate(lut, len(chars))
+    # warm up the cache
+    cached()
+    rates += (glyphs_rate(cached, len(chars)),)
+    tft.glyph_cache_clear()
+    return rates
+
+
+def main():
+    tft = GC9A01(NullSPI(), dc=NullPin(), cs=NullPin(), reset=NullPin())
+    print(f'{"font":<28}{"ref":>10}{"lut":>10}{"cached":>10}  (glyphs/s)')
+    for fonts_dir in FONTS_DIRS:
+        for filename in sorted(os.listdir(fonts_dir)):
+            if not filename.endswith('.py') or filename.startswith('__'):
+                continue
+            mod_name = fonts_dir.replace('/', '.') + '.' + filename[:-3]
+            font = __import__(mod_name, None, None, [filename[:-3]])
+            if hasattr(font, 'FONT'):
+                rates = bench_romfont(tft, font)
+            else:
+                rates = bench_truetype(tft, font)
+            print(f'{mod_name[6:]:<28}' + ''.join(f'{r:>10.0f}' if r else f'{"-":>10}' for r in rates))
+            # free font
+            del font
+            del sys.modules[mod_name]
+            delattr(sys.modules[fonts_dir.replace('/', '.')], filename[:-3])
+            gc.collect()
+
+
+if __name__ == '__main__':
+    main()
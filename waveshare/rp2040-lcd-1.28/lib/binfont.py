@@ -0,0 +1,85 @@
+"""
+A converted true-type font read on demand from a binary font file (see tools/font2bin.py).
+
+Only the index of the font (MAP, WIDTHS, OFFSETS) is loaded in RAM, glyphs bitmaps are read
+from the file when they are rendered (with a small cache of glyphs bitmaps). A BinFont has the
+attributes of a font module and drop into GC9A01.write() and write_width():
+
+    font = BinFont('fonts/truetype/chango_64.bin')
+    tft.write(font, '12:34', 20, 80)
+"""
+
+from micropython import const
+import ustruct as struct
+
+# some const
+_MAGIC = b'BFNT'
+_VERSION = const(1)
+_HEADER = '<4sBBBBBHHI'
+_CACHE_SIZE = const(2048)
+
+
+# some class
+class BinFont:
+    def __init__(self, path, cache_size=_CACHE_SIZE):
+        # public
+        self.cache_size = cache_size
+        # private
+        self._file = open(path, 'rb')
+        (magic, version, self.BPP, self.HEIGHT, self.MAX_WIDTH, self.OFFSET_WIDTH,
+         n_chars, map_size, bitmaps_size) = struct.unpack(_HEADER, self._file.read(struct.calcsize(_HEADER)))
+        if magic != _MAGIC or version != _VERSION:
+            self._file.close()
+            raise ValueError('%s is not a binary font file' % path)
+        # index
+        self.MAP = self._file.read(map_size).decode()
+        self.WIDTHS = self._file.read(n_chars)
+        self.OFFSETS = self._file.read(n_chars * self.OFFSET_WIDTH)
+        self._bitmaps_pos = self._file.tell()
+        self._bitmaps_size = bitmaps_size
+        # read buffer: bits of the largest glyph at any bit position
+        self._buf = bytearray((self.MAX_WIDTH * self.HEIGHT * self.BPP + 7) // 8 + 1)
+        # glyphs bitmaps: char index -> [bytes, bit offset, last use tick]
+        self._cache = {}
+        self._cache_used = 0
+        self._tick = 0
+
+    def close(self):
+        self._file.close()
+
+    def glyph_bits(self, char_index):
+        """Return (bitmap, bs_bit) of a glyph: a buffer with the glyph bits starting at bit bs_bit."""
+        self._tick += 1
+        entry = self._cache.get(char_index)
+        if entry is not None:
+            entry[2] = self._tick
+            return entry[0], entry[1]
+        # bit offset of the glyph in bitmaps
+        offset = char_index * self.OFFSET_WIDTH
+        bs_bit = 0
+        for i in range(self.OFFSET_WIDTH):
+            bs_bit = (bs_bit << 8) + self.OFFSETS[offset + i]
+        start = bs_bit >> 3
+        size = min((bs_bit + self.WIDTHS[char_index] * self.HEIGHT * self.BPP + 7) // 8, self._bitmaps_size) - start
+        self._file.seek(self._bitmaps_pos + start)
+        if size > self.cache_size:
+            # too large for the cache: use the read buffer
+            self._file.readinto(memoryview(self._buf)[0:size])
+            return self._buf, bs_bit & 7
+        bitmap = bytearray(size)
+        self._file.readinto(bitmap)
+        while self._cache_used + size > self.cache_size:
+            self._evict()
+        self._cache[char_index] = [bitmap, bs_bit & 7, self._tick]
+        self._cache_used += size
+        return bitmap, bs_bit & 7
+
+    def _evict(self):
+        # remove the least recently used glyph from the cache
+        lru_key = None
+        lru_tick = 0
+        for key, entry in self._cache.items():
+            if lru_key is None or entry[2] < lru_tick:
+                lru_key = key
+                lru_tick = entry[2]
+        self._cache_used -= len(self._cache.pop(lru_key)[0])
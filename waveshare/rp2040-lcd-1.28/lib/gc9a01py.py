@@ -46,7 +46,10 @@ C version of the driver at https://github.com/russhughes/gc9a01_mpy
 
 # pylint: disable=invalid-name,import-error
 
+import math
 import time
+import framebuf
+import micropython
 from micropython import const
 import ustruct as struct
 
@@ -81,15 +84,14 @@ _ENCODE_POS = ">HH"
 _DECODE_PIXEL = ">BBB"
 
 _BUFFER_SIZE = const(256)
+_GLYPH_CACHE_SIZE = const(16384)
+_LUT_CACHE = const(4)
+_RUN_CACHE = const(8)
+_FB_CHUNK_SIZE = const(4096)
+_BITMAP_BUFFER_SIZE = const(4096)
+_DIRTY_MAX = const(8)
+_DIRTY_MERGE_SLACK = const(512)
 
-_BIT7 = const(0x80)
-_BIT6 = const(0x40)
-_BIT5 = const(0x20)
-_BIT4 = const(0x10)
-_BIT3 = const(0x08)
-_BIT2 = const(0x04)
-_BIT1 = const(0x02)
-_BIT0 = const(0x01)
 
 ROTATIONS = [
     0x48,   # 0 - PORTRAIT
@@ -123,6 +125,170 @@ def _encode_pixel(color):
     return struct.pack(_ENCODE_PIXEL, color)
 
 
+def _swap_bytes(color):
+    """Swap bytes of a 565 encoded color (framebuf stores little endian
+    pixels, the display reads big endian ones)."""
+    return (color & 0xff) << 8 | color >> 8
+
+
+def _build_palette_lut(palette, bpp):
+    """
+    Return a table of the 8 // bpp RGB565 pixels (16 // bpp bytes) of each
+    byte value (0 to 255) of bpp bits palette indexes.
+    """
+    colors = [_encode_pixel(c) for c in palette]
+    colors += [_encode_pixel(BLACK)] * ((1 << bpp) - len(colors))
+    mask = (1 << bpp) - 1
+    shifts = range(8 - bpp, -1, -bpp)
+    return b''.join(b''.join(colors[b >> s & mask] for s in shifts)
+                    for b in range(256))
+
+
+def _build_lut(fg, bg):
+    """
+    Return a table of the 8 RGB565 pixels (16 bytes) of each font byte value
+    (0 to 255) drawn in fg and bg colors.
+    """
+    pixels = (_encode_pixel(bg), _encode_pixel(fg))
+    nibbles = [b''.join(pixels[n >> s & 1] for s in (3, 2, 1, 0))
+               for n in range(16)]
+    lut = bytearray(4096)
+    for i in range(256):
+        lut[i * 16:i * 16 + 16] = nibbles[i >> 4] + nibbles[i & 0xf]
+
+    return lut
+
+
+@micropython.viper
+def _expand(lut, bitmap, bs_bit: int, pixels: int, buffer):
+    # expand pixels bits of bitmap starting at bit bs_bit (at any bit
+    # position, proportional fonts glyphs are not byte aligned) to RGB565
+    # pixels in buffer, one font byte (8 pixels) at a time with a table of
+    # _build_lut(): 4 words copy by byte
+    src = ptr8(bitmap)
+    tbl = ptr32(lut)
+    dst = ptr32(buffer)
+    k = bs_bit >> 3
+    shift = bs_bit & 7
+    d = 0
+    n = pixels >> 3
+    while n > 0:
+        b = src[k]
+        if shift:
+            b = ((b << shift) | (src[k + 1] >> (8 - shift))) & 0xff
+        t = b << 2
+        dst[d] = tbl[t]
+        dst[d + 1] = tbl[t + 1]
+        dst[d + 2] = tbl[t + 2]
+        dst[d + 3] = tbl[t + 3]
+        d += 4
+        k += 1
+        n -= 1
+    # last pixels (less than 8): pixel by pixel
+    rest = pixels & 7
+    if rest:
+        b = src[k]
+        if shift + rest > 8:
+            b = ((b << shift) | (src[k + 1] >> (8 - shift))) & 0xff
+        elif shift:
+            b = (b << shift) & 0xff
+        tbl16 = ptr16(lut)
+        dst16 = ptr16(buffer)
+        t = b << 3
+        d = d << 1
+        while rest > 0:
+            dst16[d] = tbl16[t]
+            d += 1
+            t += 1
+            rest -= 1
+
+
+def _half_plane(v_x, v_y, dy, x0, x1, strict=False):
+    """
+    Return the (lo, hi) part of the row segment [x0, x1] at dy where points
+    are clockwise of vector v (on display, y axis down): v_x * dy - v_y * x
+    >= 0 (or > 0 if strict).
+    """
+    if v_y > 1e-9:
+        bound = v_x * dy / v_y
+        if strict:
+            return x0, min(x1, math.ceil(bound - 1e-6) - 1)
+        return x0, min(x1, math.floor(bound + 1e-6))
+    if v_y < -1e-9:
+        bound = v_x * dy / v_y
+        if strict:
+            return max(x0, math.floor(bound + 1e-6) + 1), x1
+        return max(x0, math.ceil(bound - 1e-6)), x1
+    if v_x * dy > 0 or (v_x * dy == 0 and not strict):
+        return x0, x1
+    return x0, x0 - 1
+
+
+@micropython.viper
+def _expand_bpp(lut, bitmap, bs_bit: int, pixels: int, buffer, bpp: int,
+                ppb: int):
+    # like _expand() for bpp bits palette indexes (1, 2, 4 or 8 bits, ppb
+    # pixels by byte) with a table of _build_palette_lut()
+    src = ptr8(bitmap)
+    tbl = ptr16(lut)
+    dst = ptr16(buffer)
+    k = bs_bit >> 3
+    shift = bs_bit & 7
+    d = 0
+    n = pixels
+    while n >= ppb:
+        b = src[k]
+        if shift:
+            b = ((b << shift) | (src[k + 1] >> (8 - shift))) & 0xff
+        t = b * ppb
+        i = 0
+        while i < ppb:
+            dst[d] = tbl[t + i]
+            d += 1
+            i += 1
+        k += 1
+        n -= ppb
+    if n > 0:
+        b = src[k]
+        if shift + n * bpp > 8:
+            b = ((b << shift) | (src[k + 1] >> (8 - shift))) & 0xff
+        elif shift:
+            b = (b << shift) & 0xff
+        t = b * ppb
+        i = 0
+        while i < n:
+            dst[d + i] = tbl[t + i]
+            i += 1
+
+
+@micropython.viper
+def _next_run(buffer, i: int, end: int, key: int, opaque: int) -> int:
+    # return index of the first opaque pixel (or transparent if not opaque)
+    # of buffer from i to end, key is the transparent color as read by ptr16
+    px = ptr16(buffer)
+    if opaque:
+        while i < end and px[i] == key:
+            i += 1
+    else:
+        while i < end and px[i] != key:
+            i += 1
+    return i
+
+
+_font_indexes = {}
+
+
+def _font_index(font):
+    """Return the character to glyph index dict of a converted true-type
+    font (built once by font)."""
+    try:
+        return _font_indexes[font]
+    except KeyError:
+        index = {char: i for i, char in enumerate(font.MAP)}
+        _font_indexes[font] = index
+        return index
+
+
 class GC9A01():
     """
     GC9A01 driver class
@@ -134,6 +300,13 @@ class GC9A01():
         reset (pin): reset pin
         backlight(pin): backlight pin
         rotation (int): display rotation
+        glyph_cache (int): max size in bytes of the rendered glyphs cache used
+            by write(), 0 to disable it
+        fb_lines (int): rows of the off-screen framebuffer, 0 to draw directly
+            on the display (default), height for a full-screen framebuffer or
+            less for a band framebuffer (see bands() and show())
+        fb_background (int): 565 encoded color of the band framebuffer at the
+            start of each band
     """
 
     def __init__(
@@ -143,7 +316,10 @@ class GC9A01():
             cs=None,
             reset=None,
             backlight=None,
-            rotation=0):
+            rotation=0,
+            glyph_cache=_GLYPH_CACHE_SIZE,
+            fb_lines=0,
+            fb_background=BLACK):
         """
         Initialize display.
         """
@@ -161,6 +337,31 @@ class GC9A01():
         self.cs = cs
         self.backlight = backlight
         self._rotation = rotation % 8
+        self.glyph_cache = glyph_cache
+        # rendered glyphs: (font, char, fg, bg) -> [buffer, last use tick]
+        self._glyphs = {}
+        self._glyphs_size = 0
+        self._glyphs_tick = 0
+        # expansion tables by (fg, bg) colors
+        self._luts = {}
+        # runs of _BUFFER_SIZE pixels by color
+        self._runs = {}
+        # palette tables by bitmap module and bitmap bands buffer
+        self._bitmap_luts = {}
+        self._bitmap_buf = None
+        # off-screen framebuffer (pixels bytes are in display order)
+        self.fb_lines = min(fb_lines, self.height)
+        self.fb_background = fb_background
+        self._fb = None
+        self._band_y = 0
+        self._band_h = self.height
+        self._dirty_rects = []
+        if self.fb_lines:
+            self._fb_buf = bytearray(self.width * self.fb_lines * 2)
+            self._fb_mv = memoryview(self._fb_buf)
+            self._fb = framebuf.FrameBuffer(
+                self._fb_buf, self.width, self.fb_lines, framebuf.RGB565)
+            self._band_h = self.fb_lines
 
         self.hard_reset()
         time.sleep_ms(100)
@@ -357,6 +558,143 @@ class GC9A01():
         self._set_rows(y0, y1)
         self._write(GC9A01_RAMWR)
 
+    def _dirty(self, x, y, width, height):
+        """
+        Add a rectangle to the dirty regions of the current band, merge it
+        with a dirty region when it saves a window.
+        """
+        x0 = max(x, 0)
+        y0 = max(y, self._band_y)
+        x1 = min(x + width, self.width) - 1
+        y1 = min(y + height, self._band_y + self._band_h) - 1
+        if x0 > x1 or y0 > y1:
+            return
+
+        rects = self._dirty_rects
+        i = 0
+        while i < len(rects):
+            r_x0, r_y0, r_x1, r_y1 = rects[i]
+            u_x0, u_y0 = min(x0, r_x0), min(y0, r_y0)
+            u_x1, u_y1 = max(x1, r_x1), max(y1, r_y1)
+            if ((u_x1 - u_x0 + 1) * (u_y1 - u_y0 + 1)
+                    <= (x1 - x0 + 1) * (y1 - y0 + 1)
+                    + (r_x1 - r_x0 + 1) * (r_y1 - r_y0 + 1)
+                    + _DIRTY_MERGE_SLACK):
+                # merge and retry with the other regions
+                del rects[i]
+                x0, y0, x1, y1 = u_x0, u_y0, u_x1, u_y1
+                i = 0
+            else:
+                i += 1
+
+        if len(rects) >= _DIRTY_MAX:
+            # too many regions: merge with the one that grows the least
+            best = 0
+            best_area = None
+            for i, (r_x0, r_y0, r_x1, r_y1) in enumerate(rects):
+                area = ((max(x1, r_x1) - min(x0, r_x0) + 1)
+                        * (max(y1, r_y1) - min(y0, r_y0) + 1))
+                if best_area is None or area < best_area:
+                    best = i
+                    best_area = area
+
+            r_x0, r_y0, r_x1, r_y1 = rects.pop(best)
+            x0, y0 = min(x0, r_x0), min(y0, r_y0)
+            x1, y1 = max(x1, r_x1), max(y1, r_y1)
+
+        rects.append((x0, y0, x1, y1))
+
+    def _fb_blit(self, buffer, x, y, width, height):
+        """Copy a buffer of RGB565 pixels to the framebuffer (clipped)."""
+        src_x0 = max(-x, 0)
+        src_y0 = max(self._band_y - y, 0)
+        src_x1 = min(self.width - x, width)
+        src_y1 = min(self._band_y + self._band_h - y, height)
+        if src_x0 >= src_x1 or src_y0 >= src_y1:
+            return
+
+        src = memoryview(buffer)
+        fb = self._fb_mv
+        row_size = (src_x1 - src_x0) * 2
+        dst = ((y + src_y0 - self._band_y) * self.width + x + src_x0) * 2
+        for row in range(src_y0, src_y1):
+            start = (row * width + src_x0) * 2
+            fb[dst:dst + row_size] = src[start:start + row_size]
+            dst += self.width * 2
+
+        self._dirty(x, y, width, height)
+
+    def show(self):
+        """
+        Flush dirty regions of the framebuffer (of the current band) to the
+        display: one window by merged region, full width regions are sent with
+        a single SPI write.
+        """
+        if self._fb is None:
+            return
+
+        row_size = self.width * 2
+        for x0, y0, x1, y1 in self._dirty_rects:
+            self._set_window(x0, y0, x1, y1)
+            start = (y0 - self._band_y) * row_size
+            if x1 - x0 + 1 == self.width:
+                self._write(None, self._fb_mv[
+                    start:start + (y1 - y0 + 1) * row_size])
+                continue
+
+            # gather rows of the region in chunks
+            size = (x1 - x0 + 1) * 2
+            rows = max(_FB_CHUNK_SIZE // size, 1)
+            chunk = bytearray(min(rows, y1 - y0 + 1) * size)
+            start += x0 * 2
+            used = 0
+            for _ in range(y0, y1 + 1):
+                chunk[used:used + size] = self._fb_mv[start:start + size]
+                used += size
+                start += row_size
+                if used == len(chunk):
+                    self._write(None, chunk)
+                    used = 0
+
+            if used:
+                self._write(None, memoryview(chunk)[0:used])
+
+        self._dirty_rects = []
+
+    def bands(self):
+        """
+        Iterate over the bands of the framebuffer: draw the whole screen at
+        each iteration, drawing is clipped to the current band which is
+        flushed at the end of the iteration. With a full-screen framebuffer
+        there is a single band (and framebuffer content is kept), a band
+        framebuffer is filled with fb_background at the start of each band.
+
+        Example:
+
+            for _ in tft.bands():
+                tft.fill_rect(0, 0, 240, 240, BLACK)
+                tft.text(font, 'Hello', 80, 100)
+
+        Yields:
+            first row of the band
+        """
+        if self._fb is None:
+            yield 0
+            return
+
+        for band_y in range(0, self.height, self.fb_lines):
+            self._band_y = band_y
+            self._band_h = min(self.fb_lines, self.height - band_y)
+            self._dirty_rects = []
+            if self.fb_lines < self.height:
+                self._fb.fill(_swap_bytes(self.fb_background))
+
+            yield band_y
+            self.show()
+
+        self._band_y = 0
+        self._band_h = self.fb_lines
+
     def vline(self, x, y, length, color):
         """
         Draw vertical line at the given location and color.
@@ -390,6 +728,14 @@ class GC9A01():
             Y (int): y coordinate
             color (int): 565 encoded color
         """
+        if self._fb is not None:
+            self._fb.pixel(x, y - self._band_y, _swap_bytes(color))
+            self._dirty(x, y, 1, 1)
+            return
+
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return
+
         self._set_window(x, y, x, y)
         self._write(None, _encode_pixel(color))
 
@@ -404,6 +750,28 @@ class GC9A01():
             width (int): Width
             height (int): Height
         """
+        if self._fb is not None:
+            self._fb_blit(buffer, x, y, width, height)
+            return
+
+        if (x < 0 or y < 0 or x + width > self.width
+                or y + height > self.height):
+            # clip: row by row
+            x0 = max(x, 0)
+            y0 = max(y, 0)
+            x1 = min(x + width, self.width)
+            y1 = min(y + height, self.height)
+            if x0 >= x1 or y0 >= y1:
+                return
+
+            self._set_window(x0, y0, x1 - 1, y1 - 1)
+            src = memoryview(buffer)
+            size = (x1 - x0) * 2
+            for row in range(y0 - y, y1 - y):
+                start = (row * width + x0 - x) * 2
+                self._write(None, src[start:start + size])
+            return
+
         self._set_window(x, y, x + width - 1, y + height - 1)
         self._write(None, buffer)
 
@@ -434,16 +802,40 @@ class GC9A01():
             height (int): Height in pixels
             color (int): 565 encoded color
         """
-        self._set_window(x, y, x + width - 1, y + height - 1)
-        chunks, rest = divmod(width * height, _BUFFER_SIZE)
-        pixel = _encode_pixel(color)
+        if self._fb is not None:
+            self._fb.fill_rect(
+                x, y - self._band_y, width, height, _swap_bytes(color))
+            self._dirty(x, y, width, height)
+            return
+
+        # clip to the display
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + width, self.width)
+        y1 = min(y + height, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+
+        self._set_window(x0, y0, x1 - 1, y1 - 1)
+        chunks, rest = divmod((x1 - x0) * (y1 - y0), _BUFFER_SIZE)
+        data = self._color_run(color)
         self.dc.on()
-        if chunks:
-            data = pixel * _BUFFER_SIZE
-            for _ in range(chunks):
-                self._write(None, data)
+        for _ in range(chunks):
+            self._write(None, data)
         if rest:
-            self._write(None, pixel * rest)
+            self._write(None, memoryview(data)[0:rest * 2])
+
+    def _color_run(self, color):
+        """Return a run of _BUFFER_SIZE pixels of color (cached)."""
+        run = self._runs.get(color)
+        if run is None:
+            if len(self._runs) >= _RUN_CACHE:
+                self._runs = {}
+
+            run = _encode_pixel(color) * _BUFFER_SIZE
+            self._runs[color] = run
+
+        return run
 
     def fill(self, color):
         """
@@ -458,6 +850,9 @@ class GC9A01():
         """
         Draw a single pixel wide line starting at x0, y0 and ending at x1, y1.
 
+        Pixels are sent as horizontal (or vertical for steep lines) runs, one
+        window by run.
+
         Args:
             x0 (int): Start point x coordinate
             y0 (int): Start point y coordinate
@@ -465,6 +860,14 @@ class GC9A01():
             y1 (int): End point y coordinate
             color (int): 565 encoded color
         """
+        if y0 == y1:
+            self.hline(min(x0, x1), y0, abs(x1 - x0) + 1, color)
+            return
+
+        if x0 == x1:
+            self.vline(x0, min(y0, y1), abs(y1 - y0) + 1, color)
+            return
+
         steep = abs(y1 - y0) > abs(x1 - x0)
         if steep:
             x0, y0 = y0, x0
@@ -479,17 +882,208 @@ class GC9A01():
             ystep = 1
         else:
             ystep = -1
+        start = x0
         while x0 <= x1:
-            if steep:
-                self.pixel(y0, x0, color)
-            else:
-                self.pixel(x0, y0, color)
             err -= dy
-            if err < 0:
-                y0 += ystep
-                err += dx
+            if err < 0 or x0 == x1:
+                # end of the current run
+                if steep:
+                    self.vline(y0, start, x0 - start + 1, color)
+                else:
+                    self.hline(start, y0, x0 - start + 1, color)
+                start = x0 + 1
+                if err < 0:
+                    y0 += ystep
+                    err += dx
             x0 += 1
 
+    def circle(self, x, y, r, color):
+        """
+        Draw a circle outline, pixels are sent as runs: horizontal ones at top
+        and bottom, vertical ones at left and right.
+
+        Args:
+            x (int): Center x coordinate
+            y (int): Center y coordinate
+            r (int): Radius in pixels
+            color (int): 565 encoded color
+        """
+        dx = 0
+        dy = r
+        err = 1 - r
+        start = 0
+        while dx <= dy:
+            if err >= 0 or dx + 1 > dy:
+                # dy changes at next step (or last step): draw the run
+                # [start, dx] in the 8 octants
+                length = dx - start + 1
+                self.hline(x + start, y - dy, length, color)
+                self.hline(x - dx, y - dy, length, color)
+                self.hline(x + start, y + dy, length, color)
+                self.hline(x - dx, y + dy, length, color)
+                self.vline(x + dy, y + start, length, color)
+                self.vline(x + dy, y - dx, length, color)
+                self.vline(x - dy, y + start, length, color)
+                self.vline(x - dy, y - dx, length, color)
+                start = dx + 1
+
+            if err < 0:
+                err += 2 * dx + 3
+            else:
+                err += 2 * (dx - dy) + 5
+                dy -= 1
+            dx += 1
+
+    def fill_circle(self, x, y, r, color):
+        """
+        Draw a filled circle, with one horizontal span by row.
+
+        Args:
+            x (int): Center x coordinate
+            y (int): Center y coordinate
+            r (int): Radius in pixels
+            color (int): 565 encoded color
+        """
+        dx = 0
+        dy = r
+        err = 1 - r
+        while dx <= dy:
+            # rows y +/- dx (once by dx)
+            self.hline(x - dy, y + dx, 2 * dy + 1, color)
+            if dx:
+                self.hline(x - dy, y - dx, 2 * dy + 1, color)
+
+            # rows y +/- dy, at their widest before dy changes
+            if (err >= 0 or dx + 1 > dy) and dy != dx:
+                self.hline(x - dx, y + dy, 2 * dx + 1, color)
+                self.hline(x - dx, y - dy, 2 * dx + 1, color)
+
+            if err < 0:
+                err += 2 * dx + 3
+            else:
+                err += 2 * (dx - dy) + 5
+                dy -= 1
+            dx += 1
+
+    @staticmethod
+    def _polygon_points(points, x, y, angle, center_x, center_y):
+        """Return polygon points rotated around center and moved to x, y."""
+        if not angle:
+            return [(x + round(px), y + round(py)) for px, py in points]
+
+        cos_a = math.cos(math.radians(angle))
+        sin_a = math.sin(math.radians(angle))
+        rotated = []
+        for px, py in points:
+            px -= center_x
+            py -= center_y
+            rotated.append(
+                (x + round(center_x + px * cos_a - py * sin_a),
+                 y + round(center_y + px * sin_a + py * cos_a)))
+
+        return rotated
+
+    def polygon(self, points, x, y, color, angle=0, center_x=0, center_y=0):
+        """
+        Draw a closed polygon outline.
+
+        Args:
+            points (list): list of (x, y) vertices
+            x (int): x coordinate of the polygon origin on display
+            y (int): y coordinate of the polygon origin on display
+            color (int): 565 encoded color
+            angle (float): rotation in degrees (clockwise), optional
+            center_x (int): x coordinate of the rotation center, optional
+            center_y (int): y coordinate of the rotation center, optional
+        """
+        pts = self._polygon_points(points, x, y, angle, center_x, center_y)
+        for i in range(len(pts)):
+            x0, y0 = pts[i - 1]
+            x1, y1 = pts[i]
+            self.line(x0, y0, x1, y1, color)
+
+    def fill_polygon(self, points, x, y, color, angle=0, center_x=0,
+                     center_y=0):
+        """
+        Draw a filled polygon (even-odd rule), with horizontal spans by row.
+
+        Args:
+            points (list): list of (x, y) vertices
+            x (int): x coordinate of the polygon origin on display
+            y (int): y coordinate of the polygon origin on display
+            color (int): 565 encoded color
+            angle (float): rotation in degrees (clockwise), optional
+            center_x (int): x coordinate of the rotation center, optional
+            center_y (int): y coordinate of the rotation center, optional
+        """
+        pts = self._polygon_points(points, x, y, angle, center_x, center_y)
+        y_min = max(min(py for _, py in pts), 0)
+        y_max = min(max(py for _, py in pts), self.height - 1)
+        for row in range(y_min, y_max + 1):
+            # x of edges crossings of this row
+            nodes = []
+            x0, y0 = pts[-1]
+            for x1, y1 in pts:
+                if y0 <= row < y1 or y1 <= row < y0:
+                    nodes.append(x0 + (row - y0) * (x1 - x0) // (y1 - y0))
+                x0, y0 = x1, y1
+
+            nodes.sort()
+            for i in range(0, len(nodes) - 1, 2):
+                self.hline(nodes[i], row, nodes[i + 1] - nodes[i] + 1, color)
+
+    def arc(self, x, y, r, start, end, color, thickness=1):
+        """
+        Draw an arc of a ring (like a gauge), with horizontal spans by row.
+
+        Angles are in degrees, clockwise from 12 o'clock.
+
+        Args:
+            x (int): Center x coordinate
+            y (int): Center y coordinate
+            r (int): Outer radius in pixels
+            start (float): start angle
+            end (float): end angle (clockwise from start)
+            color (int): 565 encoded color
+            thickness (int): ring thickness in pixels, optional
+        """
+        sweep = (end - start) % 360 or (360 if end != start else 0)
+        if not sweep:
+            return
+
+        # unit vectors of start and end angles
+        s_x = math.sin(math.radians(start))
+        s_y = -math.cos(math.radians(start))
+        e_x = math.sin(math.radians(end))
+        e_y = -math.cos(math.radians(end))
+        r_in = r - thickness
+        for dy in range(-r, r + 1):
+            x_out = int(math.sqrt(r * r - dy * dy) + 0.5)
+            if abs(dy) < r_in:
+                x_in = int(math.sqrt(r_in * r_in - dy * dy) + 0.5)
+                segments = ((-x_out, -x_in - 1), (x_in + 1, x_out))
+            else:
+                segments = ((-x_out, x_out),)
+
+            for x0, x1 in segments:
+                if sweep >= 360:
+                    spans = ((x0, x1),)
+                elif sweep <= 180:
+                    # clockwise of start and counterclockwise of end
+                    lo, hi = _half_plane(s_x, s_y, dy, x0, x1)
+                    lo, hi = _half_plane(-e_x, -e_y, dy, lo, hi)
+                    spans = ((lo, hi),)
+                else:
+                    # segment minus the (less than 180) complement sector
+                    lo, hi = _half_plane(e_x, e_y, dy, x0, x1, True)
+                    lo, hi = _half_plane(-s_x, -s_y, dy, lo, hi, True)
+                    spans = ((x0, min(x1, lo - 1)), (max(x0, hi + 1), x1)) \
+                        if lo <= hi else ((x0, x1),)
+
+                for lo, hi in spans:
+                    if lo <= hi:
+                        self.hline(x + lo, y + dy, hi - lo + 1, color)
+
     def vscrdef(self, tfa, vsa, bfa):
         """
         Set Vertical Scrolling Definition.
@@ -527,6 +1121,19 @@ class GC9A01():
         """
         self._write(GC9A01_VSCSAD, struct.pack(">H", vssa))
 
+    def _lut(self, fg, bg):
+        """Return the expansion table of fg and bg colors (cached)."""
+        key = (fg, bg)
+        lut = self._luts.get(key)
+        if lut is None:
+            if len(self._luts) >= _LUT_CACHE:
+                self._luts = {}
+
+            lut = _build_lut(fg, bg)
+            self._luts[key] = lut
+
+        return lut
+
     def _text8(self, font, text, x0, y0, color=WHITE, background=BLACK):
         """
         Internal method to write characters with width of 8 and
@@ -540,95 +1147,17 @@ class GC9A01():
             color (int): 565 encoded color to use for characters
             background (int): 565 encoded color to use for background
         """
+        lut = self._lut(color, background)
+        pixels = font.WIDTH * font.HEIGHT
+        buffer = bytearray(pixels * 2)
         for char in text:
             ch = ord(char)
             if (font.FIRST <= ch < font.LAST
                     and x0+font.WIDTH <= self.width
                     and y0+font.HEIGHT <= self.height):
 
-                if font.HEIGHT == 8:
-                    passes = 1
-                    size = 8
-                    each = 0
-                else:
-                    passes = 2
-                    size = 16
-                    each = 8
-
-                for line in range(passes):
-                    idx = (ch-font.FIRST)*size+(each*line)
-                    #
-                    # Yes, this looks bad, but it is fast
-                    #
-                    buffer = struct.pack(
-                        '>64H',
-                        color if font.FONT[idx] & _BIT7 else background,
-                        color if font.FONT[idx] & _BIT6 else background,
-                        color if font.FONT[idx] & _BIT5 else background,
-                        color if font.FONT[idx] & _BIT4 else background,
-                        color if font.FONT[idx] & _BIT3 else background,
-                        color if font.FONT[idx] & _BIT2 else background,
-                        color if font.FONT[idx] & _BIT1 else background,
-                        color if font.FONT[idx] & _BIT0 else background,
-                        color if font.FONT[idx+1] & _BIT7 else background,
-                        color if font.FONT[idx+1] & _BIT6 else background,
-                        color if font.FONT[idx+1] & _BIT5 else background,
-                        color if font.FONT[idx+1] & _BIT4 else background,
-                        color if font.FONT[idx+1] & _BIT3 else background,
-                        color if font.FONT[idx+1] & _BIT2 else background,
-                        color if font.FONT[idx+1] & _BIT1 else background,
-                        color if font.FONT[idx+1] & _BIT0 else background,
-                        color if font.FONT[idx+2] & _BIT7 else background,
-                        color if font.FONT[idx+2] & _BIT6 else background,
-                        color if font.FONT[idx+2] & _BIT5 else background,
-                        color if font.FONT[idx+2] & _BIT4 else background,
-                        color if font.FONT[idx+2] & _BIT3 else background,
-                        color if font.FONT[idx+2] & _BIT2 else background,
-                        color if font.FONT[idx+2] & _BIT1 else background,
-                        color if font.FONT[idx+2] & _BIT0 else background,
-                        color if font.FONT[idx+3] & _BIT7 else background,
-                        color if font.FONT[idx+3] & _BIT6 else background,
-                        color if font.FONT[idx+3] & _BIT5 else background,
-                        color if font.FONT[idx+3] & _BIT4 else background,
-                        color if font.FONT[idx+3] & _BIT3 else background,
-                        color if font.FONT[idx+3] & _BIT2 else background,
-                        color if font.FONT[idx+3] & _BIT1 else background,
-                        color if font.FONT[idx+3] & _BIT0 else background,
-                        color if font.FONT[idx+4] & _BIT7 else background,
-                        color if font.FONT[idx+4] & _BIT6 else background,
-                        color if font.FONT[idx+4] & _BIT5 else background,
-                        color if font.FONT[idx+4] & _BIT4 else background,
-                        color if font.FONT[idx+4] & _BIT3 else background,
-                        color if font.FONT[idx+4] & _BIT2 else background,
-                        color if font.FONT[idx+4] & _BIT1 else background,
-                        color if font.FONT[idx+4] & _BIT0 else background,
-                        color if font.FONT[idx+5] & _BIT7 else background,
-                        color if font.FONT[idx+5] & _BIT6 else background,
-                        color if font.FONT[idx+5] & _BIT5 else background,
-                        color if font.FONT[idx+5] & _BIT4 else background,
-                        color if font.FONT[idx+5] & _BIT3 else background,
-                        color if font.FONT[idx+5] & _BIT2 else background,
-                        color if font.FONT[idx+5] & _BIT1 else background,
-                        color if font.FONT[idx+5] & _BIT0 else background,
-                        color if font.FONT[idx+6] & _BIT7 else background,
-                        color if font.FONT[idx+6] & _BIT6 else background,
-                        color if font.FONT[idx+6] & _BIT5 else background,
-                        color if font.FONT[idx+6] & _BIT4 else background,
-                        color if font.FONT[idx+6] & _BIT3 else background,
-                        color if font.FONT[idx+6] & _BIT2 else background,
-                        color if font.FONT[idx+6] & _BIT1 else background,
-                        color if font.FONT[idx+6] & _BIT0 else background,
-                        color if font.FONT[idx+7] & _BIT7 else background,
-                        color if font.FONT[idx+7] & _BIT6 else background,
-                        color if font.FONT[idx+7] & _BIT5 else background,
-                        color if font.FONT[idx+7] & _BIT4 else background,
-                        color if font.FONT[idx+7] & _BIT3 else background,
-                        color if font.FONT[idx+7] & _BIT2 else background,
-                        color if font.FONT[idx+7] & _BIT1 else background,
-                        color if font.FONT[idx+7] & _BIT0 else background
-                    )
-                    self.blit_buffer(buffer, x0, y0+8*line, 8, 8)
-
+                _expand(lut, font.FONT, (ch-font.FIRST)*pixels, pixels, buffer)
+                self.blit_buffer(buffer, x0, y0, font.WIDTH, font.HEIGHT)
                 x0 += 8
 
     def _text16(self, font, text, x0, y0, color=WHITE, background=BLACK):
@@ -644,158 +1173,17 @@ class GC9A01():
             color (int): 565 encoded color to use for characters
             background (int): 565 encoded color to use for background
         """
+        lut = self._lut(color, background)
+        pixels = font.WIDTH * font.HEIGHT
+        buffer = bytearray(pixels * 2)
         for char in text:
             ch = ord(char)
             if (font.FIRST <= ch < font.LAST
                     and x0+font.WIDTH <= self.width
                     and y0+font.HEIGHT <= self.height):
 
-                if font.HEIGHT == 16:
-                    passes = 2
-                    size = 32
-                    each = 16
-                else:
-                    passes = 4
-                    size = 64
-                    each = 16
-
-                for line in range(passes):
-                    idx = (ch-font.FIRST)*size+(each*line)
-                    #
-                    # And this looks even worse, but it is fast
-                    #
-                    buffer = struct.pack(
-                        '>128H',
-                        color if font.FONT[idx] & _BIT7 else background,
-                        color if font.FONT[idx] & _BIT6 else background,
-                        color if font.FONT[idx] & _BIT5 else background,
-                        color if font.FONT[idx] & _BIT4 else background,
-                        color if font.FONT[idx] & _BIT3 else background,
-                        color if font.FONT[idx] & _BIT2 else background,
-                        color if font.FONT[idx] & _BIT1 else background,
-                        color if font.FONT[idx] & _BIT0 else background,
-                        color if font.FONT[idx+1] & _BIT7 else background,
-                        color if font.FONT[idx+1] & _BIT6 else background,
-                        color if font.FONT[idx+1] & _BIT5 else background,
-                        color if font.FONT[idx+1] & _BIT4 else background,
-                        color if font.FONT[idx+1] & _BIT3 else background,
-                        color if font.FONT[idx+1] & _BIT2 else background,
-                        color if font.FONT[idx+1] & _BIT1 else background,
-                        color if font.FONT[idx+1] & _BIT0 else background,
-                        color if font.FONT[idx+2] & _BIT7 else background,
-                        color if font.FONT[idx+2] & _BIT6 else background,
-                        color if font.FONT[idx+2] & _BIT5 else background,
-                        color if font.FONT[idx+2] & _BIT4 else background,
-                        color if font.FONT[idx+2] & _BIT3 else background,
-                        color if font.FONT[idx+2] & _BIT2 else background,
-                        color if font.FONT[idx+2] & _BIT1 else background,
-                        color if font.FONT[idx+2] & _BIT0 else background,
-                        color if font.FONT[idx+3] & _BIT7 else background,
-                        color if font.FONT[idx+3] & _BIT6 else background,
-                        color if font.FONT[idx+3] & _BIT5 else background,
-                        color if font.FONT[idx+3] & _BIT4 else background,
-                        color if font.FONT[idx+3] & _BIT3 else background,
-                        color if font.FONT[idx+3] & _BIT2 else background,
-                        color if font.FONT[idx+3] & _BIT1 else background,
-                        color if font.FONT[idx+3] & _BIT0 else background,
-                        color if font.FONT[idx+4] & _BIT7 else background,
-                        color if font.FONT[idx+4] & _BIT6 else background,
-                        color if font.FONT[idx+4] & _BIT5 else background,
-                        color if font.FONT[idx+4] & _BIT4 else background,
-                        color if font.FONT[idx+4] & _BIT3 else background,
-                        color if font.FONT[idx+4] & _BIT2 else background,
-                        color if font.FONT[idx+4] & _BIT1 else background,
-                        color if font.FONT[idx+4] & _BIT0 else background,
-                        color if font.FONT[idx+5] & _BIT7 else background,
-                        color if font.FONT[idx+5] & _BIT6 else background,
-                        color if font.FONT[idx+5] & _BIT5 else background,
-                        color if font.FONT[idx+5] & _BIT4 else background,
-                        color if font.FONT[idx+5] & _BIT3 else background,
-                        color if font.FONT[idx+5] & _BIT2 else background,
-                        color if font.FONT[idx+5] & _BIT1 else background,
-                        color if font.FONT[idx+5] & _BIT0 else background,
-                        color if font.FONT[idx+6] & _BIT7 else background,
-                        color if font.FONT[idx+6] & _BIT6 else background,
-                        color if font.FONT[idx+6] & _BIT5 else background,
-                        color if font.FONT[idx+6] & _BIT4 else background,
-                        color if font.FONT[idx+6] & _BIT3 else background,
-                        color if font.FONT[idx+6] & _BIT2 else background,
-                        color if font.FONT[idx+6] & _BIT1 else background,
-                        color if font.FONT[idx+6] & _BIT0 else background,
-                        color if font.FONT[idx+7] & _BIT7 else background,
-                        color if font.FONT[idx+7] & _BIT6 else background,
-                        color if font.FONT[idx+7] & _BIT5 else background,
-                        color if font.FONT[idx+7] & _BIT4 else background,
-                        color if font.FONT[idx+7] & _BIT3 else background,
-                        color if font.FONT[idx+7] & _BIT2 else background,
-                        color if font.FONT[idx+7] & _BIT1 else background,
-                        color if font.FONT[idx+7] & _BIT0 else background,
-                        color if font.FONT[idx+8] & _BIT7 else background,
-                        color if font.FONT[idx+8] & _BIT6 else background,
-                        color if font.FONT[idx+8] & _BIT5 else background,
-                        color if font.FONT[idx+8] & _BIT4 else background,
-                        color if font.FONT[idx+8] & _BIT3 else background,
-                        color if font.FONT[idx+8] & _BIT2 else background,
-                        color if font.FONT[idx+8] & _BIT1 else background,
-                        color if font.FONT[idx+8] & _BIT0 else background,
-                        color if font.FONT[idx+9] & _BIT7 else background,
-                        color if font.FONT[idx+9] & _BIT6 else background,
-                        color if font.FONT[idx+9] & _BIT5 else background,
-                        color if font.FONT[idx+9] & _BIT4 else background,
-                        color if font.FONT[idx+9] & _BIT3 else background,
-                        color if font.FONT[idx+9] & _BIT2 else background,
-                        color if font.FONT[idx+9] & _BIT1 else background,
-                        color if font.FONT[idx+9] & _BIT0 else background,
-                        color if font.FONT[idx+10] & _BIT7 else background,
-                        color if font.FONT[idx+10] & _BIT6 else background,
-                        color if font.FONT[idx+10] & _BIT5 else background,
-                        color if font.FONT[idx+10] & _BIT4 else background,
-                        color if font.FONT[idx+10] & _BIT3 else background,
-                        color if font.FONT[idx+10] & _BIT2 else background,
-                        color if font.FONT[idx+10] & _BIT1 else background,
-                        color if font.FONT[idx+10] & _BIT0 else background,
-                        color if font.FONT[idx+11] & _BIT7 else background,
-                        color if font.FONT[idx+11] & _BIT6 else background,
-                        color if font.FONT[idx+11] & _BIT5 else background,
-                        color if font.FONT[idx+11] & _BIT4 else background,
-                        color if font.FONT[idx+11] & _BIT3 else background,
-                        color if font.FONT[idx+11] & _BIT2 else background,
-                        color if font.FONT[idx+11] & _BIT1 else background,
-                        color if font.FONT[idx+11] & _BIT0 else background,
-                        color if font.FONT[idx+12] & _BIT7 else background,
-                        color if font.FONT[idx+12] & _BIT6 else background,
-                        color if font.FONT[idx+12] & _BIT5 else background,
-                        color if font.FONT[idx+12] & _BIT4 else background,
-                        color if font.FONT[idx+12] & _BIT3 else background,
-                        color if font.FONT[idx+12] & _BIT2 else background,
-                        color if font.FONT[idx+12] & _BIT1 else background,
-                        color if font.FONT[idx+12] & _BIT0 else background,
-                        color if font.FONT[idx+13] & _BIT7 else background,
-                        color if font.FONT[idx+13] & _BIT6 else background,
-                        color if font.FONT[idx+13] & _BIT5 else background,
-                        color if font.FONT[idx+13] & _BIT4 else background,
-                        color if font.FONT[idx+13] & _BIT3 else background,
-                        color if font.FONT[idx+13] & _BIT2 else background,
-                        color if font.FONT[idx+13] & _BIT1 else background,
-                        color if font.FONT[idx+13] & _BIT0 else background,
-                        color if font.FONT[idx+14] & _BIT7 else background,
-                        color if font.FONT[idx+14] & _BIT6 else background,
-                        color if font.FONT[idx+14] & _BIT5 else background,
-                        color if font.FONT[idx+14] & _BIT4 else background,
-                        color if font.FONT[idx+14] & _BIT3 else background,
-                        color if font.FONT[idx+14] & _BIT2 else background,
-                        color if font.FONT[idx+14] & _BIT1 else background,
-                        color if font.FONT[idx+14] & _BIT0 else background,
-                        color if font.FONT[idx+15] & _BIT7 else background,
-                        color if font.FONT[idx+15] & _BIT6 else background,
-                        color if font.FONT[idx+15] & _BIT5 else background,
-                        color if font.FONT[idx+15] & _BIT4 else background,
-                        color if font.FONT[idx+15] & _BIT3 else background,
-                        color if font.FONT[idx+15] & _BIT2 else background,
-                        color if font.FONT[idx+15] & _BIT1 else background,
-                        color if font.FONT[idx+15] & _BIT0 else background
-                    )
-                    self.blit_buffer(buffer, x0, y0+8*line, 16, 8)
+                _expand(lut, font.FONT, (ch-font.FIRST)*pixels, pixels, buffer)
+                self.blit_buffer(buffer, x0, y0, font.WIDTH, font.HEIGHT)
             x0 += font.WIDTH
 
     def text(self, font, text, x0, y0, color=WHITE, background=BLACK):
@@ -816,43 +1204,163 @@ class GC9A01():
         else:
             self._text16(font, text, x0, y0, color, background)
 
-    def bitmap(self, bitmap, x, y, index=0):
+    def _bitmap_lut(self, bitmap):
+        """Return the palette table of a bitmap module (cached)."""
+        lut = self._bitmap_luts.get(bitmap)
+        if lut is None:
+            if len(self._bitmap_luts) >= _LUT_CACHE:
+                self._bitmap_luts = {}
+
+            lut = _build_palette_lut(bitmap.PALETTE, bitmap.BPP)
+            self._bitmap_luts[bitmap] = lut
+
+        return lut
+
+    def bitmap(self, bitmap, x, y, index=0, key=None):
         """
         Draw a bitmap on display at the specified column and row
 
+        Pixels (1, 2, 4 or 8 bits palette indexes) are expanded with a table
+        of the palette a byte at a time and sent by bands of rows.
+
         Args:
             bitmap (bitmap_module): The module containing the bitmap to draw
             x (int): column to start drawing at
             y (int): row to start drawing at
             index (int): Optional index of bitmap to draw from multiple bitmap
                 module
+            key (int): Optional 565 encoded color of transparent pixels (not
+                drawn)
 
         """
-        bitmap_size = bitmap.HEIGHT * bitmap.WIDTH
-        buffer_len = bitmap_size * 2
-        buffer = bytearray(buffer_len)
-        bs_bit = bitmap.BPP * bitmap_size * index if index > 0 else 0
+        width = bitmap.WIDTH
+        height = bitmap.HEIGHT
+        bpp = bitmap.BPP
+        lut = self._bitmap_lut(bitmap)
+        bs_bit = bpp * width * height * index
+        rows = max(min(_BITMAP_BUFFER_SIZE // (width * 2), height), 1)
+        if self._bitmap_buf is None or len(self._bitmap_buf) < rows * width * 2:
+            self._bitmap_buf = bytearray(rows * width * 2)
+
+        buffer = memoryview(self._bitmap_buf)
+        # whole bitmap in one window if possible
+        direct = (key is None and self._fb is None and x >= 0 and y >= 0
+                  and x + width <= self.width and y + height <= self.height)
+        if direct:
+            self._set_window(x, y, x + width - 1, y + height - 1)
+
+        for row in range(0, height, rows):
+            n = min(rows, height - row)
+            _expand_bpp(lut, bitmap.BITMAP, bs_bit, n * width, buffer, bpp,
+                        8 // bpp)
+            bs_bit += n * width * bpp
+            band = buffer[0:n * width * 2]
+            if direct:
+                self._write(None, band)
+            elif key is None:
+                self.blit_buffer(band, x, y + row, width, n)
+            else:
+                self._blit_keyed(band, x, y + row, width, n, key)
+
+    def _blit_keyed(self, buffer, x, y, width, height, key):
+        """Copy buffer to display, skip pixels of color key."""
+        key = _swap_bytes(key)
+        for row in range(height):
+            i = row * width
+            end = i + width
+            while i < end:
+                i = _next_run(buffer, i, end, key, 1)
+                j = _next_run(buffer, i, end, key, 0)
+                if j > i:
+                    self.blit_buffer(buffer[i * 2:j * 2],
+                                     x + i - row * width, y + row, j - i, 1)
+                i = j
+
+    def _render_glyph(self, font, char_index, fg, bg, buffer=None):
+        """
+        Render a glyph of a converted true-type font (a font module or a font
+        with a glyph_bits() method) as RGB565 pixels.
+
+        Args:
+            font (font): The module containing the converted true-type font
+            char_index (int): glyph index in font
+            fg (int): foreground color
+            bg (int): background color
+            buffer (bytearray): buffer to render into, allocated if not set
 
-        for i in range(0, buffer_len, 2):
-            color_index = 0
-            for bit in range(bitmap.BPP):
-                color_index <<= 1
-                color_index |= (bitmap.BITMAP[bs_bit // 8]
-                                & 1 << (7 - (bs_bit % 8))) > 0
-                bs_bit += 1
+        Returns:
+            buffer, width of the glyph
+        """
+        glyph_bits = getattr(font, 'glyph_bits', None)
+        if glyph_bits is not None:
+            # font loaded on demand (like lib/binfont.py)
+            bitmap, bs_bit = glyph_bits(char_index)
+        else:
+            bitmap = font.BITMAPS
+            offset = char_index * font.OFFSET_WIDTH
+            bs_bit = font.OFFSETS[offset]
+            if font.OFFSET_WIDTH > 1:
+                bs_bit = (bs_bit << 8) + font.OFFSETS[offset + 1]
 
-            color = bitmap.PALETTE[color_index]
-            buffer[i] = color & 0xff00 >> 8
-            buffer[i + 1] = color_index & 0xff
+            if font.OFFSET_WIDTH > 2:
+                bs_bit = (bs_bit << 8) + font.OFFSETS[offset + 2]
 
-        self.blit_buffer(buffer, x, y, bitmap.WIDTH, bitmap.HEIGHT)
+        char_width = font.WIDTHS[char_index]
+        pixels = char_width * font.HEIGHT
+        if buffer is None:
+            buffer = bytearray(pixels * 2)
+
+        _expand(self._lut(fg, bg), bitmap, bs_bit, pixels, buffer)
+        return buffer, char_width
+
+    def _glyph(self, font, character, char_index, fg, bg):
+        """
+        Return the RGB565 buffer of a glyph from the rendered glyphs cache,
+        render and cache it on a miss (least recently used glyphs are evicted
+        to keep the cache under glyph_cache bytes).
+        """
+        key = (font, character, fg, bg)
+        self._glyphs_tick += 1
+        entry = self._glyphs.get(key)
+        if entry is not None:
+            entry[1] = self._glyphs_tick
+            return entry[0]
+
+        buffer, _ = self._render_glyph(font, char_index, fg, bg)
+        size = len(buffer)
+        if size <= self.glyph_cache:
+            while self._glyphs_size + size > self.glyph_cache:
+                self._glyph_evict()
+
+            self._glyphs[key] = [buffer, self._glyphs_tick]
+            self._glyphs_size += size
+
+        return buffer
+
+    def _glyph_evict(self):
+        """Remove the least recently used glyph from the cache."""
+        lru_key = None
+        lru_tick = 0
+        for key, entry in self._glyphs.items():
+            if lru_key is None or entry[1] < lru_tick:
+                lru_key = key
+                lru_tick = entry[1]
+
+        self._glyphs_size -= len(self._glyphs.pop(lru_key)[0])
+
+    def glyph_cache_clear(self):
+        """Free all the rendered glyphs cache."""
+        self._glyphs = {}
+        self._glyphs_size = 0
 
-    # @micropython.native
     def write(self, font, string, x, y, fg=WHITE, bg=BLACK):
         """
         Write a string using a converted true-type font on the display starting
         at the specified column and row
 
+        Rendered glyphs are cached by font, character and colors, redrawing
+        the same text (like the digits of a clock) only costs the SPI writes.
+
         Args:
             font (font): The module containing the converted true-type font
             s (string): The string to write
@@ -861,48 +1369,31 @@ class GC9A01():
             fg (int): foreground color, optional, defaults to WHITE
             bg (int): background color, optional, defaults to BLACK
         """
-        buffer_len = font.HEIGHT * font.MAX_WIDTH * 2
-        buffer = bytearray(buffer_len)
-        fg_hi = (fg & 0xff00) >> 8
-        fg_lo = fg & 0xff
-
-        bg_hi = (bg & 0xff00) >> 8
-        bg_lo = bg & 0xff
+        index = _font_index(font)
+        to_row = y + font.HEIGHT - 1
+        if self.glyph_cache:
+            buffer = None
+        else:
+            buffer = bytearray(font.HEIGHT * font.MAX_WIDTH * 2)
 
         for character in string:
-            try:
-                char_index = font.MAP.index(character)
-                offset = char_index * font.OFFSET_WIDTH
-                bs_bit = font.OFFSETS[offset]
-                if font.OFFSET_WIDTH > 1:
-                    bs_bit = (bs_bit << 8) + font.OFFSETS[offset + 1]
-
-                if font.OFFSET_WIDTH > 2:
-                    bs_bit = (bs_bit << 8) + font.OFFSETS[offset + 2]
-
-                char_width = font.WIDTHS[char_index]
-                buffer_needed = char_width * font.HEIGHT * 2
-
-                for i in range(0, buffer_needed, 2):
-                    if font.BITMAPS[bs_bit // 8] & 1 << (7 - (bs_bit % 8)) > 0:
-                        buffer[i] = fg_hi
-                        buffer[i + 1] = fg_lo
-                    else:
-                        buffer[i] = bg_hi
-                        buffer[i + 1] = bg_lo
-
-                    bs_bit += 1
-
-                to_col = x + char_width - 1
-                to_row = y + font.HEIGHT - 1
-                if self.width > to_col and self.height > to_row:
-                    self._set_window(x, y, to_col, to_row)
-                    self._write(None, buffer[0:buffer_needed])
+            char_index = index.get(character)
+            if char_index is None:
+                continue
+
+            char_width = font.WIDTHS[char_index]
+            to_col = x + char_width - 1
+            if self.width > to_col and self.height > to_row:
+                if buffer is None:
+                    glyph = self._glyph(font, character, char_index, fg, bg)
+                else:
+                    self._render_glyph(font, char_index, fg, bg, buffer)
+                    glyph = memoryview(buffer)[
+                        0:char_width * font.HEIGHT * 2]
 
-                x += char_width
+                self.blit_buffer(glyph, x, y, char_width, font.HEIGHT)
 
-            except ValueError:
-                pass
+            x += char_width
 
     def write_width(self, font, string):
         """
@@ -913,13 +1404,25 @@ class GC9A01():
             font (font): The module containing the converted true-type font
             string (string): The string to measure
         """
+        index = _font_index(font)
         width = 0
         for character in string:
-            try:
-                char_index = font.MAP.index(character)
+            char_index = index.get(character)
+            if char_index is not None:
                 width += font.WIDTHS[char_index]
 
-            except ValueError:
-                pass
-
         return width
+
+    def draw_text(self, font, items, fg=WHITE, bg=BLACK):
+        """
+        Draw a draw list of lib/text_layout.py layout() in one pass
+
+        Args:
+            font (font): rom font or converted true-type font of the layout
+            items (list): draw list [(x, y, text), ...]
+            fg (int): foreground color, optional, defaults to WHITE
+            bg (int): background color, optional, defaults to BLACK
+        """
+        draw = self.text if hasattr(font, 'FONT') else self.write
+        for x, y, text in items:
+            draw(font, text, x, y, fg, bg)
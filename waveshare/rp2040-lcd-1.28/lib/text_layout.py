@@ -0,0 +1,242 @@
+"""
+Text measurement and layout for the display drivers fonts.
+
+Supported fonts:
+- converted true-type fonts: MAP, WIDTHS and HEIGHT (font modules or lib/binfont.py)
+- rom fonts: WIDTH and HEIGHT (monospaced)
+- font-to-py fonts: height() and get_width()
+
+Metrics of a font (a width table by char and a LRU cache of strings widths) are built once and
+shared by all users of the font. layout() returns the draw list [(x, y, text), ...] of the lines of
+a text in a box, or in the chords of a circle for round displays, the drivers draw it in one pass:
+
+    items = layout(font, 'Outdoor temperature: 12.5 C', 0, 0, 240, 240, align=CENTER,
+                   valign=MIDDLE, circle=(120, 120, 118))
+    tft.draw_text(font, items)
+"""
+
+import math
+from micropython import const
+
+# some const
+LEFT = const(0)
+CENTER = const(1)
+RIGHT = const(2)
+TOP = const(0)
+MIDDLE = const(1)
+BOTTOM = const(2)
+_WIDTH_CACHE_SIZE = const(64)
+_MAX_LINES = const(1_000)
+
+
+# some class
+class FontMetrics:
+    """Widths of a font's chars and strings (use metrics() to share them)."""
+
+    def __init__(self, font, cache_size=_WIDTH_CACHE_SIZE):
+        # public
+        self.font = font
+        self.cache_size = cache_size
+        # private
+        self._fixed = 0
+        self._widths = {}
+        self._get_width = None
+        # strings widths: text -> [width, last use tick]
+        self._cache = {}
+        self._tick = 0
+        if hasattr(font, 'MAP'):
+            self.height = font.HEIGHT
+            for i, char in enumerate(font.MAP):
+                self._widths[char] = font.WIDTHS[i]
+        elif hasattr(font, 'FONT'):
+            self.height = font.HEIGHT
+            self._fixed = font.WIDTH
+        else:
+            self.height = font.height()
+            self._get_width = font.get_width
+
+    def char_width(self, char):
+        """Return the width of a char in pixels."""
+        if self._fixed:
+            return self._fixed
+        width = self._widths.get(char)
+        if width is None:
+            # unknown chars are not drawn by converted true-type fonts
+            width = self._get_width(char) if self._get_width else 0
+            self._widths[char] = width
+        return width
+
+    def width(self, text):
+        """Return the width of a string in pixels (cached)."""
+        if self._fixed:
+            return self._fixed * len(text)
+        self._tick += 1
+        entry = self._cache.get(text)
+        if entry is not None:
+            entry[1] = self._tick
+            return entry[0]
+        width = 0
+        for char in text:
+            width += self.char_width(char)
+        if self.cache_size:
+            if len(self._cache) >= self.cache_size:
+                self._evict()
+            self._cache[text] = [width, self._tick]
+        return width
+
+    def fit(self, text, max_width):
+        """Return the number of chars of the head of text that fit in max_width pixels."""
+        width = 0
+        for i, char in enumerate(text):
+            width += self.char_width(char)
+            if width > max_width:
+                return i
+        return len(text)
+
+    def _evict(self):
+        # remove the least recently used string from the cache
+        lru_key = None
+        lru_tick = 0
+        for key, entry in self._cache.items():
+            if lru_key is None or entry[1] < lru_tick:
+                lru_key = key
+                lru_tick = entry[1]
+        del self._cache[lru_key]
+
+
+# some functions
+_metrics = {}
+
+
+def metrics(font):
+    """Return the metrics of a font (built once by font)."""
+    font_m = _metrics.get(font)
+    if font_m is None:
+        font_m = FontMetrics(font)
+        _metrics[font] = font_m
+    return font_m
+
+
+def _line_box(x, width, line_y, line_h, circle):
+    # return (x0, x1) limits of a line: the box, or its part inside the circle chords
+    if circle is None:
+        return x, x + width
+    cx, cy, r = circle
+    # the row of the line farthest from the center gives the shortest chord
+    dy = max(abs(line_y - cy), abs(line_y + line_h - 1 - cy))
+    if dy >= r:
+        return x, x
+    half = int(math.sqrt(r * r - dy * dy))
+    return max(x, cx - half), max(min(x + width, cx + half + 1), x)
+
+
+def _wrap(font_m, text, x, width, top, line_h, max_lines, wrap, circle):
+    # return (lines as [(text, x0, x1), ...], True if all the text fits in max_lines)
+    lines = []
+    # the widest line: words longer than it are broken
+    full_w = width
+    if circle:
+        full_w = 0
+        for i in range(max_lines):
+            x0, x1 = _line_box(x, width, top + i * line_h, font_m.height, circle)
+            full_w = max(full_w, x1 - x0)
+    paragraphs = text.split('\n')
+    for p_index, paragraph in enumerate(paragraphs):
+        line = ''
+        for word in paragraph.split(' '):
+            while True:
+                if len(lines) >= max_lines:
+                    return lines, False
+                x0, x1 = _line_box(x, width, top + len(lines) * line_h, font_m.height, circle)
+                candidate = line + ' ' + word if line else word
+                if not wrap or font_m.width(candidate) <= x1 - x0:
+                    line = candidate
+                    break
+                if line:
+                    # word on the next line
+                    lines.append((line, x0, x1))
+                    line = ''
+                    continue
+                if x1 - x0 < full_w and font_m.width(word) <= full_w:
+                    # a short chord of the circle: word on a wider line
+                    lines.append(('', x0, x1))
+                    continue
+                # word longer than a line: break it
+                n = font_m.fit(word, x1 - x0)
+                if n == 0 and x1 - x0 >= font_m.width(word[:1]):
+                    n = 1
+                lines.append((word[:n], x0, x1))
+                word = word[n:]
+                if not word:
+                    break
+        if len(lines) >= max_lines:
+            return lines, not line and not any(paragraphs[p_index + 1:])
+        x0, x1 = _line_box(x, width, top + len(lines) * line_h, font_m.height, circle)
+        lines.append((line, x0, x1))
+    return lines, True
+
+
+def layout(font, text, x, y, width, height=None, align=LEFT, valign=TOP, wrap=True, line_spacing=0,
+           circle=None):
+    """
+    Return the draw list [(x, y, text), ...] of a text in a box.
+
+    Lines are split at '\\n' and word wrapped (if wrap is set) to the box width, or to the chords
+    of circle (cx, cy, r) inside the box. Lines are clipped: chars and lines out of the box are
+    dropped. Empty lines are not in the draw list.
+
+    Args:
+        font: font of the text (see module doc)
+        text (str): text to layout
+        x, y (int): box top left corner
+        width (int): box width
+        height (int): box height (default is unlimited, or to the bottom of circle)
+        align (int): LEFT, CENTER or RIGHT (in the box or in the circle chord of the line)
+        valign (int): TOP, MIDDLE or BOTTOM
+        wrap (bool): word wrap (default), else clip lines
+        line_spacing (int): pixels between lines
+        circle (tuple): (cx, cy, r) circle of a round display, optional
+    """
+    font_m = metrics(font)
+    line_h = font_m.height + line_spacing
+    if height is None:
+        height = circle[1] + circle[2] - y if circle else _MAX_LINES * line_h
+    top = y
+    # a vertically aligned block moves: redo the layout until its lines count is stable,
+    # layouts are (distance to the aligned top, top, lines, all the text fits)
+    layouts = []
+    for _ in range(3):
+        max_lines = max((y + height - top + line_spacing) // line_h, 0)
+        lines, fits = _wrap(font_m, text, x, width, top, line_h, max_lines, wrap, circle)
+        if valign == TOP:
+            new_top = y
+        else:
+            block_h = len(lines) * line_h - line_spacing
+            new_top = max(y + (height - block_h) // (2 if valign == MIDDLE else 1), y)
+        layouts.append((abs(new_top - top), top, lines, fits))
+        if new_top == top:
+            break
+        top = new_top
+    # the best aligned layout, preferably one where all the text fits
+    _, top, lines, fits = min(layouts, key=lambda l: (not l[3], l[0]))
+    # with a circle, lines are shorter near the bottom: move up until all the text fits
+    while not fits and top > y:
+        top = max(top - line_h, y)
+        max_lines = max((y + height - top + line_spacing) // line_h, 0)
+        lines, fits = _wrap(font_m, text, x, width, top, line_h, max_lines, wrap, circle)
+    items = []
+    for i, (line, x0, x1) in enumerate(lines):
+        # clip
+        if font_m.width(line) > x1 - x0:
+            line = line[:font_m.fit(line, x1 - x0)]
+        if not line:
+            continue
+        line_w = font_m.width(line)
+        if align == CENTER:
+            line_x = x0 + (x1 - x0 - line_w) // 2
+        elif align == RIGHT:
+            line_x = x1 - line_w
+        else:
+            line_x = x0
+        items.append((line_x, top + i * line_h, line))
+    return items
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+"""Pack converted true-type font modules (like fonts/truetype/chango_64.py) into binary font files.
+
+A binary font file is read by lib/binfont.py: only its index (map, widths, offsets) is kept in RAM,
+glyphs bitmaps are read from flash when needed.
+
+Usage (from the project directory, .bin files are written next to the modules):
+
+    ./tools/font2bin.py fonts/truetype/*.py
+    mpremote cp fonts/truetype/chango_64.bin :fonts/truetype/
+
+File layout (little endian header):
+- header: magic "BFNT", version, BPP, HEIGHT, MAX_WIDTH, OFFSET_WIDTH, number of chars,
+  size of the utf-8 map, size of the bitmaps
+- MAP (utf-8), WIDTHS (1 byte by char), OFFSETS (OFFSET_WIDTH bytes by char, big endian bit
+  offsets in bitmaps as in the font module), BITMAPS
+"""
+
+import argparse
+from pathlib import Path
+import struct
+import sys
+
+
+# some const
+MAGIC = b'BFNT'
+VERSION = 1
+HEADER = '<4sBBBBBHHI'
+
+
+# some functions
+def load_font(path: Path) -> dict:
+    """Return the globals of a font module."""
+    font_d = {}
+    exec(compile(path.read_text(encoding='utf-8'), str(path), 'exec'), font_d)
+    for name in ('MAP', 'BPP', 'HEIGHT', 'MAX_WIDTH', 'OFFSET_WIDTH', 'WIDTHS', 'OFFSETS', 'BITMAPS'):
+        if name not in font_d:
+            raise ValueError(f'{path}: {name} is missing (not a converted true-type font module)')
+    return font_d
+
+
+def pack_font(font_d: dict) -> bytes:
+    """Return a font as a binary font file content."""
+    map_b = font_d['MAP'].encode('utf-8')
+    n_chars = len(font_d['MAP'])
+    widths = bytes(font_d['WIDTHS'])
+    offsets = bytes(font_d['OFFSETS'])
+    bitmaps = bytes(font_d['BITMAPS'])
+    if len(widths) != n_chars or len(offsets) != n_chars * font_d['OFFSET_WIDTH']:
+        raise ValueError('inconsistent font: WIDTHS or OFFSETS size does not match MAP')
+    header = struct.pack(HEADER, MAGIC, VERSION, font_d['BPP'], font_d['HEIGHT'], font_d['MAX_WIDTH'],
+                         font_d['OFFSET_WIDTH'], n_chars, len(map_b), len(bitmaps))
+    return header + map_b + widths + offsets + bitmaps
+
+
+if __name__ == '__main__':
+    # parse command line args
+    parser = argparse.ArgumentParser()
+    parser.add_argument('fonts', nargs='+', type=Path, help='converted true-type font modules (.py)')
+    parser.add_argument('-o', '--out-dir', type=Path, default=None, help='output directory (default is module dir)')
+    args = parser.parse_args()
+
+    errors = 0
+    for font_path in args.fonts:
+        if font_path.name.startswith('__'):
+            continue
+        try:
+            bin_data = pack_font(load_font(font_path))
+        except (ValueError, SyntaxError) as e:
+            print(f'skip {font_path}: {e}', file=sys.stderr)
+            errors += 1
+            continue
+        out_path = (args.out_dir or font_path.parent) / font_path.with_suffix('.bin').name
+        out_path.write_bytes(bin_data)
+        print(f'{font_path} ({font_path.stat().st_size} bytes) -> {out_path} ({len(bin_data)} bytes)')
+    sys.exit(1 if errors else 0)